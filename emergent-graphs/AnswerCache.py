@@ -0,0 +1,131 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple, Optional, Any, Union
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU cache of answers, looked up by prompt embedding.
+
+    A prompt that is within distance_threshold (squared L2, as for concepts and
+    prompts) of a cached prompt with the same scope reuses the cached answer
+    instead of calling the LLM. The scope is an exact key, e.g. topic and model,
+    so near-paraphrases only match within one topic and one model. Vectors are
+    kept in a preallocated matrix with one row per slot, so a lookup is one
+    embedding call and one matrix product over the cached prompts.
+
+    The temperature policy decides whether answers may be reused at all: at a
+    temperature above max_temperature every call is meant to produce a fresh
+    answer, and the cache is bypassed.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        distance_threshold: float = 0.05,
+        max_entries: int = 512,
+        max_temperature: float = 1.0
+    ):
+        """
+        Initialize the answer cache.
+
+        Args:
+            embedder: Embedding model with an encode() method
+            distance_threshold: Prompts closer than this to a cached prompt reuse its answer
+            max_entries: Maximum number of cached answers; the least recently used is evicted
+            max_temperature: Highest LLM temperature at which cached answers are reused
+        """
+        self.embedder = embedder
+        self.distance_threshold = distance_threshold
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        # Slot -> (scope, prompt, answer, tokens), in least to most recently used order
+        self._entries: "OrderedDict[int, Tuple[Tuple, str, str, int]]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._sq_norms = np.zeros(max_entries, dtype=np.float32)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Union[int, float]] = {}
+        self.reset_stats()
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def reset_stats(self) -> None:
+        """Reset the hit, miss and savings counters."""
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "bypassed": 0, "evictions": 0, "tokens_saved": 0}
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Return a copy of the counters with the hit rate of the lookups."""
+        stats = dict(self.stats)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["entries"] = len(self._entries)
+        return stats
+
+    def enabled_for(self, temperature: float) -> bool:
+        """Whether answers generated at this temperature may be served from the cache."""
+        return temperature <= self.max_temperature
+
+    def lookup(self, scope: Tuple, prompt: str, temperature: float) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Find a cached answer for a prompt.
+
+        Args:
+            scope: Exact part of the key, e.g. (topic, model)
+            prompt: Prompt to answer
+            temperature: Temperature the answer would be generated at
+
+        Returns:
+            Tuple of (cached answer or None, prompt vector to pass to store, or None if bypassed)
+        """
+        if not self.enabled_for(temperature):
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None, None
+
+        vector = np.asarray(self.embedder.encode([prompt]), dtype=np.float32)[0]
+        with self._lock:
+            self.stats["lookups"] += 1
+            slots = [slot for slot, entry in self._entries.items() if entry[0] == scope]
+            if slots:
+                rows = np.asarray(slots)
+                distances = self._sq_norms[rows] + vector @ vector - 2.0 * self._vectors[rows] @ vector
+                best = int(distances.argmin())
+                if distances[best] < self.distance_threshold:
+                    slot = slots[best]
+                    self._entries.move_to_end(slot)
+                    _, cached_prompt, answer, tokens = self._entries[slot]
+                    self.stats["hits"] += 1
+                    self.stats["tokens_saved"] += tokens
+                    self.logger.info(f"Answer cache hit (distance {distances[best]:.4f}): \"{cached_prompt[:100]}\"")
+                    return answer, vector
+            self.stats["misses"] += 1
+        return None, vector
+
+    def store(self, scope: Tuple, prompt: str, answer: str, vector: Optional[np.ndarray], tokens: int) -> None:
+        """
+        Cache an answer.
+
+        Args:
+            scope: Exact part of the key, e.g. (topic, model)
+            prompt: Prompt that was answered
+            answer: Generated answer
+            vector: Prompt vector returned by lookup; nothing is cached if it is None
+            tokens: Tokens the LLM call used, counted as saved on every hit
+        """
+        if vector is None or not answer:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+            else:
+                slot, _ = self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._vectors[slot] = vector
+            self._sq_norms[slot] = vector @ vector
+            self._entries[slot] = (scope, prompt, answer, tokens)
@@ -0,0 +1,191 @@
+import logging
+import os
+from typing import List, Dict, Optional, Any, Union
+
+import numpy as np
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """
+    Average the token embeddings of each text over its attention mask, as sentence-transformers does.
+
+    hello-world/embedding_backends.py has the same function; the subprojects do not
+    share code, so a fix to one belongs in the other.
+
+    Args:
+        token_embeddings: (batch, tokens, dimension) model output
+        attention_mask: (batch, tokens) mask of real tokens
+        normalize: L2-normalize the pooled vectors
+
+    Returns:
+        A (batch, dimension) float32 matrix
+    """
+    mask = attention_mask[:, :, None].astype(np.float32)
+    pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Embedder backed by sentence-transformers running in PyTorch on CPU.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64, threads: int = 0):
+        """
+        Initialize the sentence-transformers embedder.
+
+        Args:
+            model_name: Sentence-transformers model name
+            batch_size: Number of texts per forward pass
+            threads: Number of intra-op CPU threads, 0 for the PyTorch default
+        """
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Embed one text or a batch of texts.
+
+        Args:
+            texts: A text, or a list of texts
+
+        Returns:
+            A vector for a single text, otherwise a (len(texts), dimension) matrix
+        """
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+
+
+class OnnxEmbedder:
+    """
+    Embedder that runs the ONNX export of a sentence-transformers model with ONNX Runtime.
+
+    The sentence-transformers hub repositories ship the model as onnx/model.onnx together
+    with int8-quantized variants (e.g. onnx/model_quint8_avx2.onnx), so the same model can
+    run without PyTorch. Mean pooling and L2 normalization reproduce the sentence-transformers
+    pipeline of all-MiniLM-L6-v2, so vectors have the same dimension and are directly
+    comparable with the ones the PyTorch encoder produces.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        onnx_file: str = "onnx/model.onnx",
+        batch_size: int = 64,
+        threads: int = 0,
+        max_seq_length: int = 256,
+        normalize: bool = True
+    ):
+        """
+        Initialize the ONNX Runtime embedder.
+
+        Args:
+            model_name: Sentence-transformers model name, or a local directory with the model files
+            onnx_file: ONNX model file inside the model repository, e.g. a quantized variant
+            batch_size: Number of texts per inference call
+            threads: Number of intra-op CPU threads, 0 for the ONNX Runtime default
+            max_seq_length: Token limit per text, as configured for the sentence-transformers model
+            normalize: L2-normalize the pooled vectors
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.onnx_file = onnx_file
+        self.batch_size = batch_size
+        self.normalize = normalize
+
+        model_path = self._resolve_file(onnx_file)
+        tokenizer_path = self._resolve_file("tokenizer.json")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        output_dimension = self.session.get_outputs()[0].shape[-1]
+        self.dimension = output_dimension if isinstance(output_dimension, int) else self.encode(["dimension"]).shape[1]
+        logging.info(f"Loaded ONNX embedder {model_name}/{onnx_file} ({self.dimension} dimensions)")
+
+    def _resolve_file(self, filename: str) -> str:
+        """Return a local path for a model file, downloading it from the hub if needed."""
+        if os.path.isdir(self.model_name):
+            return os.path.join(self.model_name, filename)
+        from huggingface_hub import hf_hub_download
+        repo_id = self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+        return hf_hub_download(repo_id=repo_id, filename=filename)
+
+    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Embed one text or a batch of texts.
+
+        Args:
+            texts: A text, or a list of texts
+
+        Returns:
+            A vector for a single text, otherwise a (len(texts), dimension) matrix
+        """
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        batches = [self._encode_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(batches)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one inference call and mean-pool the token embeddings."""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        return mean_pool(self.session.run(None, feed)[0], attention_mask, self.normalize)
+
+
+EMBEDDER_BACKENDS = {
+    "sentence_transformers": SentenceTransformerEmbedder,
+    "onnx": OnnxEmbedder
+}
+
+
+def create_embedder(config: Dict[str, Any], backend: Optional[str] = None) -> Any:
+    """
+    Create the embedder configured in config.json.
+
+    Args:
+        config: Parsed config.json
+        backend: Optional backend name overriding config["embedding_backend"]
+
+    Returns:
+        Embedder with an encode() method and a dimension attribute
+    """
+    backend = backend or config.get("embedding_backend", "sentence_transformers")
+    if backend not in EMBEDDER_BACKENDS:
+        logging.error(f"Unsupported embedding backend: {backend}. Use one of {', '.join(EMBEDDER_BACKENDS)}.")
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+    kwargs = {
+        "model_name": config.get("embedding_model", "all-MiniLM-L6-v2"),
+        "batch_size": config.get("embedding_batch_size", 64),
+        "threads": config.get("embedding_threads", 0)
+    }
+    if backend == "onnx":
+        kwargs["onnx_file"] = config.get("embedding_onnx_file", "onnx/model.onnx")
+    return EMBEDDER_BACKENDS[backend](**kwargs)
@@ -0,0 +1,176 @@
+import json
+import logging
+import socket
+import time
+from typing import Dict, Iterator, Optional, Any
+
+
+def open_diff_sink(target: str) -> Any:
+    """
+    Open the destination of a diff stream.
+
+    Args:
+        target: A file path (JSON Lines file or named pipe), "tcp://host:port" or "unix:///path/to/socket"
+
+    Returns:
+        Writable text stream
+    """
+    if target.startswith("tcp://"):
+        host, port = target[len("tcp://"):].rsplit(":", 1)
+        return _socket_stream(socket.create_connection((host, int(port))))
+    if target.startswith("unix://"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(target[len("unix://"):])
+        except Exception:
+            connection.close()
+            raise
+        return _socket_stream(connection)
+    # A file holds the diffs of one run, so replaying it never applies a change twice.
+    # Opening a named pipe blocks until a reader is attached, as consumers of a pipe expect
+    return open(target, 'w', encoding="utf-8")
+
+
+def _socket_stream(connection: socket.socket) -> Any:
+    """Wrap a connected socket in a text stream that owns it, so closing the stream closes the socket."""
+    stream = connection.makefile("w", encoding="utf-8")
+    # The socket is only released once both it and its stream are closed
+    connection.close()
+    return stream
+
+
+def read_diffs(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the records of a diff file in order.
+
+    A last line without a newline was cut off by a crash mid-write and is skipped.
+
+    Args:
+        path: JSON Lines file written by a GraphDiffEmitter
+
+    Returns:
+        Iterator over the records
+    """
+    with open(path, 'r', encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                logging.warning(f"Skipping the partial last line of {path}")
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+class GraphDiffEmitter:
+    """
+    Streams the growth of a graph as one JSON line per iteration.
+
+    Each record lists the nodes and edges added since the previous record, the
+    edges whose relation changed, and the extracted entities that were merged into
+    an existing node, so a consumer can
+    keep a live view or a downstream index up to date without re-reading the full
+    export. The first record (iteration 0) carries the warm-start graph, so
+    replaying every record rebuilds the graph. If the sink fails, the emitter logs
+    the error and stops streaming; the run itself is never interrupted. The end
+    record has completed set to false if the run crashed.
+    """
+
+    def __init__(self, graph_db: Any, target: str, run_info: Optional[Dict[str, Any]] = None, extractor: Optional[Any] = None):
+        """
+        Initialize the diff emitter.
+
+        Args:
+            graph_db: Graph being built
+            target: Diff destination, see open_diff_sink
+            run_info: Fields added to every record, e.g. topic and run_id
+            extractor: Optional KnowledgeGraphExtractor whose entity mapping reports merged entities
+        """
+        self.graph_db = graph_db
+        self.target = target
+        self.run_info = run_info or {}
+        self.extractor = extractor
+        self._known_nodes = set()
+        # Edge -> relation last reported
+        self._known_edges: Dict[Any, Any] = {}
+        self._reported_entities = set()
+        self.records = 0
+        try:
+            self._sink = open_diff_sink(target)
+        except Exception as e:
+            logging.error(f"Could not open graph diff target {target}: {e}")
+            self._sink = None
+
+    def emit(self, iteration: int, **fields: Any) -> Optional[Dict[str, Any]]:
+        """
+        Write the changes since the previous record.
+
+        Args:
+            iteration: Iteration the changes belong to
+            **fields: Extra fields for this record, e.g. the prompt
+
+        Returns:
+            The record, or None if the sink is closed
+        """
+        if self._sink is None:
+            return None
+
+        added_nodes = [node for node in self.graph_db.nodes() if node not in self._known_nodes]
+        added_edges, changed_edges = [], []
+        for u, v, relation in self.graph_db.edges(data="relation"):
+            if (u, v) not in self._known_edges:
+                added_edges.append((u, v, relation))
+            elif self._known_edges[(u, v)] != relation:
+                changed_edges.append((u, v, relation))
+            self._known_edges[(u, v)] = relation
+        self._known_nodes.update(added_nodes)
+
+        merged = []
+        if self.extractor is not None:
+            for entity, node in list(self.extractor.entity_to_node_id.items()):
+                if entity != node and entity not in self._reported_entities:
+                    merged.append({"entity": entity, "node": node})
+                    self._reported_entities.add(entity)
+
+        record = dict(self.run_info)
+        record.update({
+            "type": "diff",
+            "iteration": iteration,
+            "time": time.time(),
+            "added_nodes": [
+                {"id": node, "labels": sorted(self.graph_db.nodes[node].get("labels") or [node])}
+                for node in added_nodes
+            ],
+            "added_edges": [{"source": u, "target": v, "relation": relation} for u, v, relation in added_edges],
+            "changed_edges": [{"source": u, "target": v, "relation": relation} for u, v, relation in changed_edges],
+            "merged_entities": merged,
+            "nodes": len(self._known_nodes),
+            "edges": len(self._known_edges)
+        })
+        record.update(fields)
+        self._write(record)
+        return record
+
+    def close(self, **fields: Any) -> None:
+        """Write an end record with the given fields and close the sink."""
+        if self._sink is None:
+            return
+        record = dict(self.run_info, type="end", time=time.time(), **fields)
+        self._write(record)
+        try:
+            self._sink.close()
+        except Exception:
+            pass
+        self._sink = None
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        """Write one JSON line and flush it so consumers see it at once."""
+        try:
+            self._sink.write(json.dumps(record, default=str) + "\n")
+            self._sink.flush()
+            self.records += 1
+        except Exception as e:
+            logging.error(f"Graph diff stream to {self.target} failed, no further diffs are sent: {e}")
+            try:
+                self._sink.close()
+            except Exception:
+                pass
+            self._sink = None
@@ -0,0 +1,200 @@
+import logging
+from typing import Dict, Any
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, eigsh
+
+from GraphAnalytics import adjacency_matrix
+
+# Graphs up to this size get a dense eigendecomposition for the spectral initializer
+DENSE_SPECTRAL_MAX_NODES = 500
+
+
+def _symmetric(adjacency: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Undirected 0/1 adjacency without self-loops."""
+    symmetric = ((adjacency + adjacency.T) > 0).astype(np.float64).tocsr()
+    symmetric.setdiag(0)
+    symmetric.eliminate_zeros()
+    return symmetric
+
+
+def spectral_layout(adjacency: sparse.csr_matrix, tau: float = 1.0) -> np.ndarray:
+    """
+    Sparse spectral initializer.
+
+    Uses the second and third leading eigenvectors of the regularized normalized
+    adjacency D^-1/2 (A + tau/n 11^T) D^-1/2. The rank-one regularizer connects
+    every component, so disconnected graphs get a usable embedding, and is applied
+    implicitly so the operator stays sparse.
+
+    Args:
+        adjacency: n x n adjacency matrix
+        tau: Weight of the regularizer, spread over all node pairs
+
+    Returns:
+        n x 2 coordinates
+    """
+    n = adjacency.shape[0]
+    if n < 4:
+        angles = 2 * np.pi * np.arange(n) / max(n, 1)
+        return np.column_stack([np.cos(angles), np.sin(angles)])
+
+    symmetric = _symmetric(adjacency)
+    degree = np.asarray(symmetric.sum(axis=1)).ravel() + tau
+    inv_sqrt = 1.0 / np.sqrt(degree)
+
+    if n <= DENSE_SPECTRAL_MAX_NODES:
+        dense = symmetric.toarray() + tau / n
+        _, vectors = np.linalg.eigh(inv_sqrt[:, None] * dense * inv_sqrt[None, :])
+        vectors = vectors[:, [-2, -3]]
+    else:
+        def matvec(x):
+            x = np.asarray(x).ravel()
+            y = inv_sqrt * x
+            return inv_sqrt * (symmetric @ y + tau / n * y.sum())
+        operator = LinearOperator((n, n), matvec=matvec, dtype=np.float64)
+        values, vectors = eigsh(operator, k=3, which="LA", v0=np.full(n, 1.0 / np.sqrt(n)))
+        vectors = vectors[:, np.argsort(values)[::-1][1:3]]
+
+    # Undo the normalization, as in a random-walk embedding
+    return vectors * inv_sqrt[:, None]
+
+
+def refine_layout(
+    positions: np.ndarray,
+    adjacency: sparse.csr_matrix,
+    iterations: int = 50,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Fruchterman-Reingold refinement with Barnes-Hut style far-field repulsion.
+
+    Nodes are binned into a grid. Repulsion between nodes in the same cell is exact;
+    every other cell acts as a single body of its node count at its centre of mass,
+    so an iteration costs O(n * cells + edges) instead of O(n^2).
+
+    Args:
+        positions: n x 2 initial coordinates
+        adjacency: n x n adjacency matrix
+        iterations: Number of refinement iterations
+        seed: Seed for the jitter that separates coincident nodes
+
+    Returns:
+        n x 2 coordinates in the unit square
+    """
+    n = positions.shape[0]
+    if n < 2 or iterations <= 0:
+        return positions
+    rng = np.random.default_rng(seed)
+    span = np.ptp(positions, axis=0)
+    pos = (positions - positions.min(axis=0)) / np.where(span > 0, span, 1.0)
+    pos += rng.uniform(-1e-3, 1e-3, size=pos.shape)
+
+    upper = sparse.triu(_symmetric(adjacency), k=1).tocoo()
+    rows, cols = upper.row, upper.col
+    k = np.sqrt(1.0 / n)
+    grid = int(np.clip(np.sqrt(n / 8.0), 1, 32))
+    chunk = max(1, 2_000_000 // (grid * grid))
+
+    for iteration in range(iterations):
+        temperature = 0.1 * (1.0 - iteration / iterations)
+        displacement = np.zeros_like(pos)
+
+        # Attraction along edges: d^2 / k
+        delta = pos[rows] - pos[cols]
+        distance = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+        force = delta * (distance / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] += np.bincount(cols, weights=force[:, axis], minlength=n)
+            displacement[:, axis] -= np.bincount(rows, weights=force[:, axis], minlength=n)
+
+        # Bin nodes into the grid over the central 98% of the layout, so a few
+        # outlying nodes cannot squeeze the rest into a handful of crowded cells
+        low, high = np.percentile(pos, [1, 99], axis=0)
+        size = np.maximum(high - low, 1e-9)
+        cell_xy = np.clip((((pos - low) / size) * grid).astype(np.int64), 0, grid - 1)
+        cell = cell_xy[:, 0] * grid + cell_xy[:, 1]
+        mass = np.bincount(cell, minlength=grid * grid).astype(np.float64)
+        occupied = mass > 0
+        centroid = np.zeros((grid * grid, 2))
+        centroid[occupied, 0] = np.bincount(cell, weights=pos[:, 0], minlength=grid * grid)[occupied] / mass[occupied]
+        centroid[occupied, 1] = np.bincount(cell, weights=pos[:, 1], minlength=grid * grid)[occupied] / mass[occupied]
+        cells = np.flatnonzero(occupied)
+
+        # Far field: other cells as single bodies, k^2 * mass / d
+        for start in range(0, n, chunk):
+            block = slice(start, start + chunk)
+            delta = pos[block, None, :] - centroid[None, cells, :]
+            distance_sq = np.maximum((delta ** 2).sum(axis=2), 1e-12)
+            weight = (k * k) * mass[cells][None, :] / distance_sq
+            weight[cell[block, None] == cells[None, :]] = 0.0
+            displacement[block] += (delta * weight[:, :, None]).sum(axis=1)
+
+        # Near field: exact repulsion between all ordered pairs inside each cell
+        first, second = _same_cell_pairs(cell, mass[cells].astype(np.int64))
+        delta = pos[first] - pos[second]
+        distance_sq = np.maximum((delta ** 2).sum(axis=1), 1e-12)
+        force = delta * ((k * k) / distance_sq)[:, None]
+        for axis in range(2):
+            displacement[:, axis] += np.bincount(first, weights=force[:, axis], minlength=n)
+
+        # Limit each move by the temperature
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 1e-12)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+
+    return pos
+
+
+def _same_cell_pairs(cell: np.ndarray, sizes: np.ndarray) -> tuple:
+    """
+    Index pairs (i, j), i != j, of nodes that share a grid cell.
+
+    Args:
+        cell: Cell id per node
+        sizes: Node count of each occupied cell, in increasing cell id order
+
+    Returns:
+        Tuple of (first node indices, second node indices)
+    """
+    order = np.argsort(cell, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    pair_counts = sizes * sizes
+    group = np.repeat(np.arange(len(sizes)), pair_counts)
+    offset = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    first = starts[group] + offset // sizes[group]
+    second = starts[group] + offset % sizes[group]
+    distinct = first != second
+    return order[first[distinct]], order[second[distinct]]
+
+
+def layout_graph(graph_db: Any, iterations: int = 50, extent: float = 1000.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Compute a 2D layout and store it as 'x' and 'y' node attributes.
+
+    Coordinates are centred on the origin and span at most extent in each direction,
+    so a viewer can translate them into its canvas and start its simulation settled.
+
+    Args:
+        graph_db: Graph supporting nodes(), edges() and node attribute access
+        iterations: Number of force refinement iterations after the spectral initializer
+        extent: Width and height of the coordinate range
+        seed: Seed for reproducible layouts
+
+    Returns:
+        Layout description, also stored in the graph attributes under 'layout'
+    """
+    nodes, adjacency = adjacency_matrix(graph_db)
+    positions = refine_layout(spectral_layout(adjacency), adjacency, iterations=iterations, seed=seed)
+    if len(nodes):
+        positions = positions - (positions.max(axis=0) + positions.min(axis=0)) / 2
+        scale = np.abs(positions).max()
+        positions = positions * (extent / 2 / scale if scale > 0 else 0.0)
+    for node, (x, y) in zip(nodes, positions):
+        graph_db.nodes[node]["x"] = round(float(x), 2)
+        graph_db.nodes[node]["y"] = round(float(y), 2)
+
+    layout = {"algorithm": "spectral+barnes-hut", "iterations": iterations, "extent": extent}
+    graph_db.graph["layout"] = layout
+    logging.info(f"Layout computed for {len(nodes)} nodes")
+    return layout
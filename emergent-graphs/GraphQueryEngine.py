@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+
+from GraphAnalytics import adjacency_from_node_link
+
+
+def vectors_file_for(graph_file: str) -> str:
+    """Path of the concept vectors stored next to an exported graph."""
+    return os.path.splitext(graph_file)[0] + "_vectors.npz"
+
+
+def save_concept_vectors(path: str, names: List[str], vectors: Any) -> None:
+    """
+    Store concept vectors for the query engine.
+
+    Args:
+        path: Target .npz file
+        names: Node names, one per row of vectors
+        vectors: Concept vectors, one row per name
+    """
+    # Fixed-width unicode names load without pickle, so a vectors file cannot run code when read
+    np.savez(path, names=np.asarray(names, dtype=str), vectors=np.asarray(vectors, dtype=np.float32))
+
+
+class GraphQueryEngine:
+    """
+    Retrieval index over an exported emergent graph.
+
+    A question is embedded once and the nearest concepts are found by squared L2
+    against an in-memory matrix of concept vectors. Their neighborhoods are then
+    expanded hop by hop on a precomputed CSR adjacency, keeping the highest-PageRank
+    (or highest-degree) neighbors when a hop would exceed the node budget. The
+    result is a small context subgraph with its relation triples, ready to be put
+    into a RAG prompt. Apart from the query embedding, a lookup is a few array
+    operations and takes well under a millisecond on graphs of this size.
+    """
+
+    def __init__(self, graph_data: Dict[str, Any], embedder: Any, vectors_file: Optional[str] = None):
+        """
+        Initialize the query engine.
+
+        Args:
+            graph_data: Node-link graph data as written by the exporter
+            embedder: Embedding model with an encode() method, the one the graph was built with
+            vectors_file: Optional .npz with concept vectors; node names missing from it are
+                embedded, and the file is (re)written when it was incomplete
+        """
+        self.embedder = embedder
+        self.nodes, adjacency = adjacency_from_node_link(graph_data)
+        self._index = {node: i for i, node in enumerate(self.nodes)}
+        self._attrs = graph_data.get("nodes", [])
+
+        # Undirected CSR arrays for expansion, directed matrix for the induced links
+        self._directed = adjacency
+        symmetric = ((adjacency + adjacency.T) > 0).tocsr()
+        self._indptr = symmetric.indptr
+        self._indices = symmetric.indices
+        degree = np.diff(self._indptr).astype(np.float64)
+        pagerank = np.array([attrs.get("pagerank", np.nan) for attrs in self._attrs], dtype=np.float64)
+        self._priority = pagerank if len(pagerank) and not np.isnan(pagerank).any() else degree
+
+        self._relations = {}
+        for link in graph_data.get("links", graph_data.get("edges", [])):
+            key = (self._index.get(link["source"]), self._index.get(link["target"]))
+            if None not in key:
+                self._relations[key] = link.get("relation")
+
+        self.vectors = self._load_vectors(vectors_file)
+        self._sq_norms = (self.vectors ** 2).sum(axis=1)
+
+    @classmethod
+    def from_export(cls, graph_file: str, embedder: Any) -> "GraphQueryEngine":
+        """
+        Load an exported graph and the concept vectors stored next to it.
+
+        Args:
+            graph_file: Path of graph_<topic>.json
+            embedder: Embedding model with an encode() method
+
+        Returns:
+            GraphQueryEngine over the graph
+        """
+        with open(graph_file, 'r') as f:
+            graph_data = json.load(f)
+        return cls(graph_data, embedder, vectors_file_for(graph_file))
+
+    def _load_vectors(self, vectors_file: Optional[str]) -> np.ndarray:
+        """Return one concept vector per node, embedding the ones the vectors file does not have."""
+        stored = {}
+        if vectors_file and os.path.exists(vectors_file):
+            try:
+                # Files written with pickled names fail here and are rewritten below
+                with np.load(vectors_file, allow_pickle=False) as data:
+                    stored = {str(name).lower(): row for name, row in zip(data["names"], data["vectors"])}
+            except Exception as e:
+                logging.warning(f"Could not read concept vectors {vectors_file}: {e}")
+
+        missing = [node for node in self.nodes if node.lower() not in stored]
+        if missing:
+            # Concepts are embedded lowercased, as the extractor stores them
+            for node, vector in zip(missing, self.embedder.encode([node.lower() for node in missing])):
+                stored[node.lower()] = np.asarray(vector, dtype=np.float32)
+            if vectors_file:
+                try:
+                    save_concept_vectors(vectors_file, self.nodes, [stored[node.lower()] for node in self.nodes])
+                except Exception as e:
+                    logging.warning(f"Could not write concept vectors {vectors_file}: {e}")
+            logging.info(f"Embedded {len(missing)} concepts without stored vectors")
+
+        if not self.nodes:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([stored[node.lower()] for node in self.nodes]).astype(np.float32)
+
+    def seed_nodes(self, question: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the concepts nearest to a question.
+
+        Args:
+            question: Natural language question
+            k: Number of seed concepts
+
+        Returns:
+            Seeds as dicts with 'id' and 'distance', nearest first
+        """
+        if not self.nodes:
+            return []
+        query = np.asarray(self.embedder.encode([question]), dtype=np.float32)[0]
+        distances = self._sq_norms + query @ query - 2.0 * self.vectors @ query
+        k = min(k, len(self.nodes))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [{"id": self.nodes[i], "distance": float(distances[i])} for i in nearest]
+
+    def query(self, question: str, seeds: int = 5, hops: int = 2, max_nodes: int = 40) -> Dict[str, Any]:
+        """
+        Retrieve the context subgraph for a question.
+
+        Args:
+            question: Natural language question
+            seeds: Number of seed concepts found by vector search
+            hops: Neighborhood radius around the seeds
+            max_nodes: Maximum number of nodes in the subgraph
+
+        Returns:
+            Dict with 'seeds', 'nodes' (id and hop distance), 'links' (source, relation, target),
+            'context' (the links as text lines) and 'milliseconds'
+        """
+        start = time.perf_counter()
+        seed_list = self.seed_nodes(question, seeds)
+        hop_of = {self._index[seed["id"]]: 0 for seed in seed_list[:max_nodes]}
+        visited = np.zeros(len(self.nodes), dtype=bool)
+        visited[list(hop_of)] = True
+        frontier = np.fromiter(hop_of, dtype=np.int64)
+
+        for hop in range(1, hops + 1):
+            capacity = max_nodes - len(hop_of)
+            if capacity <= 0 or not len(frontier):
+                break
+            neighbors = np.concatenate(
+                [self._indices[self._indptr[i]:self._indptr[i + 1]] for i in frontier]
+            ) if len(frontier) else np.zeros(0, dtype=np.int64)
+            neighbors = np.unique(neighbors)
+            neighbors = neighbors[~visited[neighbors]]
+            if len(neighbors) > capacity:
+                neighbors = neighbors[np.argsort(-self._priority[neighbors], kind="stable")[:capacity]]
+            visited[neighbors] = True
+            hop_of.update((int(i), hop) for i in neighbors)
+            frontier = neighbors
+
+        selected = np.fromiter(hop_of, dtype=np.int64)
+        induced = self._directed[selected][:, selected].tocoo()
+        links = [
+            {
+                "source": self.nodes[selected[r]],
+                "relation": self._relations.get((int(selected[r]), int(selected[c]))),
+                "target": self.nodes[selected[c]]
+            }
+            for r, c in zip(induced.row, induced.col)
+        ]
+        return {
+            "seeds": seed_list,
+            "nodes": [{"id": self.nodes[i], "hop": hop} for i, hop in hop_of.items()],
+            "links": links,
+            "context": [f"{link['source']} --{link['relation'] or 'related to'}--> {link['target']}" for link in links],
+            "milliseconds": (time.perf_counter() - start) * 1000.0
+        }
+
+
+if __name__ == "__main__":
+    # Query an exported graph: python GraphQueryEngine.py output/graph_<topic>.json "question" [hops]
+    from Embedders import create_embedder
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+    engine = GraphQueryEngine.from_export(sys.argv[1], create_embedder(config))
+    result = engine.query(sys.argv[2], hops=int(sys.argv[3]) if len(sys.argv) > 3 else 2)
+    print("Seeds: " + ", ".join(f"{seed['id']} ({seed['distance']:.3f})" for seed in result["seeds"]))
+    print("\n".join(result["context"]))
+    print(f"{len(result['nodes'])} nodes, {len(result['links'])} links in {result['milliseconds']:.1f} ms")
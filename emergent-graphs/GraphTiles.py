@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import sys
+from collections import Counter, defaultdict
+from typing import List, Dict, Any
+
+
+def _write_json(path: str, data: Any) -> int:
+    """Write compact JSON and return the file size in bytes."""
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(",", ":"))
+    return os.path.getsize(path)
+
+
+def _ensure_communities(graph_data: Dict[str, Any]) -> None:
+    """Add label-propagation communities to nodes of graph data exported without analytics."""
+    nodes = graph_data.get("nodes", [])
+    if all("community" in node for node in nodes):
+        return
+    from GraphAnalytics import adjacency_from_node_link, label_propagation
+    _, adjacency = adjacency_from_node_link(graph_data)
+    for node, community in zip(nodes, label_propagation(adjacency)):
+        node["community"] = int(community)
+
+
+def _pack_shards(community_sizes: Counter, min_shard_nodes: int) -> Dict[int, int]:
+    """
+    Assign communities to shards.
+
+    Communities with at least min_shard_nodes nodes get a shard of their own; smaller
+    ones are packed together until a shard holds min_shard_nodes nodes, so a graph
+    with many tiny communities does not turn into thousands of tiny files.
+    """
+    shard_of = {}
+    shard = 0
+    packed = 0
+    for community, size in sorted(community_sizes.items(), key=lambda item: (-item[1], item[0])):
+        if size >= min_shard_nodes:
+            shard_of[community] = shard
+            shard += 1
+            continue
+        shard_of[community] = shard
+        packed += size
+        if packed >= min_shard_nodes:
+            shard += 1
+            packed = 0
+    return shard_of
+
+
+def write_tiled_export(
+    graph_data: Dict[str, Any],
+    tiles_dir: str,
+    min_shard_nodes: int = 50,
+    top_nodes: int = 5
+) -> str:
+    """
+    Write a level-of-detail package of an exported graph.
+
+    The package holds a coarse summary graph with one node per community and one
+    weighted link per pair of connected communities, detail shards with the full
+    nodes and links of one or more communities, and an index.json that maps
+    communities to shards. A viewer loads the index and summary first and fetches
+    only the shards it displays. Links between communities are kept in the shards
+    of both endpoints as boundary links.
+
+    Args:
+        graph_data: Node-link graph data as written by the exporter
+        tiles_dir: Directory the package is written to
+        min_shard_nodes: Communities smaller than this share shards
+        top_nodes: Number of highest-PageRank node names listed per community
+
+    Returns:
+        Path of the index file
+    """
+    os.makedirs(tiles_dir, exist_ok=True)
+    # Shards of an earlier export would otherwise linger next to the new ones
+    for existing in os.listdir(tiles_dir):
+        if existing.startswith("shard_") and existing.endswith(".json"):
+            os.remove(os.path.join(tiles_dir, existing))
+    _ensure_communities(graph_data)
+    nodes = graph_data.get("nodes", [])
+    links = graph_data.get("links", graph_data.get("edges", []))
+    community_of = {node["id"]: node["community"] for node in nodes}
+
+    members = defaultdict(list)
+    for node in nodes:
+        members[node["community"]].append(node)
+    shard_of = _pack_shards(Counter({c: len(m) for c, m in members.items()}), min_shard_nodes)
+
+    shard_nodes = defaultdict(list)
+    shard_links = defaultdict(list)
+    shard_boundary = defaultdict(list)
+    for community, community_nodes in members.items():
+        shard_nodes[shard_of[community]].extend(community_nodes)
+
+    # Inter-community links are aggregated for the summary graph
+    summary_weights = Counter()
+    summary_relations = defaultdict(Counter)
+    for link in links:
+        source_community = community_of.get(link["source"])
+        target_community = community_of.get(link["target"])
+        if source_community is None or target_community is None:
+            continue
+        if source_community == target_community:
+            shard_links[shard_of[source_community]].append(link)
+            continue
+        key = (source_community, target_community)
+        summary_weights[key] += 1
+        if link.get("relation"):
+            summary_relations[key][link["relation"]] += 1
+        if shard_of[source_community] == shard_of[target_community]:
+            shard_links[shard_of[source_community]].append(link)
+            continue
+        boundary = dict(link, source_community=source_community, target_community=target_community)
+        shard_boundary[shard_of[source_community]].append(boundary)
+        shard_boundary[shard_of[target_community]].append(boundary)
+
+    shard_entries = []
+    for shard in sorted(set(shard_of.values())):
+        shard_file = f"shard_{shard:05d}.json"
+        shard_data = {
+            "directed": graph_data.get("directed", True),
+            "multigraph": graph_data.get("multigraph", False),
+            "graph": {"shard": shard},
+            "nodes": shard_nodes[shard],
+            "links": shard_links[shard],
+            "boundary_links": shard_boundary[shard]
+        }
+        size = _write_json(os.path.join(tiles_dir, shard_file), shard_data)
+        shard_entries.append({
+            "shard": shard,
+            "file": shard_file,
+            "communities": sorted(c for c, s in shard_of.items() if s == shard),
+            "nodes": len(shard_nodes[shard]),
+            "links": len(shard_links[shard]),
+            "boundary_links": len(shard_boundary[shard]),
+            "bytes": size
+        })
+
+    summary_nodes = []
+    for community, community_nodes in sorted(members.items()):
+        ranked = sorted(community_nodes, key=lambda node: -node.get("pagerank", node.get("degree", 0)))
+        summary_nodes.append({
+            "id": f"community:{community}",
+            "community": community,
+            "labels": [node["id"] for node in ranked[:top_nodes]],
+            "size": len(community_nodes),
+            "pagerank": sum(node.get("pagerank", 0.0) for node in community_nodes),
+            "shard": shard_of[community]
+        })
+    summary_links = [
+        {
+            "source": f"community:{source}",
+            "target": f"community:{target}",
+            "weight": weight,
+            "relations": [relation for relation, _ in summary_relations[(source, target)].most_common(3)]
+        }
+        for (source, target), weight in sorted(summary_weights.items())
+    ]
+    summary_file = "summary.json"
+    _write_json(os.path.join(tiles_dir, summary_file), {
+        "directed": True,
+        "multigraph": False,
+        "graph": {"level": "community"},
+        "nodes": summary_nodes,
+        "links": summary_links
+    })
+
+    index_file = os.path.join(tiles_dir, "index.json")
+    with open(index_file, 'w') as f:
+        json.dump({
+            "version": 1,
+            "graph": graph_data.get("graph", {}),
+            "nodes": len(nodes),
+            "links": len(links),
+            "communities": len(members),
+            "summary": summary_file,
+            "community_shards": {str(c): s for c, s in sorted(shard_of.items())},
+            "shards": shard_entries
+        }, f, indent=4)
+    logging.info(f"Tiled export: {len(members)} communities in {len(shard_entries)} shards at {tiles_dir}")
+    return index_file
+
+
+if __name__ == "__main__":
+    # Tile an existing export: python GraphTiles.py output/graph_<topic>.json [min_shard_nodes]
+    graph_file = sys.argv[1]
+    with open(graph_file, 'r') as f:
+        data = json.load(f)
+    min_nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(write_tiled_export(data, os.path.splitext(graph_file)[0] + "_tiles", min_nodes))
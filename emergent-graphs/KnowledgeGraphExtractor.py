@@ -1,16 +1,69 @@
 import logging
 import re
 import json
+import time
 import uuid
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional, Any, Callable, Set, Union
 
 
+# JSON schema for the extraction output, used as a tool definition (Anthropic)
+# and to describe the expected object when the provider only offers a JSON mode (Ollama)
+EXTRACTION_SCHEMA = {
+    "title": "record_knowledge_graph",
+    "description": "Record the entities and relationships extracted from the text.",
+    "type": "object",
+    "properties": {
+        "entities": {
+            "type": "array",
+            "description": "The entities/concepts found in the text.",
+            "items": {"type": "string"}
+        },
+        "relationships": {
+            "type": "array",
+            "description": "Relationships as [entity1, relation, entity2] triples.",
+            "items": {
+                "type": "array",
+                "items": {"type": "string"},
+                "minItems": 3,
+                "maxItems": 3
+            }
+        }
+    },
+    "required": ["entities", "relationships"]
+}
+
+# Output instructions for the structured path (tool input or JSON mode) and the fenced fallback
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+Format your response as a JSON object with:
+- 'entities': list of strings (the entities/concepts).
+- 'relationships': list of triples [entity1, relation, entity2].
+
+IMPORTANT: Return ONLY the JSON object, with no additional text.
+"""
+
+FENCED_OUTPUT_INSTRUCTIONS = """
+Format your response as a JSON object with:
+- 'entities': list of strings (the entities/concepts).
+- 'relationships': list of triples [entity1, relation, entity2].
+
+IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` marks, with no additional text.
+"""
+
+ACRONYM_PATTERN = re.compile(r'(.*?)\s*\(([A-Z]{2,})\)')
+
+
 class KnowledgeGraphExtractor:
     """
     A utility class for extracting entities and relationships from text
     for building knowledge graphs using LLMs.
+
+    The extractor keeps an in-memory name index of the graph nodes, an LRU cache
+    of entity embeddings and a buffer of pending vector store writes, so that
+    matching a batch of entities costs one embedding call, one vector query and
+    one vector store write instead of one of each per entity.
     """
-    
+
     def __init__(
         self,
         llm: Callable[[str], str],
@@ -18,11 +71,14 @@ class KnowledgeGraphExtractor:
         embedder: Optional[Any] = None,
         concept_collection: Optional[Any] = None,
         concept_similarity_threshold: float = 0.15,
-        max_graph_nodes: int = 1000
+        max_graph_nodes: int = 1000,
+        structured_llm: Optional[Callable[[str], Any]] = None,
+        embedding_cache_size: int = 4096,
+        vector_batch_size: int = 64
     ):
         """
         Initialize the knowledge graph extractor.
-        
+
         Args:
             llm: Function that takes a prompt and returns LLM-generated text
             graph_db: Graph database interface (must support nodes(), add_node(), add_edge())
@@ -30,6 +86,10 @@ class KnowledgeGraphExtractor:
             concept_collection: Optional vector store for concept similarity search
             concept_similarity_threshold: Threshold for considering concepts similar (lower is stricter)
             max_graph_nodes: Maximum number of nodes to allow in the graph
+            structured_llm: Optional function that takes a prompt and returns the extraction as a
+                dict (tool calling) or a JSON string (JSON mode); the fenced parser is used if it fails
+            embedding_cache_size: Maximum number of entity embeddings kept in memory
+            vector_batch_size: Number of pending concept vectors that triggers a vector store write
         """
         self.llm = llm
         self.graph_db = graph_db
@@ -37,8 +97,20 @@ class KnowledgeGraphExtractor:
         self.concept_collection = concept_collection
         self.concept_similarity_threshold = concept_similarity_threshold
         self.max_graph_nodes = max_graph_nodes
+        self.structured_llm = structured_llm
+        self.embedding_cache_size = embedding_cache_size
+        self.vector_batch_size = vector_batch_size
         self.entity_to_node_id = {}
-        
+
+        # Lowercase name -> node, and acronym / full form -> node, kept in sync with the graph
+        self._name_index: Dict[str, str] = {}
+        self._acronym_index: Dict[str, str] = {}
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending_vectors: List[Tuple[str, List[float]]] = []
+        self.metrics: Dict[str, Union[int, float]] = {}
+        self.reset_metrics()
+        self.rebuild_index()
+
         # Set up logging
         self.logger = logging.getLogger(__name__)
         if not self.logger.handlers:
@@ -47,77 +119,320 @@ class KnowledgeGraphExtractor:
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
             self.logger.setLevel(logging.INFO)
-    
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], llm: Callable[[str], str], **kwargs) -> "KnowledgeGraphExtractor":
+        """
+        Create an extractor with the matching and batching settings from config.json.
+
+        Args:
+            config: Parsed config.json
+            llm: Function that takes a prompt and returns LLM-generated text
+            **kwargs: Remaining constructor arguments (graph_db, embedder, concept_collection, structured_llm)
+
+        Returns:
+            Configured KnowledgeGraphExtractor
+        """
+        return cls(
+            llm=llm,
+            concept_similarity_threshold=config.get("concept_similarity_threshold", 0.3),
+            max_graph_nodes=config.get("max_graph_nodes", 1000),
+            embedding_cache_size=config.get("embedding_cache_size", 4096),
+            vector_batch_size=config.get("vector_batch_size", 64),
+            **kwargs
+        )
+
+    def reset(self) -> None:
+        """Clear the graph, the entity mapping and the name index for a new run."""
+        self.flush()
+        if self.graph_db is not None:
+            self.graph_db.clear()
+        self.entity_to_node_id.clear()
+        self.rebuild_index()
+
+    def reset_metrics(self) -> None:
+        """Reset the extraction counters."""
+        self.metrics = {
+            "extractions": 0,
+            "structured_parses": 0,
+            "fenced_parses": 0,
+            "parse_failures": 0,
+            "direct_matches": 0,
+            "acronym_matches": 0,
+            "vector_matches": 0,
+            "new_nodes": 0,
+            "embeddings_computed": 0,
+            "embedding_cache_hits": 0,
+            "vector_queries": 0,
+            "vector_writes": 0,
+            "extraction_seconds": 0.0
+        }
+
+    def get_metrics(self) -> Dict[str, Union[int, float]]:
+        """Return a copy of the extraction counters."""
+        return dict(self.metrics)
+
+    def rebuild_index(self) -> None:
+        """Rebuild the name index from the current graph nodes."""
+        self._name_index.clear()
+        self._acronym_index.clear()
+        if self.graph_db is None:
+            return
+        for node in self.graph_db.nodes():
+            self._index_node(node)
+
+    def flush(self) -> None:
+        """Write pending concept vectors to the vector store."""
+        if not self._pending_vectors or self.concept_collection is None:
+            self._pending_vectors = []
+            return
+        try:
+            self.concept_collection.add(
+                embeddings=[vector for _, vector in self._pending_vectors],
+                metadatas=[{"entity": entity_lower} for entity_lower, _ in self._pending_vectors],
+                ids=[str(uuid.uuid4()) for _ in self._pending_vectors]
+            )
+            self.metrics["vector_writes"] += 1
+        except Exception as e:
+            self.logger.error(f"Error adding to vector store: {e}")
+        self._pending_vectors = []
+
+    def warm_start(self, graph_data: Dict[str, Any]) -> int:
+        """
+        Seed the graph, the name index and the concept vectors from an exported graph.
+
+        Args:
+            graph_data: Node-link graph data as written by the exporter
+
+        Returns:
+            Number of nodes loaded
+        """
+        if self.graph_db is None:
+            return 0
+
+        added = []
+        for node_data in graph_data.get("nodes", []):
+            node = node_data.get("id")
+            if not node or node in self.graph_db.nodes():
+                continue
+            self.graph_db.add_node(node)
+            self.graph_db.nodes[node]["labels"] = set(node_data.get("labels") or [node])
+            self._index_node(node)
+            added.append(node)
+
+        for link in graph_data.get("links", graph_data.get("edges", [])):
+            source, target = link.get("source"), link.get("target")
+            if source in self.graph_db.nodes() and target in self.graph_db.nodes():
+                self.graph_db.add_edge(source, target, relation=link.get("relation"))
+
+        # All concept vectors are embedded in one batch and written in vector_batch_size chunks
+        if added and self.embedder and self.concept_collection:
+            try:
+                lowered = [node.lower() for node in added]
+                for entity_lower, vector in zip(lowered, self._embed_many(lowered)):
+                    self._pending_vectors.append((entity_lower, vector))
+                    if len(self._pending_vectors) >= self.vector_batch_size:
+                        self.flush()
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Error warming concept vectors: {e}")
+
+        self.logger.info(f"Warm start loaded {len(added)} nodes")
+        return len(added)
+
+    def compact_vector_store(self) -> int:
+        """
+        Delete concept vectors whose entity is no longer a node in the graph.
+
+        Returns:
+            Number of vectors deleted
+        """
+        self.flush()
+        if self.concept_collection is None or self.graph_db is None:
+            return 0
+        try:
+            stored = self.concept_collection.get(include=["metadatas"])
+            seen = set()
+            stale_ids = []
+            for vector_id, metadata in zip(stored.get("ids", []), stored.get("metadatas") or []):
+                entity = (metadata or {}).get("entity")
+                # Keep one vector per live node
+                if entity not in self._name_index or entity in seen:
+                    stale_ids.append(vector_id)
+                else:
+                    seen.add(entity)
+            if stale_ids:
+                self.concept_collection.delete(ids=stale_ids)
+            self.logger.info(f"Compacted concept vectors: removed {len(stale_ids)}, kept {len(seen)}")
+            return len(stale_ids)
+        except Exception as e:
+            self.logger.error(f"Error compacting vector store: {e}")
+            return 0
+
     def extract_from_text(
-        self, 
+        self,
         text: str,
         topic: Optional[str] = None,
         extraction_prompt_template: Optional[str] = None
     ) -> Tuple[List[str], List[List[str]]]:
         """
         Extract entities and relationships from text and add to graph.
-        
+
         Args:
             text: Text to analyze for entities and relationships
             topic: Optional topic description to focus extraction
             extraction_prompt_template: Optional custom prompt template
-            
+
         Returns:
             Tuple of (list of entities, list of relationships)
         """
+        start = time.perf_counter()
         try:
-            # Use default topic if none provided
-            if topic is None:
-                topic = "the given subject"
-            
-            # Get current nodes as string representation for prompt context
-            current_nodes_str = self._get_current_nodes_str()
-            
-            # Use default or custom extraction prompt
-            if extraction_prompt_template is None:
-                extraction_prompt = self._create_default_extraction_prompt(text, topic, current_nodes_str)
-            else:
-                extraction_prompt = extraction_prompt_template.format(
-                    text=text, 
-                    topic=topic, 
-                    current_nodes=current_nodes_str
-                )
-            
-            # Extract JSON from LLM response
-            extraction_data = self._extract_json_from_llm_response(extraction_prompt)
+            extraction_data = self.request_extraction(text, topic, extraction_prompt_template)
             if not extraction_data:
                 return [], []
-                
+
             entities = extraction_data.get("entities", [])
             relationships = extraction_data.get("relationships", [])
-            
+
             # Process entities and add to graph if graph_db is provided
             if self.graph_db is not None:
                 self._process_entities(entities)
                 self._process_relationships(relationships)
-            
+
             return entities, relationships
-            
+
         except Exception as e:
             self.logger.error(f"Extraction error: {e}")
             import traceback
             self.logger.error(traceback.format_exc())
             return [], []
-    
+        finally:
+            self.metrics["extraction_seconds"] += time.perf_counter() - start
+
+    def request_extraction(
+        self,
+        text: str,
+        topic: Optional[str] = None,
+        extraction_prompt_template: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Ask the LLM for the entities and relationships of a text without changing the graph.
+
+        Args:
+            text: Text to analyze for entities and relationships
+            topic: Optional topic description to focus extraction
+            extraction_prompt_template: Optional custom prompt template
+
+        Returns:
+            Dict with 'entities' and 'relationships', or None if the output could not be parsed
+        """
+        self.metrics["extractions"] += 1
+
+        # Use default topic if none provided
+        if topic is None:
+            topic = "the given subject"
+
+        # Get current nodes as string representation for prompt context
+        current_nodes_str = self._get_current_nodes_str()
+
+        # Use default or custom extraction prompt; a custom template carries its own output instructions
+        if extraction_prompt_template is None:
+            extraction_prompt = self._create_default_extraction_prompt(text, topic, current_nodes_str)
+            structured_prompt = extraction_prompt + STRUCTURED_OUTPUT_INSTRUCTIONS
+            fenced_prompt = extraction_prompt + FENCED_OUTPUT_INSTRUCTIONS
+        else:
+            structured_prompt = fenced_prompt = extraction_prompt_template.format(
+                text=text,
+                topic=topic,
+                current_nodes=current_nodes_str
+            )
+
+        # Prefer the provider's structured output; only fall back to a fenced-JSON call if it fails
+        extraction_data = None
+        if self.structured_llm is not None:
+            extraction_data = self._extract_structured(structured_prompt)
+        if extraction_data is None:
+            extraction_data = self._extract_json_from_llm_response(fenced_prompt)
+        if not extraction_data:
+            self.metrics["parse_failures"] += 1
+            return None
+        return extraction_data
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Take a read-only copy of the name index and the concept vectors.
+
+        Worker processes match entities against the snapshot and return deltas
+        for merge_delta, so the graph itself never leaves this process.
+
+        Returns:
+            Dict with 'names', 'acronyms', 'vector_entities' and 'vectors' (one row per entity)
+        """
+        self.flush()
+        vector_entities, vectors = [], []
+        if self.embedder and self.concept_collection is not None:
+            try:
+                stored = self.concept_collection.get(include=["embeddings", "metadatas"])
+                embeddings = stored.get("embeddings")
+                for metadata, vector in zip(stored.get("metadatas") or [], [] if embeddings is None else embeddings):
+                    entity = (metadata or {}).get("entity")
+                    if entity in self._name_index:
+                        vector_entities.append(entity)
+                        vectors.append(list(vector))
+            except Exception as e:
+                self.logger.error(f"Error reading concept vectors for snapshot: {e}")
+        return {
+            "names": dict(self._name_index),
+            "acronyms": dict(self._acronym_index),
+            "vector_entities": vector_entities,
+            "vectors": vectors
+        }
+
+    def merge_delta(self, delta: Dict[str, Any], recent_vectors: List[Tuple[str, List[float]]]) -> None:
+        """
+        Apply the node and edge delta a worker proposed from a snapshot.
+
+        Entities the worker matched are mapped as proposed. Entities it proposed as
+        new are checked again, because another delta merged since the snapshot may
+        have added the same name or a similar concept; only the remaining ones become
+        nodes. Relationships are then added with the resolved mapping.
+
+        Args:
+            delta: Worker result with 'mapped', 'new', 'relationships' and 'metrics'
+            recent_vectors: (entity, vector) pairs of concepts added since the snapshot;
+                extended with the concepts this delta adds
+        """
+        self.entity_to_node_id.update(delta["mapped"])
+        for key, value in delta["metrics"].items():
+            self.metrics[key] += value
+
+        for entity, vector in delta["new"]:
+            entity_lower = entity.lower()
+            if self._check_direct_match(entity, entity_lower) or self._check_acronym_match(entity, entity_lower):
+                continue
+            if vector is not None and self._match_pending_vector(entity, vector, recent_vectors):
+                continue
+            self._add_new_entity(entity, entity_lower, vector)
+            if vector is not None and entity in self.graph_db.nodes():
+                recent_vectors.append((entity_lower, vector))
+
+        self._process_relationships(delta["relationships"])
+
     def _get_current_nodes_str(self) -> str:
         """Get a string representation of current graph nodes."""
         if self.graph_db is None:
             return "None"
-            
+
         try:
             nodes_list = list(self.graph_db.nodes())
         except Exception:
             nodes_list = []
-            
+
         return ", ".join(nodes_list) if nodes_list else "None"
-    
+
     def _create_default_extraction_prompt(self, text: str, topic: str, current_nodes_str: str) -> str:
-        """Create the default extraction prompt for the LLM."""
+        """Create the default extraction prompt for the LLM, without output instructions."""
         return f"""
 Your task is to analyze natural language text and extract key concepts, entities, and their relationships.
 
@@ -135,150 +450,231 @@ IMPORTANT GUIDELINES FOR ENTITIES:
 - Merge similar concepts and use the most precise/complete form
 
 Text to analyze: {text}
+"""
 
-Format your response as a JSON object with:
-- 'entities': list of strings (the entities/concepts).
-- 'relationships': list of triples [entity1, relation, entity2].
+    def _extract_structured(self, prompt: str) -> Optional[Dict]:
+        """Run extraction through the structured LLM; returns None if the output could not be used."""
+        try:
+            result = self.structured_llm(prompt)
+        except Exception as e:
+            self.logger.warning(f"Structured extraction call failed, falling back to fenced JSON: {e}")
+            return None
 
-IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` marks, with no additional text.
-"""
+        try:
+            extracted = self._coerce_extraction(result)
+        except (json.JSONDecodeError, TypeError) as e:
+            # JSON mode should not produce invalid JSON, but a fenced block may still be recoverable
+            extracted = self._parse_fenced_json(str(result))
+            if extracted is None:
+                self.logger.warning(f"Structured extraction returned unparseable output: {e}")
+                return None
 
-    def _extract_json_from_llm_response(self, prompt: str) -> Dict:
-        """Extract and parse JSON from LLM response."""
-        # Get LLM response
-        llm_response = self.llm(prompt).strip()
-        self.logger.info(f"Extraction LLM response: {llm_response[:100]}...")
-        
+        if extracted is None:
+            self.logger.warning(f"Structured extraction returned unexpected output: {str(result)[:100]}...")
+            return None
+        self.metrics["structured_parses"] += 1
+        return extracted
+
+    @staticmethod
+    def _coerce_extraction(result: Any) -> Optional[Dict]:
+        """Normalize a structured extraction result to a dict with 'entities' and 'relationships'."""
+        if isinstance(result, str):
+            result = json.loads(re.sub(r'<think>.*?</think>', '', result, flags=re.DOTALL).strip())
+        if not isinstance(result, dict):
+            return None
+        entities = [e for e in result.get("entities", []) if isinstance(e, str)]
+        relationships = [list(r) for r in result.get("relationships", []) if isinstance(r, (list, tuple))]
+        return {"entities": entities, "relationships": relationships}
+
+    def _parse_fenced_json(self, llm_response: str) -> Optional[Dict]:
+        """Parse the ```json fenced block of an LLM response."""
         # Remove thinking sections if present
         llm_response_clean = re.sub(r'<think>.*?</think>', '', llm_response, flags=re.DOTALL).strip()
-        
+
         # Extract JSON part from response
         json_match = re.search(r'```json(.*?)```', llm_response_clean, re.DOTALL)
         if not json_match:
             self.logger.error(f"Could not extract JSON from response: {llm_response_clean[:100]}...")
-            return {}
-        
+            return None
+
         # Parse the JSON data
         json_str = json_match.group(1).strip()
         if not json_str:
             self.logger.error("Extracted JSON string is empty")
-            return {}
-        
+            return None
+
         self.logger.info(f"JSON block extracted: {json_str[:100]}...")
-        
+
         try:
-            return json.loads(json_str)
+            extracted = json.loads(json_str)
         except json.JSONDecodeError as e:
             self.logger.error(f"Failed to parse JSON: {e}, JSON string: {json_str[:100]}...")
+            return None
+        return extracted if isinstance(extracted, dict) else None
+
+    def _extract_json_from_llm_response(self, prompt: str) -> Dict:
+        """Extract and parse JSON from LLM response."""
+        # Get LLM response
+        llm_response = self.llm(prompt).strip()
+        self.logger.info(f"Extraction LLM response: {llm_response[:100]}...")
+
+        extracted = self._parse_fenced_json(llm_response)
+        if extracted is None:
             return {}
-    
+        self.metrics["fenced_parses"] += 1
+        return extracted
+
     def _process_entities(self, entities: List[str]) -> None:
         """Process entities and add to graph, using similarity matching if available."""
+        unmatched = []
         for entity in entities:
             # Skip empty entities
-            if not entity:
+            if not entity or not isinstance(entity, str):
                 continue
-                
+
             entity_lower = entity.lower()
-            match_found = self._find_entity_match(entity, entity_lower)
-            
-            # If no match found, add as new node
-            if not match_found:
-                self._add_new_entity(entity, entity_lower)
-    
-    def _find_entity_match(self, entity: str, entity_lower: str) -> bool:
-        """Find if entity matches existing node using various methods."""
-        # Try direct match
-        if self._check_direct_match(entity, entity_lower):
-            return True
-            
-        # Try acronym match
-        if self._check_acronym_match(entity, entity_lower):
-            return True
-            
-        # Try vector similarity
-        if self._check_vector_similarity(entity, entity_lower):
-            return True
-            
-        return False
-    
+            if self._check_direct_match(entity, entity_lower) or self._check_acronym_match(entity, entity_lower):
+                continue
+            unmatched.append(entity)
+
+        # Entities without a name match are embedded and queried as one batch
+        if unmatched:
+            self._match_or_add_by_vector(unmatched)
+        self.flush()
+
+    def _index_node(self, node: str) -> None:
+        """Add a node to the name index."""
+        node_lower = node.lower()
+        self._name_index.setdefault(node_lower, node)
+        node_match = ACRONYM_PATTERN.search(node)
+        if node_match:
+            self._acronym_index.setdefault(node_match.group(2).lower(), node)
+            self._acronym_index.setdefault(node_match.group(1).strip().lower(), node)
+
     def _check_direct_match(self, entity: str, entity_lower: str) -> bool:
         """Check for direct match with existing nodes."""
-        try:
-            for node in self.graph_db.nodes():
-                if entity_lower == node.lower():
-                    self.entity_to_node_id[entity] = node
-                    self.logger.info(f"Mapped '{entity}' to existing node '{node}'")
-                    return True
-        except Exception as e:
-            self.logger.error(f"Error checking nodes: {e}")
-        return False
-    
+        node = self._name_index.get(entity_lower)
+        if node is None:
+            return False
+        self.entity_to_node_id[entity] = node
+        self.metrics["direct_matches"] += 1
+        self.logger.info(f"Mapped '{entity}' to existing node '{node}'")
+        return True
+
     def _check_acronym_match(self, entity: str, entity_lower: str) -> bool:
         """Check for acronym matches with existing nodes."""
-        try:
-            # Check if entity is in format "Full Name (ACRONYM)"
-            acronym_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', entity)
-            if not acronym_match:
-                return False
-                
-            full_form = acronym_match.group(1).strip().lower()
-            acronym = acronym_match.group(2).lower()
-            
-            for node in self.graph_db.nodes():
-                node_lower = node.lower()
-                if acronym == node_lower or full_form == node_lower:
-                    self.entity_to_node_id[entity] = node
-                    self.logger.info(f"Acronym match: '{entity}' -> '{node}'")
-                    return True
-                    
-                # Check if node has acronym
-                node_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', node)
-                if node_match:
-                    node_full = node_match.group(1).strip().lower()
-                    node_acronym = node_match.group(2).lower()
-                    if acronym == node_acronym or full_form == node_full:
-                        self.entity_to_node_id[entity] = node
-                        self.logger.info(f"Acronym-acronym match: '{entity}' -> '{node}'")
-                        return True
-        except Exception as e:
-            self.logger.error(f"Error in acronym matching: {e}")
+        # Check if entity is in format "Full Name (ACRONYM)"
+        acronym_match = ACRONYM_PATTERN.search(entity)
+        if not acronym_match:
+            return False
+
+        full_form = acronym_match.group(1).strip().lower()
+        acronym = acronym_match.group(2).lower()
+
+        # A plain node named like the acronym or the full form
+        for key in (acronym, full_form):
+            node = self._name_index.get(key)
+            if node is not None:
+                self.entity_to_node_id[entity] = node
+                self.metrics["acronym_matches"] += 1
+                self.logger.info(f"Acronym match: '{entity}' -> '{node}'")
+                return True
+
+        # A node that has the same acronym or full form
+        for key in (acronym, full_form):
+            node = self._acronym_index.get(key)
+            if node is not None:
+                self.entity_to_node_id[entity] = node
+                self.metrics["acronym_matches"] += 1
+                self.logger.info(f"Acronym-acronym match: '{entity}' -> '{node}'")
+                return True
         return False
-    
-    def _check_vector_similarity(self, entity: str, entity_lower: str) -> bool:
-        """Check for vector similarity with existing nodes."""
-        if not (self.embedder and self.concept_collection):
+
+    def _embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in one batch, serving repeated texts from the embedding cache."""
+        missing = [text for text in dict.fromkeys(texts) if text not in self._embedding_cache]
+        self.metrics["embedding_cache_hits"] += len(texts) - len(missing)
+        if missing:
+            vectors = self.embedder.encode(missing)
+            self.metrics["embeddings_computed"] += len(missing)
+            for text, vector in zip(missing, vectors):
+                self._embedding_cache[text] = vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+        result = []
+        for text in texts:
+            self._embedding_cache.move_to_end(text)
+            result.append(self._embedding_cache[text])
+        while len(self._embedding_cache) > self.embedding_cache_size:
+            self._embedding_cache.popitem(last=False)
+        return result
+
+    def _lookup_similar_entity(self, similar_entity: Optional[str], entity: str, distance: float) -> bool:
+        """Map entity to the node of a similar concept, if that node is still in the graph."""
+        if not similar_entity:
+            return False
+        node = self._name_index.get(similar_entity)
+        if node is None:
             return False
-            
+        self.entity_to_node_id[entity] = node
+        self.metrics["vector_matches"] += 1
+        self.logger.info(f"Vector similarity match: '{entity}' -> '{node}' (distance: {distance})")
+        return True
+
+    def _match_or_add_by_vector(self, entities: List[str]) -> None:
+        """Match entities by vector similarity in one batch, adding the ones that have no match."""
+        if not (self.embedder and self.concept_collection):
+            for entity in entities:
+                entity_lower = entity.lower()
+                if not (self._check_direct_match(entity, entity_lower) or self._check_acronym_match(entity, entity_lower)):
+                    self._add_new_entity(entity, entity_lower)
+            return
+
+        lowered = [entity.lower() for entity in entities]
+        vectors, results = None, {}
         try:
-            vector = self.embedder.encode(entity_lower).tolist()
-            results = self.concept_collection.query(
-                query_embeddings=[vector], 
-                n_results=1
-            )
-            
-            if (results.get("distances") and results["distances"] and 
-                results["distances"][0] and len(results["distances"][0]) > 0):
-                
-                distance = results["distances"][0][0]
-                
-                if (distance < self.concept_similarity_threshold and 
-                    results.get("metadatas") and results["metadatas"] and 
-                    results["metadatas"][0] and len(results["metadatas"][0]) > 0):
-                    
-                    similar_entity = results["metadatas"][0][0].get("entity")
-                    if similar_entity:
-                        # Find the actual node with this normalized name
-                        for node in self.graph_db.nodes():
-                            if node.lower() == similar_entity:
-                                self.entity_to_node_id[entity] = node
-                                self.logger.info(f"Vector similarity match: '{entity}' -> '{node}' (distance: {distance})")
-                                return True
+            vectors = self._embed_many(lowered)
+            results = self.concept_collection.query(query_embeddings=vectors, n_results=1)
+            self.metrics["vector_queries"] += 1
         except Exception as e:
             self.logger.error(f"Vector similarity error: {e}")
+
+        distances = results.get("distances") or []
+        metadatas = results.get("metadatas") or []
+        for i, (entity, entity_lower) in enumerate(zip(entities, lowered)):
+            # An earlier entity in this batch may have added the same name or acronym
+            if self._check_direct_match(entity, entity_lower) or self._check_acronym_match(entity, entity_lower):
+                continue
+
+            if i < len(distances) and distances[i] and i < len(metadatas) and metadatas[i]:
+                distance = distances[i][0]
+                if distance < self.concept_similarity_threshold:
+                    if self._lookup_similar_entity(metadatas[i][0].get("entity"), entity, distance):
+                        continue
+
+            # Concepts added earlier in this batch are not in the vector store yet
+            if vectors is not None and self._match_pending_vector(entity, vectors[i]):
+                continue
+
+            self._add_new_entity(entity, entity_lower, vectors[i] if vectors is not None else None)
+
+    def _match_pending_vector(
+        self,
+        entity: str,
+        vector: List[float],
+        candidates: Optional[List[Tuple[str, List[float]]]] = None
+    ) -> bool:
+        """Match entity against concept vectors that have not been written to the vector store yet."""
+        best_entity, best_distance = None, float("inf")
+        for pending_entity, pending_vector in self._pending_vectors if candidates is None else candidates:
+            # Squared L2, the default Chroma distance
+            distance = sum((a - b) * (a - b) for a, b in zip(vector, pending_vector))
+            if distance < best_distance:
+                best_entity, best_distance = pending_entity, distance
+        if best_distance < self.concept_similarity_threshold:
+            return self._lookup_similar_entity(best_entity, entity, best_distance)
         return False
-    
-    def _add_new_entity(self, entity: str, entity_lower: str) -> None:
+
+    def _add_new_entity(self, entity: str, entity_lower: str, vector: Optional[List[float]] = None) -> None:
         """Add new entity to graph and vector store if applicable."""
         try:
             if len(self.graph_db.nodes()) < self.max_graph_nodes:
@@ -287,30 +683,31 @@ IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` ma
                     self.graph_db.nodes[entity]["labels"] = set([entity])
                 else:
                     self.graph_db.nodes[entity]["labels"].add(entity)
-                    
+
                 self.entity_to_node_id[entity] = entity
+                self._index_node(entity)
+                self.metrics["new_nodes"] += 1
                 self.logger.info(f"Added new node: '{entity}'")
-                
+
                 # Add to vector store if available
-                self._add_to_vector_store(entity, entity_lower)
+                self._add_to_vector_store(entity, entity_lower, vector)
         except Exception as e:
             self.logger.error(f"Error adding node: {e}")
-    
-    def _add_to_vector_store(self, entity: str, entity_lower: str) -> None:
-        """Add entity to vector store if available."""
+
+    def _add_to_vector_store(self, entity: str, entity_lower: str, vector: Optional[List[float]] = None) -> None:
+        """Queue entity for the vector store if available."""
         if not (self.embedder and self.concept_collection):
             return
-            
+
         try:
-            vector = self.embedder.encode(entity_lower).tolist()
-            self.concept_collection.add(
-                embeddings=[vector],
-                metadatas=[{"entity": entity_lower}],
-                ids=[str(uuid.uuid4())]
-            )
+            if vector is None:
+                vector = self._embed_many([entity_lower])[0]
+            self._pending_vectors.append((entity_lower, vector))
+            if len(self._pending_vectors) >= self.vector_batch_size:
+                self.flush()
         except Exception as e:
             self.logger.error(f"Error adding to vector store: {e}")
-    
+
     def _process_relationships(self, relationships: List[List[str]]) -> None:
         """Process relationships and add to graph."""
         for relation in relationships:
@@ -318,26 +715,26 @@ IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` ma
                 if not isinstance(relation, list) or len(relation) != 3:
                     self.logger.warning(f"Invalid relationship format: {relation}, skipping")
                     continue
-                    
+
                 e1, rel, e2 = relation
-                
+
                 # Use mapped entities or originals
                 node1 = self.entity_to_node_id.get(e1, e1)
                 node2 = self.entity_to_node_id.get(e2, e2)
-                
+
                 # Ensure both nodes exist
                 if node1 not in self.graph_db.nodes():
                     self._add_missing_node(node1)
-                    
+
                 if node2 not in self.graph_db.nodes():
                     self._add_missing_node(node2)
-                    
+
                 # Add the edge
                 self.graph_db.add_edge(node1, node2, relation=rel)
                 self.logger.info(f"Added relationship: {node1} - {rel} -> {node2}")
             except Exception as e:
                 self.logger.error(f"Error processing relationship: {e}")
-    
+
     def _add_missing_node(self, node: str) -> None:
         """Add missing node to graph."""
         try:
@@ -346,6 +743,7 @@ IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` ma
                 self.graph_db.nodes[node]["labels"] = set([node])
             else:
                 self.graph_db.nodes[node]["labels"].add(node)
+            self._index_node(node)
             self.logger.info(f"Added missing node for relationship: '{node}'")
         except Exception as e:
             self.logger.error(f"Error adding missing node: {e}")
@@ -361,11 +759,12 @@ def extract_entities_and_relationships(
     concept_collection: Optional[Any] = None,
     concept_similarity_threshold: float = 0.15,
     max_graph_nodes: int = 1000,
-    extraction_prompt_template: Optional[str] = None
+    extraction_prompt_template: Optional[str] = None,
+    structured_llm: Optional[Callable[[str], Any]] = None
 ) -> Tuple[List[str], List[List[str]]]:
     """
     Extract entities and relationships from text for knowledge graph construction.
-    
+
     Args:
         text: Text to analyze for entities and relationships
         llm: Function that takes a prompt and returns LLM-generated text
@@ -376,7 +775,8 @@ def extract_entities_and_relationships(
         concept_similarity_threshold: Threshold for considering concepts similar (lower is stricter)
         max_graph_nodes: Maximum number of nodes to allow in the graph
         extraction_prompt_template: Optional custom prompt template
-        
+        structured_llm: Optional function returning the extraction as a dict or JSON string
+
     Returns:
         Tuple of (list of entities, list of relationships)
     """
@@ -386,11 +786,12 @@ def extract_entities_and_relationships(
         embedder=embedder,
         concept_collection=concept_collection,
         concept_similarity_threshold=concept_similarity_threshold,
-        max_graph_nodes=max_graph_nodes
+        max_graph_nodes=max_graph_nodes,
+        structured_llm=structured_llm
     )
-    
+
     return extractor.extract_from_text(
         text=text,
         topic=topic,
         extraction_prompt_template=extraction_prompt_template
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,216 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any
+
+import numpy as np
+
+from KnowledgeGraphExtractor import KnowledgeGraphExtractor
+from ResourceFactory import ResourceFactory
+
+# Per-process resources of an extraction worker, created by _init_worker
+_worker_resources: Optional[ResourceFactory] = None
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    """Create the worker's resource factory; the embedding model loads on the first task."""
+    global _worker_resources
+    _worker_resources = ResourceFactory(config)
+
+
+def propose_delta(
+    snapshot: Dict[str, Any],
+    entities: List[str],
+    relationships: List[List[str]],
+    similarity_threshold: float
+) -> Dict[str, Any]:
+    """
+    Match the entities of one extraction against a snapshot and propose a graph delta.
+
+    Runs in a worker process. Name and acronym matching reuse the extractor's rules
+    on a copy of the snapshot index; the remaining entities are embedded in one batch
+    and matched to the nearest snapshot vector by squared L2, the default Chroma
+    distance. Entities without a match are proposed as new nodes together with
+    their vector, so the merger does not embed them again.
+
+    Args:
+        snapshot: Result of KnowledgeGraphExtractor.snapshot()
+        entities: Extracted entities
+        relationships: Extracted [entity1, relation, entity2] triples
+        similarity_threshold: Vector distance below which an entity maps to an existing node
+
+    Returns:
+        Delta with 'mapped' (entity -> existing node), 'new' ((entity, vector) pairs),
+        'relationships' and 'metrics' (counter increments for the extractor)
+    """
+    matcher = KnowledgeGraphExtractor(llm=None, concept_similarity_threshold=similarity_threshold)
+    matcher._name_index.update(snapshot["names"])
+    matcher._acronym_index.update(snapshot["acronyms"])
+
+    unmatched = []
+    for entity in entities:
+        if not entity or not isinstance(entity, str):
+            continue
+        entity_lower = entity.lower()
+        if matcher._check_direct_match(entity, entity_lower) or matcher._check_acronym_match(entity, entity_lower):
+            continue
+        if entity not in unmatched:
+            unmatched.append(entity)
+
+    new = []
+    if unmatched and not snapshot.get("embed", True):
+        new = [(entity, None) for entity in unmatched]
+    elif unmatched:
+        queries = np.asarray(_worker_resources.embedder().encode([e.lower() for e in unmatched]), dtype=np.float32)
+        matcher.metrics["embeddings_computed"] += len(unmatched)
+        stored = np.asarray(snapshot["vectors"], dtype=np.float32)
+        if len(stored):
+            distances = (
+                (queries ** 2).sum(axis=1)[:, None]
+                + (stored ** 2).sum(axis=1)[None, :]
+                - 2.0 * queries @ stored.T
+            )
+            nearest = distances.argmin(axis=1)
+        for i, (entity, vector) in enumerate(zip(unmatched, queries)):
+            if len(stored):
+                distance = float(distances[i, nearest[i]])
+                if distance < similarity_threshold and matcher._lookup_similar_entity(
+                    snapshot["vector_entities"][nearest[i]], entity, distance
+                ):
+                    continue
+            new.append((entity, vector.tolist()))
+
+    counted = ("direct_matches", "acronym_matches", "vector_matches", "embeddings_computed")
+    return {
+        "mapped": matcher.entity_to_node_id,
+        "new": new,
+        "relationships": [r for r in relationships if isinstance(r, list) and len(r) == 3],
+        "metrics": {key: matcher.metrics[key] for key in counted}
+    }
+
+
+class ExtractionWorkerPool:
+    """
+    Extracts a batch of texts with matching spread over worker processes.
+
+    The extraction LLM calls run concurrently on threads of this process. Each
+    result is then matched in a worker process against a read-only snapshot of the
+    extractor's name index and concept vectors, so embedding and matching run on
+    several cores instead of behind one GIL. The workers send back proposed node
+    and edge deltas, and the extractor, the only writer of the graph, merges them
+    in order and resolves concepts that several workers proposed as new.
+
+    Merging happens in the calling process rather than in a separate merger
+    process, because the graph, the extractor's indexes and the vector store
+    writes all live there. submit() and collect() let a caller overlap an
+    extraction with other work, e.g. generating the next prompt, and still merge
+    before the graph is read again.
+    """
+
+    def __init__(self, extractor: KnowledgeGraphExtractor, config: Dict[str, Any], workers: int = 2):
+        """
+        Initialize the worker pool.
+
+        Args:
+            extractor: Extractor that owns the graph and merges the deltas
+            config: Parsed config.json; workers build their own embedder from it
+            workers: Number of worker processes and of concurrent LLM calls
+        """
+        self.extractor = extractor
+        self.workers = workers
+        # Spawned workers do not inherit the parent's model threads or client connections
+        self._processes = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config,)
+        )
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        self._pending = []
+
+    def submit(self, texts: List[str], topic: Optional[str] = None) -> None:
+        """
+        Start extracting texts in the background; collect() merges the results into the graph.
+
+        All texts are matched against one snapshot taken now, so the graph must not
+        change until collect() has run.
+
+        Args:
+            texts: Texts to analyze
+            topic: Optional topic description to focus extraction
+        """
+        snapshot = self.extractor.snapshot()
+        snapshot["embed"] = bool(self.extractor.embedder and self.extractor.concept_collection)
+        for text in texts:
+            self._pending.append(self._threads.submit(self._propose, snapshot, text, topic))
+
+    def _propose(self, snapshot: Dict[str, Any], text: str, topic: Optional[str]) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Run one extraction LLM call on a thread and match its result in a worker process."""
+        data = self.extractor.request_extraction(text, topic)
+        if not data:
+            return None, None
+        delta = self._processes.submit(
+            propose_delta,
+            snapshot,
+            data.get("entities", []),
+            data.get("relationships", []),
+            self.extractor.concept_similarity_threshold
+        ).result()
+        return data, delta
+
+    def collect(self) -> List[Tuple[List[str], List[List[str]]]]:
+        """
+        Wait for the submitted extractions and merge their deltas into the graph, in submission order.
+
+        Returns:
+            One (entities, relationships) tuple per submitted text, as extract_from_text returns
+        """
+        start = time.perf_counter()
+        pending, self._pending = self._pending, []
+        results = []
+        recent_vectors = []
+        for future in pending:
+            try:
+                data, delta = future.result()
+                if delta is None:
+                    results.append(([], []))
+                    continue
+                self.extractor.merge_delta(delta, recent_vectors)
+                results.append((data.get("entities", []), data.get("relationships", [])))
+            except Exception as e:
+                logging.error(f"Extraction worker error: {e}")
+                results.append(([], []))
+        self.extractor.flush()
+
+        # Time spent waiting for extractions; with submit() most of it overlaps other work
+        self.extractor.metrics["extraction_seconds"] += time.perf_counter() - start
+        return results
+
+    def extract_many(self, texts: List[str], topic: Optional[str] = None) -> List[Tuple[List[str], List[List[str]]]]:
+        """
+        Extract entities and relationships from several texts and merge them into the graph.
+
+        Args:
+            texts: Texts to analyze
+            topic: Optional topic description to focus extraction
+
+        Returns:
+            One (entities, relationships) tuple per text, as extract_from_text returns
+        """
+        start = time.perf_counter()
+        self.submit(texts, topic)
+        results = self.collect()
+        logging.info(f"Parallel extraction of {len(texts)} texts with {self.workers} workers took {time.perf_counter() - start:.2f}s")
+        return results
+
+    def close(self) -> None:
+        """Shut down the worker processes and threads."""
+        self._threads.shutdown()
+        self._processes.shutdown()
+
+    def __enter__(self) -> "ExtractionWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
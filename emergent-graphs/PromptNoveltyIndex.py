@@ -0,0 +1,194 @@
+import logging
+import uuid
+from typing import List, Dict, Tuple, Optional, Any
+
+import numpy as np
+
+
+class PromptNoveltyIndex:
+    """
+    In-memory index of explored prompts for novelty checking.
+
+    Prompt embeddings are kept in a NumPy matrix, so a batch of candidate prompts
+    is scored against every explored prompt with one embedding call and one matrix
+    product instead of one vector store query per candidate. Distances are squared
+    L2, the same measure the Chroma prompt collection uses, so the configured
+    prompt_similarity_threshold keeps its meaning.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        similarity_threshold: float = 0.05,
+        prompt_collection: Optional[Any] = None
+    ):
+        """
+        Initialize the prompt novelty index.
+
+        Args:
+            embedder: Embedding model with an encode() method
+            similarity_threshold: Candidates closer than this to an explored prompt are rejected
+            prompt_collection: Optional vector store that accepted prompts are also written to
+        """
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.prompt_collection = prompt_collection
+        self.prompts: List[str] = []
+        self._prompts_lower: List[str] = []
+        # Lowercase prompt -> explored prompt, for exact duplicate checks
+        self._prompt_by_lower: Dict[str, str] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        return len(self.prompts)
+
+    def load_from_collection(self, source_collection: Optional[Any] = None) -> int:
+        """
+        Load stored prompts into the index.
+
+        Args:
+            source_collection: Collection to load from, defaults to the prompt collection. Prompts
+                loaded from another collection are copied into the prompt collection.
+
+        Returns:
+            Number of prompts loaded
+        """
+        source = source_collection if source_collection is not None else self.prompt_collection
+        if source is None:
+            return 0
+        try:
+            stored = source.get(include=["embeddings", "metadatas"])
+        except Exception as e:
+            self.logger.error(f"Error loading prompt collection: {e}")
+            return 0
+
+        embeddings = stored.get("embeddings")
+        metadatas = stored.get("metadatas") or []
+        if embeddings is None or len(embeddings) == 0:
+            return 0
+        prompts = [(metadata or {}).get("prompt", "") for metadata in metadatas]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        self._append(prompts, vectors)
+
+        if source is not self.prompt_collection and self.prompt_collection is not None:
+            try:
+                self.prompt_collection.add(
+                    embeddings=vectors.tolist(),
+                    metadatas=[{"prompt": prompt} for prompt in prompts],
+                    ids=[str(uuid.uuid4()) for _ in prompts]
+                )
+            except Exception as e:
+                self.logger.error(f"Error copying prompts to collection: {e}")
+        return len(prompts)
+
+    def add(self, prompt: str, vector: Optional[np.ndarray] = None) -> None:
+        """
+        Add an explored prompt to the index and the prompt collection.
+
+        Args:
+            prompt: Prompt text
+            vector: Optional precomputed embedding of the prompt
+        """
+        if vector is None:
+            vector = self._encode([prompt])[0]
+        vector = np.asarray(vector, dtype=np.float32)
+        self._append([prompt], vector.reshape(1, -1))
+
+        if self.prompt_collection is not None:
+            try:
+                self.prompt_collection.add(
+                    embeddings=[vector.tolist()],
+                    metadatas=[{"prompt": prompt}],
+                    ids=[str(uuid.uuid4())]
+                )
+            except Exception as e:
+                self.logger.error(f"Error adding prompt to collection: {e}")
+
+    def score(self, candidates: List[str]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]]]:
+        """
+        Score candidate prompts against the explored prompts.
+
+        Args:
+            candidates: Candidate prompt texts
+
+        Returns:
+            Tuple of (candidate embeddings, distance to the nearest explored prompt,
+            rejection reason per candidate or None if the candidate is acceptable)
+        """
+        vectors = self._encode(candidates)
+        if self._vectors is None or len(self.prompts) == 0:
+            nearest = np.full(len(candidates), np.inf, dtype=np.float32)
+            nearest_idx = np.full(len(candidates), -1)
+        else:
+            # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, for all pairs at once
+            distances = (
+                np.einsum("ij,ij->i", vectors, vectors)[:, None]
+                + self._sq_norms[None, :]
+                - 2.0 * vectors @ self._vectors.T
+            )
+            nearest_idx = distances.argmin(axis=1)
+            nearest = np.maximum(distances[np.arange(len(candidates)), nearest_idx], 0.0)
+
+        reasons: List[Optional[str]] = []
+        for i, candidate in enumerate(candidates):
+            if nearest[i] < self.similarity_threshold:
+                similar = self.prompts[nearest_idx[i]]
+                reasons.append(f"Vector similarity too high (score: {nearest[i]:.4f}). Too similar to: \"{similar[:100]}...\"")
+            else:
+                reasons.append(self._text_overlap(candidate))
+        return vectors, nearest, reasons
+
+    def select(self, candidates: List[str]) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Choose the most novel acceptable candidate and add it to the index.
+
+        Args:
+            candidates: Candidate prompt texts
+
+        Returns:
+            Tuple of (selected prompt or None, rejection reason per rejected candidate)
+        """
+        candidates = list(dict.fromkeys(c for c in candidates if c))
+        if not candidates:
+            return None, {}
+
+        vectors, nearest, reasons = self.score(candidates)
+        rejected = {c: r for c, r in zip(candidates, reasons) if r is not None}
+        accepted = [i for i, r in enumerate(reasons) if r is None]
+        if not accepted:
+            return None, rejected
+
+        best = max(accepted, key=lambda i: nearest[i])
+        self.add(candidates[best], vectors[best])
+        return candidates[best], rejected
+
+    def _text_overlap(self, candidate: str) -> Optional[str]:
+        """Check a candidate for exact, subset or superset text overlap with explored prompts."""
+        candidate_lower = candidate.lower()
+        if candidate_lower in self._prompt_by_lower:
+            return f"Exact duplicate of: \"{self._prompt_by_lower[candidate_lower][:100]}...\""
+        for prompt, prompt_lower in zip(self.prompts, self._prompts_lower):
+            if candidate_lower in prompt_lower:
+                return f"Subset of: \"{prompt[:100]}...\""
+            if prompt_lower and prompt_lower in candidate_lower:
+                return f"Superset of: \"{prompt[:100]}...\""
+        return None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in one batch as a 2D float32 matrix."""
+        return np.atleast_2d(np.asarray(self.embedder.encode(texts), dtype=np.float32))
+
+    def _append(self, prompts: List[str], vectors: np.ndarray) -> None:
+        """Append prompts and their embeddings to the index."""
+        self.prompts.extend(prompts)
+        self._prompts_lower.extend(p.lower() for p in prompts)
+        for p in prompts:
+            self._prompt_by_lower.setdefault(p.lower(), p)
+        sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        if self._vectors is None:
+            self._vectors, self._sq_norms = vectors, sq_norms
+        else:
+            self._vectors = np.vstack([self._vectors, vectors])
+            self._sq_norms = np.concatenate([self._sq_norms, sq_norms])
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+from typing import Dict, Tuple, Optional, Any
+
+
+# Heavy resources are shared by every factory in the process, keyed by the settings they were built with
+_shared_resources: Dict[Tuple, Any] = {}
+_shared_lock = threading.RLock()
+
+
+class ResourceFactory:
+    """
+    Lazily creates the LLM clients, embedding model, vector store client and graph
+    for a config.json.
+
+    Nothing heavy is imported or constructed until it is first used, so importing
+    main.py and validating a config is fast. Resources are cached process-wide by
+    the settings they depend on, so several configs that share a model or a
+    Chroma path share one warm instance.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize the resource factory.
+
+        Args:
+            config: Parsed config.json
+        """
+        self.config = config
+        self.llm_provider = config.get("llm_provider", "ollama")  # Default to ollama if not specified
+        self.model_name = config.get(
+            "model_name",
+            "deepseek-r1:32b" if self.llm_provider == "ollama" else "claude-3-7-sonnet-20250219"
+        )
+        self.temperature = config.get("temperature", 0.7)
+        self.extraction_mode = config.get("extraction_mode", "structured")  # "structured" or "fenced"
+        self.ollama_base_url = config.get("ollama_base_url", "http://localhost:11434")
+        self.embedding_model = config.get("embedding_model", "all-MiniLM-L6-v2")
+        self.embedding_backend = config.get("embedding_backend", "sentence_transformers")
+        self.chroma_path = config.get("chroma_path", "./chroma_db")
+
+        if self.llm_provider not in ("ollama", "anthropic"):
+            logging.error(f"Unsupported LLM provider: {self.llm_provider}. Use 'ollama' or 'anthropic'.")
+            raise ValueError(f"Unsupported LLM provider: {self.llm_provider}")
+
+        # Only get the API key from environment variables, never from config
+        self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if self.llm_provider == "anthropic" and not self.anthropic_api_key:
+            logging.error("Anthropic API key not found in environment variables. Please set ANTHROPIC_API_KEY in your .env file")
+            raise ValueError("Missing Anthropic API key in environment variables")
+
+    @staticmethod
+    def _shared(key: Tuple, create) -> Any:
+        """Return the shared resource for key, creating it on first use."""
+        with _shared_lock:
+            if key not in _shared_resources:
+                _shared_resources[key] = create()
+            return _shared_resources[key]
+
+    def llm(self) -> Any:
+        """Return the LLM for answers, prompts and fenced extraction."""
+        return self._shared(("llm", self.llm_provider, self.model_name, self.temperature), self._create_llm)
+
+    def structured_llm(self) -> Optional[Any]:
+        """Return an LLM that returns extraction output in a structured form, or None if unavailable."""
+        if self.extraction_mode != "structured":
+            return None
+        key = ("structured_llm", self.llm_provider, self.model_name, self.temperature)
+        return self._shared(key, self._create_structured_llm)
+
+    def embedder(self) -> Any:
+        """Return the sentence embedding model of the configured backend."""
+        key = (
+            "embedder",
+            self.embedding_backend,
+            self.embedding_model,
+            self.config.get("embedding_onnx_file"),
+            self.config.get("embedding_batch_size"),
+            self.config.get("embedding_threads")
+        )
+        return self._shared(key, self._create_embedder)
+
+    def answer_cache(self) -> Optional[Any]:
+        """Return the semantic answer cache, or None if answer_cache is off."""
+        if not self.config.get("answer_cache", False):
+            return None
+        key = (
+            "answer_cache",
+            self.embedding_backend,
+            self.embedding_model,
+            self.config.get("answer_cache_threshold", 0.05),
+            self.config.get("answer_cache_size", 512),
+            self.config.get("answer_cache_max_temperature", 1.0)
+        )
+        return self._shared(key, self._create_answer_cache)
+
+    def chroma_client(self) -> Any:
+        """Return the persistent Chroma client."""
+        return self._shared(("chroma_client", os.path.abspath(self.chroma_path)), self._create_chroma_client)
+
+    def new_graph(self) -> Any:
+        """Return a new, empty directed graph."""
+        import networkx as nx
+        return nx.DiGraph()
+
+    def _create_llm(self) -> Any:
+        if self.llm_provider == "ollama":
+            from langchain_community.llms import Ollama
+            logging.info(f"Using Ollama with model: {self.model_name}")
+            return Ollama(model=self.model_name, base_url=self.ollama_base_url, temperature=self.temperature)
+
+        from langchain_anthropic import ChatAnthropic
+        logging.info(f"Using Anthropic with model: {self.model_name}")
+        return ChatAnthropic(
+            model=self.model_name,
+            anthropic_api_key=self.anthropic_api_key,
+            temperature=self.temperature,
+            max_tokens=self.config.get("max_tokens", 4000)  # Configurable max response length
+        )
+
+    def _create_structured_llm(self) -> Optional[Any]:
+        from KnowledgeGraphExtractor import EXTRACTION_SCHEMA
+        try:
+            if self.llm_provider == "anthropic":
+                # Tool calling: the response is the parsed tool input (a dict)
+                return self.llm().with_structured_output(EXTRACTION_SCHEMA)
+            # JSON mode: the response is a string constrained to valid JSON
+            from langchain_community.llms import Ollama
+            return Ollama(model=self.model_name, base_url=self.ollama_base_url, temperature=self.temperature, format="json")
+        except Exception as e:
+            logging.warning(f"Structured output unavailable for {self.llm_provider}, using fenced JSON: {e}")
+        return None
+
+    def _create_embedder(self) -> Any:
+        from Embedders import create_embedder
+        logging.info(f"Loading embedding model: {self.embedding_model} ({self.embedding_backend})")
+        return create_embedder(self.config)
+
+    def _create_answer_cache(self) -> Any:
+        from AnswerCache import SemanticAnswerCache
+        return SemanticAnswerCache(
+            self.embedder(),
+            distance_threshold=self.config.get("answer_cache_threshold", 0.05),
+            max_entries=self.config.get("answer_cache_size", 512),
+            max_temperature=self.config.get("answer_cache_max_temperature", 1.0)
+        )
+
+    def _create_chroma_client(self) -> Any:
+        import chromadb
+        logging.info(f"Opening Chroma at {self.chroma_path}")
+        return chromadb.PersistentClient(path=self.chroma_path)
@@ -0,0 +1,119 @@
+import re
+from collections import deque
+from itertools import chain, zip_longest
+from typing import List, Optional, Any
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+SUMMARY_HEADER = "Summary of earlier answers:"
+FACTS_HEADER = "Known relationships of the concepts in this prompt:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, about four characters per token."""
+    return len(text) // 4
+
+
+class RollingContext:
+    """
+    Bounded answer context for answer_agent.
+
+    Instead of the full previous response, the answer prompt gets a rolling summary
+    of the earlier answers and the graph neighborhood of the concepts the current
+    prompt mentions, rendered as relation triples. The summary is extractive: each
+    answer contributes its leading sentences, newest first, and the oldest are
+    dropped when they no longer fit. Both parts are cut to the token budget, so the
+    context cost per iteration stays constant however long the answers get.
+    """
+
+    def __init__(
+        self,
+        graph_db: Any,
+        token_budget: int = 1000,
+        summary_share: float = 0.5,
+        sentences_per_answer: int = 2,
+        max_answers: int = 10
+    ):
+        """
+        Initialize the rolling context.
+
+        Args:
+            graph_db: Graph the extractor builds, read for the concept neighborhoods
+            token_budget: Maximum estimated tokens of the rendered context
+            summary_share: Share of the budget the summary may use; the graph neighborhood gets the rest
+            sentences_per_answer: Leading sentences of each answer kept in the summary
+            max_answers: Number of most recent answers the summary draws from
+        """
+        self.graph_db = graph_db
+        self.token_budget = token_budget
+        self.summary_share = summary_share
+        self.sentences_per_answer = sentences_per_answer
+        self._leads = deque(maxlen=max_answers)
+        self._node_pattern: Optional[re.Pattern] = None
+        self._node_lookup = {}
+        self._indexed_nodes = -1
+
+    def add_answer(self, answer: str) -> None:
+        """Add the leading sentences of an answer to the rolling summary."""
+        sentences = [s.strip() for s in SENTENCE_PATTERN.split(answer.strip()) if s.strip()]
+        if sentences:
+            self._leads.append(" ".join(sentences[:self.sentences_per_answer]))
+
+    def render(self, prompt: str) -> str:
+        """
+        Render the context for the next answer.
+
+        Args:
+            prompt: Prompt the context is for; its concepts select the graph neighborhood
+
+        Returns:
+            Context text within the token budget, empty before the first answer
+        """
+        budget = self.token_budget - estimate_tokens(SUMMARY_HEADER + FACTS_HEADER) - 2
+        summary = self._take([f"- {lead}" for lead in reversed(self._leads)], int(budget * self.summary_share))
+        facts = self._take(self._neighborhood(prompt), budget - sum(estimate_tokens(line) + 1 for line in summary))
+
+        sections = []
+        if summary:
+            sections.append("\n".join([SUMMARY_HEADER] + summary))
+        if facts:
+            sections.append("\n".join([FACTS_HEADER] + facts))
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _take(lines: List[str], budget: int) -> List[str]:
+        """Keep lines in order while they fit the token budget."""
+        kept = []
+        used = 0
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return kept
+
+    def _mentioned_nodes(self, prompt: str) -> List[str]:
+        """Graph nodes whose name occurs as a phrase in the prompt."""
+        # The name pattern is rebuilt only when the graph has grown
+        if len(self.graph_db) != self._indexed_nodes:
+            names = sorted((str(node) for node in self.graph_db.nodes()), key=len, reverse=True)
+            self._node_lookup = {name.lower(): name for name in names}
+            self._node_pattern = re.compile(
+                r'(?<!\w)(' + "|".join(re.escape(name.lower()) for name in names) + r')(?!\w)'
+            ) if names else None
+            self._indexed_nodes = len(self.graph_db)
+        if self._node_pattern is None:
+            return []
+        return list(dict.fromkeys(self._node_lookup[m] for m in self._node_pattern.findall(prompt.lower())))
+
+    def _neighborhood(self, prompt: str) -> List[str]:
+        """Relation triples around the mentioned nodes, best connected neighbors first, taken in turn per node."""
+        per_node = []
+        for node in self._mentioned_nodes(prompt):
+            edges = [(node, relation, target) for _, target, relation in self.graph_db.out_edges(node, data="relation")]
+            edges += [(source, relation, node) for source, _, relation in self.graph_db.in_edges(node, data="relation")]
+            edges.sort(key=lambda edge: -self.graph_db.degree(edge[2] if edge[0] == node else edge[0]))
+            per_node.append([f"- {source} --{relation or 'related to'}--> {target}" for source, relation, target in edges])
+        # Interleaving keeps one hub node from using the whole budget
+        triples = (triple for triple in chain.from_iterable(zip_longest(*per_node)) if triple is not None)
+        return list(dict.fromkeys(triples))
@@ -0,0 +1,92 @@
+"""
+Embedding backend benchmark for emergent-graphs.
+
+Encodes the same texts with the PyTorch sentence-transformers encoder and with
+one or more ONNX Runtime model files, and reports load time, throughput and the
+cosine agreement of each backend with the PyTorch vectors. Texts are the node
+names of an exported graph, or generated concept phrases:
+
+    python benchmark_embedders.py --graph output/graph_artificial_intelligence.json \
+        --onnx-file onnx/model.onnx --onnx-file onnx/model_quint8_avx2.onnx --threads 4
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from Embedders import create_embedder
+
+WORDS = [
+    "neural", "network", "learning", "reinforcement", "language", "model", "attention", "transformer",
+    "alignment", "reasoning", "memory", "agent", "planning", "vision", "embedding", "graph",
+    "knowledge", "representation", "inference", "optimization", "gradient", "consciousness", "ethics"
+]
+
+
+def load_texts(graph_file, count):
+    """Return node names of an exported graph, or generated phrases, as benchmark input."""
+    if graph_file:
+        with open(graph_file, 'r') as f:
+            texts = [node["id"].lower() for node in json.load(f).get("nodes", [])]
+        if texts:
+            return (texts * (count // len(texts) + 1))[:count]
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) for _ in range(count)]
+
+
+def run_backend(config, backend, texts):
+    """Load a backend and encode the texts, returning (vectors, load seconds, encode seconds)."""
+    start = time.perf_counter()
+    embedder = create_embedder(config, backend)
+    load_seconds = time.perf_counter() - start
+
+    embedder.encode(texts[:8])  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(embedder.encode(texts), dtype=np.float32)
+    return vectors, load_seconds, time.perf_counter() - start
+
+
+def cosine_agreement(reference, vectors):
+    """Row-wise cosine similarity between two embedding matrices."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (reference * vectors).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends")
+    parser.add_argument("--graph", help="Exported graph JSON whose node names are encoded")
+    parser.add_argument("--count", type=int, default=2000, help="Number of texts to encode")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-file", action="append", help="ONNX model file in the model repository (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = load_texts(args.graph, args.count)
+    config = {
+        "embedding_model": args.model,
+        "embedding_batch_size": args.batch_size,
+        "embedding_threads": args.threads
+    }
+
+    reference, load_seconds, encode_seconds = run_backend(config, "sentence_transformers", texts)
+    print(f"{'backend':<40} {'dim':>5} {'load s':>8} {'texts/s':>10} {'cos mean':>9} {'cos min':>9}")
+    print(f"{'sentence_transformers':<40} {reference.shape[1]:>5} {load_seconds:>8.2f} "
+          f"{len(texts) / encode_seconds:>10.1f} {1.0:>9.4f} {1.0:>9.4f}")
+
+    for onnx_file in args.onnx_file or ["onnx/model.onnx", "onnx/model_quint8_avx2.onnx"]:
+        vectors, load_seconds, encode_seconds = run_backend(dict(config, embedding_onnx_file=onnx_file), "onnx", texts)
+        if vectors.shape != reference.shape:
+            print(f"{'onnx ' + onnx_file:<40} dimension mismatch: {vectors.shape} vs {reference.shape}")
+            continue
+        agreement = cosine_agreement(reference, vectors)
+        print(f"{'onnx ' + onnx_file:<40} {vectors.shape[1]:>5} {load_seconds:>8.2f} "
+              f"{len(texts) / encode_seconds:>10.1f} {agreement.mean():>9.4f} {agreement.min():>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
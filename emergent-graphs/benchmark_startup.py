@@ -0,0 +1,66 @@
+"""
+Startup benchmark for emergent-graphs.
+
+Measures, in fresh interpreter processes, how long it takes to import main.py and
+how long each lazily created resource takes on first use. Run it from the
+emergent-graphs directory so config.json is found:
+
+    python benchmark_startup.py --repeat 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+RESOURCE_SNIPPET = """
+import time
+import main
+start = time.perf_counter()
+main.resources.{resource}()
+print(time.perf_counter() - start)
+"""
+
+RESOURCES = ["llm", "embedder", "chroma_client", "new_graph"]
+
+
+def time_snippet(snippet, repeat):
+    """Run a snippet in fresh interpreters and return the seconds it printed."""
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "benchmark failed")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<24} median {statistics.median(timings):8.3f}s  min {min(timings):8.3f}s  max {max(timings):8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure emergent-graphs startup time")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--skip-resources", action="store_true", help="Only measure importing main.py")
+    args = parser.parse_args()
+
+    report("import main", time_snippet(IMPORT_SNIPPET, args.repeat))
+    if args.skip_resources:
+        return
+    for resource in RESOURCES:
+        try:
+            report(f"first {resource}()", time_snippet(RESOURCE_SNIPPET.format(resource=resource), args.repeat))
+        except RuntimeError as e:
+            print(f"{'first ' + resource + '()':<24} failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
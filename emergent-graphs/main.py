@@ -1,16 +1,14 @@
+import hashlib
 import json
 import logging
 import re
-import uuid
 import os
-import chromadb
-import networkx as nx
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_community.llms import Ollama  # Updated import
-from langchain_core.prompts import PromptTemplate  # Updated import
-from langchain_core.runnables import RunnablePassthrough
-from sentence_transformers import SentenceTransformer
-from langchain_anthropic import ChatAnthropic
+from KnowledgeGraphExtractor import KnowledgeGraphExtractor
+from ResourceFactory import ResourceFactory
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=".env", override=True)
@@ -18,8 +16,9 @@ load_dotenv(dotenv_path=".env", override=True)
 logging.basicConfig(
     level=logging.INFO,
     filename='system.log',
-    filemode='w',
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    # Spawned extraction workers re-import this module and must not truncate the parent's log
+    filemode='a' if __name__ == "__mp_main__" else 'w',
+    format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'
 )
 
 try:
@@ -32,50 +31,14 @@ except json.JSONDecodeError as e:
     logging.error(f"config.json has formatting issues: {e}")
     raise
 
-# Get LLM provider configuration
-llm_provider = config.get("llm_provider", "ollama")  # Default to ollama if not specified
-model_name = config.get("model_name", "deepseek-r1:32b" if llm_provider == "ollama" else "claude-3-7-sonnet-20250219")
-# Only get the API key from environment variables, never from config
-anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-
-topic = config["topic"]
-initial_prompt = config["initial_prompt"]
-max_iterations = config.get("max_iterations", 10)
-concept_similarity_threshold = config.get("concept_similarity_threshold", 0.3)
-prompt_similarity_threshold = config.get("prompt_similarity_threshold", 0.05)
-max_graph_nodes = config.get("max_graph_nodes", 1000)
-temperature = config.get("temperature", 0.7)  # Added temperature parameter
-
 for key in ["topic", "initial_prompt"]:
     if not config.get(key):
         logging.error(f"Missing '{key}' in config.json—please add this required field")
         raise ValueError(f"Missing '{key}' in config.json")
 
-# Check for Anthropic API key if using Claude
-if llm_provider == "anthropic" and not anthropic_api_key:
-    logging.error("Anthropic API key not found in environment variables. Please set ANTHROPIC_API_KEY in your .env file")
-    raise ValueError("Missing Anthropic API key in environment variables")
-
-# Initialize the appropriate LLM based on provider
-if llm_provider == "ollama":
-    logging.info(f"Using Ollama with model: {model_name}")
-    llm = Ollama(model=model_name, base_url="http://localhost:11434", temperature=temperature)
-elif llm_provider == "anthropic":
-    logging.info(f"Using Anthropic with model: {model_name}")
-    llm = ChatAnthropic(
-        model=model_name,
-        anthropic_api_key=anthropic_api_key,
-        temperature=temperature,
-        max_tokens=4000  # Configurable max response length
-    )
-else:
-    logging.error(f"Unsupported LLM provider: {llm_provider}. Use 'ollama' or 'anthropic'.")
-    raise ValueError(f"Unsupported LLM provider: {llm_provider}")
-
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-graph_db = nx.DiGraph()
-entity_to_node_id = {}
+# Models and clients are created on first use; importing this module stays fast
+resources = ResourceFactory(config)
+_chains = {}
 
 # Helper function to extract content from LLM response (handles both string and message responses)
 def extract_content(response):
@@ -84,35 +47,80 @@ def extract_content(response):
         return response.content
     return str(response)
 
+def create_extractor(graph_db, concept_collection, run_config=None, run_resources=None):
+    """Create the extraction engine for a run; it owns the name index, embedding cache and metrics"""
+    run_resources = run_resources or resources
+    llm = run_resources.llm()
+    structured_llm = run_resources.structured_llm()
+    return KnowledgeGraphExtractor.from_config(
+        run_config or config,
+        llm=lambda prompt: extract_content(llm.invoke(prompt)),
+        graph_db=graph_db,
+        embedder=run_resources.embedder(),
+        concept_collection=concept_collection,
+        structured_llm=structured_llm.invoke if structured_llm is not None else None
+    )
+
+def get_chain(name, template, input_variables, run_resources=None):
+    """Build a prompt | llm chain on first use; topics that share an LLM share its chains"""
+    llm = (run_resources or resources).llm()
+    key = (name, id(llm))
+    if key not in _chains:
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.runnables import RunnablePassthrough
+        prompt = PromptTemplate(input_variables=input_variables, template=template)
+        # Modern way to create chains using runnables
+        _chains[key] = (
+            {variable: RunnablePassthrough() for variable in input_variables}
+            | prompt
+            | llm
+        )
+    return _chains[key]
+
 # Modified answer prompt to generate natural language response
-answer_prompt = PromptTemplate(
-    input_variables=["topic", "prompt", "previous_response"],
-    template="""
+ANSWER_TEMPLATE = """
 You are an expert in {topic}. Provide a detailed response to the following prompt: {prompt}.
 
-Previous response (if any): {previous_response}
+Context from previous iterations (if any): {previous_response}
 
 Provide a thorough, natural language response. Be insightful and explore connections between concepts.
 
 IMPORTANT: Your response should be in plain natural language only. Do NOT format your answer as JSON or any structured format. 
 Do NOT include any code blocks, tags, or special formatting. Just write a clear, thoughtful response as if you were explaining to a colleague.
 """
-)
 
-# Modern way to create chains using runnables
-answer_chain = (
-    {"topic": RunnablePassthrough(), "prompt": RunnablePassthrough(), "previous_response": RunnablePassthrough()}
-    | answer_prompt
-    | llm
-)
+def count_tokens(response, *texts):
+    """Tokens used by an LLM call, from the response usage if reported, else estimated from the texts"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return sum(len(text) for text in texts) // 4
 
-def answer_agent(topic, prompt, previous_response=""):
-    """Generate a natural language response to the prompt"""
+def answer_agent(topic, prompt, previous_response="", run_resources=None):
+    """Generate a natural language response to the prompt, reusing the answer to a near-identical prompt if cached"""
+    run_resources = run_resources or resources
     try:
+        # Cached answers are keyed by topic and model; the previous response is not part of the key
+        answer_cache = run_resources.answer_cache()
+        cache_scope = (topic, run_resources.llm_provider, run_resources.model_name)
+        prompt_vector = None
+        if answer_cache is not None:
+            try:
+                cached_answer, prompt_vector = answer_cache.lookup(cache_scope, prompt, run_resources.temperature)
+                if cached_answer:
+                    logging.info(f"Answer served from cache: {cached_answer[:100]}...")
+                    return cached_answer
+            except Exception as e:
+                logging.warning(f"Answer cache lookup failed, calling the LLM: {e}")
+        
         # Using the modern invoke method
+        answer_chain = get_chain("answer", ANSWER_TEMPLATE, ["topic", "prompt", "previous_response"], run_resources)
         response = answer_chain.invoke({"topic": topic, "prompt": prompt, "previous_response": previous_response})
         response_text = extract_content(response).strip()
         logging.info(f"Answer generated: {response_text[:100]}...")
+        if answer_cache is not None:
+            tokens = count_tokens(response, ANSWER_TEMPLATE, topic, prompt, previous_response, response_text)
+            answer_cache.store(cache_scope, prompt, response_text, prompt_vector, tokens)
         return response_text
     except Exception as e:
         logging.error(f"Answer agent error: {e}")
@@ -120,280 +128,8 @@ def answer_agent(topic, prompt, previous_response=""):
         logging.error(traceback.format_exc())
         return None
 
-def parse_json_from_response(response_text):
-    # Remove thinking sections
-    clean_text = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL).strip()
-    json_match = re.search(r'```json(.*?)```', clean_text, re.DOTALL)
-    if not json_match:
-        raise ValueError("JSON block not found in response.")
-    json_str = json_match.group(1).strip()
-    if not json_str:
-        raise ValueError("Extracted JSON is empty.")
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"JSON decode error: {e}")
-
-def match_existing_entity(entity, graph_db, embedder, concept_collection, threshold):
-    entity_lower = entity.lower()
-    # Direct match
-    for node in graph_db.nodes():
-        if entity_lower == node.lower():
-            return node
-    # Acronym matching
-    acronym_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', entity)
-    if acronym_match:
-        full_form = acronym_match.group(1).strip().lower()
-        acronym = acronym_match.group(2).lower()
-        for node in graph_db.nodes():
-            node_lower = node.lower()
-            if acronym == node_lower or full_form == node_lower:
-                return node
-            node_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', node)
-            if node_match:
-                if acronym == node_match.group(2).lower() or full_form == node_match.group(1).strip().lower():
-                    return node
-    # Vector similarity match (as a last resort)
-    try:
-        vector = embedder.encode(entity_lower).tolist()
-        results = concept_collection.query(query_embeddings=[vector], n_results=1)
-        if results.get("distances") and results["distances"][0]:
-            distance = results["distances"][0][0]
-            if distance < threshold and results["metadatas"][0]:
-                similar_entity = results["metadatas"][0][0].get("entity")
-                for node in graph_db.nodes():
-                    if node.lower() == similar_entity:
-                        return node
-    except Exception:
-        pass
-    return None
-
-def extract_agent(answer_text, graph_db, concept_collection, concept_similarity_threshold, max_graph_nodes, topic=None):
-    """Extract entities and relationships from text and add to graph"""
-    try:
-        if topic is None:
-            topic = "the given subject"
-        
-        # Convert nodes to list for string representation
-        try:
-            nodes_list = list(graph_db.nodes())
-        except:
-            nodes_list = []
-        current_nodes_str = ", ".join(nodes_list) if nodes_list else "None"
-        
-        # Create extraction prompt
-        extraction_prompt = f"""
-Your task is to analyze natural language text and extract key concepts, entities, and their relationships.
-
-The input is a natural language response about {topic}. Your job is to extract:
-1. Meaningful entities/concepts
-2. Relationships between these entities
-
-Current graph nodes: {current_nodes_str}
-
-IMPORTANT GUIDELINES FOR ENTITIES:
-- Do not extract entities that are essentially the same as those in the current graph nodes
-- Standardize entity names: prefer full names without acronyms when possible
-- If you extract an entity with an acronym, use the format "Full Name (ACRONYM)" consistently
-- Do not extract the same concept in multiple forms (e.g., avoid having both "Artificial General Intelligence" and "AGI")
-- Merge similar concepts and use the most precise/complete form
-
-Text to analyze: {answer_text}
-
-Format your response as a JSON object with:
-- 'entities': list of strings (the entities/concepts).
-- 'relationships': list of triples [entity1, relation, entity2].
-
-IMPORTANT: You must return ONLY the JSON object wrapped in ```json``` and ``` marks, with no additional text.
-"""
-        
-        # Get LLM response with extraction using invoke method
-        llm_response = llm.invoke(extraction_prompt)
-        llm_response_text = extract_content(llm_response).strip()
-        logging.info(f"Extraction LLM response: {llm_response_text[:100]}...")
-        
-        # Remove thinking sections if present
-        llm_response_clean = re.sub(r'<think>.*?</think>', '', llm_response_text, flags=re.DOTALL).strip()
-        
-        # Extract JSON part from response
-        json_match = re.search(r'```json(.*?)```', llm_response_clean, re.DOTALL)
-        if not json_match:
-            logging.error(f"Could not extract JSON from response: {llm_response_clean[:100]}...")
-            return [], []
-        
-        # Parse the JSON data
-        json_str = json_match.group(1).strip()
-        if not json_str:
-            logging.error("Extracted JSON string is empty")
-            return [], []
-        
-        logging.info(f"JSON block extracted: {json_str[:100]}...")
-        
-        try:
-            extracted = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON: {e}, JSON string: {json_str[:100]}...")
-            return [], []
-            
-        entities = extracted.get("entities", [])
-        relationships = extracted.get("relationships", [])
-        if not entities and not relationships:
-            logging.warning("Parsed JSON contains no entities or relationships")
-            return [], []
-        
-        logging.info(f"Got {len(entities)} entities, {len(relationships)} relationships")
-        
-        # Process entities
-        for entity in entities:
-            # Skip empty entities
-            if not entity:
-                continue
-                
-            entity_lower = entity.lower()
-            match_found = False
-            
-            # Check for existing matches (case-insensitive)
-            try:
-                for node in graph_db.nodes():
-                    if entity_lower == node.lower():
-                        entity_to_node_id[entity] = node
-                        logging.info(f"Mapped '{entity}' to existing node '{node}'")
-                        match_found = True
-                        break
-            except Exception as e:
-                logging.error(f"Error checking nodes: {e}")
-            
-            # Check for acronym matches if no direct match
-            if not match_found:
-                try:
-                    # Check if entity is in format "Full Name (ACRONYM)"
-                    acronym_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', entity)
-                    if acronym_match:
-                        full_form = acronym_match.group(1).strip().lower()
-                        acronym = acronym_match.group(2).lower()
-                        
-                        for node in graph_db.nodes():
-                            node_lower = node.lower()
-                            if acronym == node_lower or full_form == node_lower:
-                                entity_to_node_id[entity] = node
-                                logging.info(f"Acronym match: '{entity}' -> '{node}'")
-                                match_found = True
-                                break
-                                
-                            # Check if node has acronym
-                            node_match = re.search(r'(.*?)\s*\(([A-Z]{2,})\)', node)
-                            if node_match:
-                                node_full = node_match.group(1).strip().lower()
-                                node_acronym = node_match.group(2).lower()
-                                if acronym == node_acronym or full_form == node_full:
-                                    entity_to_node_id[entity] = node
-                                    logging.info(f"Acronym-acronym match: '{entity}' -> '{node}'")
-                                    match_found = True
-                                    break
-                except Exception as e:
-                    logging.error(f"Error in acronym matching: {e}")
-            
-            # Try vector similarity as last resort
-            if not match_found:
-                try:
-                    vector = embedder.encode(entity_lower).tolist()
-                    results = concept_collection.query(query_embeddings=[vector], n_results=1)
-                    
-                    if (results.get("distances") and results["distances"] and 
-                        results["distances"][0] and len(results["distances"][0]) > 0):
-                        
-                        distance = results["distances"][0][0]
-                        
-                        if (distance < concept_similarity_threshold and 
-                            results.get("metadatas") and results["metadatas"] and 
-                            results["metadatas"][0] and len(results["metadatas"][0]) > 0):
-                            
-                            similar_entity = results["metadatas"][0][0].get("entity")
-                            if similar_entity:
-                                # Find the actual node with this normalized name
-                                for node in graph_db.nodes():
-                                    if node.lower() == similar_entity:
-                                        entity_to_node_id[entity] = node
-                                        logging.info(f"Vector similarity match: '{entity}' -> '{node}' (distance: {distance})")
-                                        match_found = True
-                                        break
-                except Exception as e:
-                    logging.error(f"Vector similarity error: {e}")
-            
-            # If no match found, add as new node
-            if not match_found:
-                try:
-                    if len(graph_db.nodes()) < max_graph_nodes:
-                        graph_db.add_node(entity)
-                        if "labels" not in graph_db.nodes[entity]:
-                            graph_db.nodes[entity]["labels"] = set([entity])
-                        else:
-                            graph_db.nodes[entity]["labels"].add(entity)
-                            
-                        entity_to_node_id[entity] = entity
-                        logging.info(f"Added new node: '{entity}'")
-                        
-                        # Add to vector store
-                        try:
-                            vector = embedder.encode(entity_lower).tolist()
-                            concept_collection.add(
-                                embeddings=[vector],
-                                metadatas=[{"entity": entity_lower}],
-                                ids=[str(uuid.uuid4())]
-                            )
-                        except Exception as e:
-                            logging.error(f"Error adding to vector store: {e}")
-                except Exception as e:
-                    logging.error(f"Error adding node: {e}")
-                    
-        # Process relationships
-        for relation in relationships:
-            try:
-                if not isinstance(relation, list) or len(relation) != 3:
-                    logging.warning(f"Invalid relationship format: {relation}, skipping")
-                    continue
-                    
-                e1, rel, e2 = relation
-                
-                # Use mapped entities or originals
-                node1 = entity_to_node_id.get(e1, e1)
-                node2 = entity_to_node_id.get(e2, e2)
-                
-                # Ensure both nodes exist
-                if node1 not in graph_db.nodes():
-                    graph_db.add_node(node1)
-                    if "labels" not in graph_db.nodes[node1]:
-                        graph_db.nodes[node1]["labels"] = set([node1])
-                    else:
-                        graph_db.nodes[node1]["labels"].add(node1)
-                    logging.info(f"Added missing node for relationship: '{node1}'")
-                    
-                if node2 not in graph_db.nodes():
-                    graph_db.add_node(node2)
-                    if "labels" not in graph_db.nodes[node2]:
-                        graph_db.nodes[node2]["labels"] = set([node2])
-                    else:
-                        graph_db.nodes[node2]["labels"].add(node2)
-                    logging.info(f"Added missing node for relationship: '{node2}'")
-                    
-                # Add the edge
-                graph_db.add_edge(node1, node2, relation=rel)
-                logging.info(f"Added relationship: {node1} - {rel} -> {node2}")
-            except Exception as e:
-                logging.error(f"Error processing relationship: {e}")
-        
-        return entities, relationships
-    
-    except Exception as e:
-        logging.error(f"Extraction agent error: {e}")
-        import traceback
-        logging.error(traceback.format_exc())
-        return [], []
-
 # Define prompt formulation for generating new prompts with expanded context
-prompt_formulation_prompt = PromptTemplate(
-    input_variables=["topic", "answer", "previous_prompts"],
-    template="""
+PROMPT_FORMULATION_TEMPLATE = """
 Given the topic '{topic}' and the most recent answer: 
 
 {answer}
@@ -401,28 +137,33 @@ Given the topic '{topic}' and the most recent answer:
 Previous prompts that have already been explored:
 {previous_prompts}
 
-Your task is to formulate a new, unique prompt that MUST explore a different facet or angle of the topic than what has been covered in the previous prompts.
+Your task is to formulate {num_candidates} new, unique candidate prompts. Each one MUST explore a different facet or angle of the topic than what has been covered in the previous prompts, and the candidates should differ from each other.
 
 IMPORTANT GUIDELINES:
 1. Do NOT repeat or rephrase any of the previous prompts
 2. Explore aspects that haven't been addressed yet
 3. Build upon insights from the most recent answer
 4. Take the exploration in a genuinely new direction
-5. Consider how this new prompt might reveal additional entities and relationships for the knowledge graph
+5. Consider how each new prompt might reveal additional entities and relationships for the knowledge graph
 
-Return only the new prompt as a plain string.
+Return only the candidate prompts as a numbered list, one prompt per line, with no other text.
 """
-)
 
-# Modern way to create prompt formulation chain
-prompt_formulation_chain = (
-    {"topic": RunnablePassthrough(), "answer": RunnablePassthrough(), "previous_prompts": RunnablePassthrough()}
-    | prompt_formulation_prompt
-    | llm
-)
-
-def prompt_agent(topic, answer, previous_prompts, prompt_collection, prompt_similarity_threshold, max_retries=5):
-    """Generate a new prompt based on the previous answer and ensuring it explores a new facet"""
+def parse_candidate_prompts(response_text):
+    """Split a numbered list of candidate prompts into clean prompt strings"""
+    clean_text = re.sub(r'<think>.*?</think>', '', response_text, flags=re.DOTALL).strip()
+    candidates = []
+    for line in clean_text.splitlines():
+        line = re.sub(r'^\s*(?:\d+[.)]|[-*])\s*', '', line).strip()
+        # Clean up prompt (remove quotes if LLM added them)
+        if line.startswith('"') and line.endswith('"'):
+            line = line[1:-1].strip()
+        if line:
+            candidates.append(line)
+    return candidates
+
+def prompt_agent(topic, answer, previous_prompts, novelty_index, num_candidates=5, max_retries=5, run_resources=None):
+    """Generate candidate prompts in one LLM call and keep the one that explores the newest facet"""
     
     # Format the previous prompts with numbers for clarity
     formatted_prompts = []
@@ -430,8 +171,7 @@ def prompt_agent(topic, answer, previous_prompts, prompt_collection, prompt_simi
         formatted_prompts.append(f"{i+1}. {prompt}")
     prev_prompts_str = "\n".join(formatted_prompts)
     
-    previous_attempts = []
-    rejection_reasons = []
+    rejected_attempts = {}
     
     for attempt in range(max_retries):
         try:
@@ -439,9 +179,9 @@ def prompt_agent(topic, answer, previous_prompts, prompt_collection, prompt_simi
             
             # Add information about previous failed attempts if this is a retry
             retry_guidance = ""
-            if attempt > 0:
+            if rejected_attempts:
                 retry_history = ""
-                for i, (prev_attempt, reason) in enumerate(zip(previous_attempts, rejection_reasons)):
+                for i, (prev_attempt, reason) in enumerate(rejected_attempts.items()):
                     retry_history += f"Attempt {i+1}: \"{prev_attempt}\"\nRejection reason: {reason}\n\n"
                 
                 retry_guidance = f"""
@@ -450,137 +190,217 @@ PREVIOUS REJECTED ATTEMPTS:
 
 FEEDBACK FOR IMPROVEMENT:
 1. Your previous attempts were too similar to existing prompts or explored similar facets
-2. Generate a prompt that explores a completely different dimension of the topic
+2. Generate prompts that explore completely different dimensions of the topic
 3. Avoid the themes and approaches used in your rejected attempts
 4. Consider unexplored angles, controversial viewpoints, edge cases, or practical applications
 5. Be bold and creative - take the exploration in a radically different direction
 """
             
-            # Generate new prompt with specific feedback on previous attempts using invoke
+            # Generate several candidates in one call with specific feedback on previous attempts
+            prompt_formulation_chain = get_chain(
+                "prompt_formulation", PROMPT_FORMULATION_TEMPLATE, ["topic", "answer", "previous_prompts", "num_candidates"],
+                run_resources
+            )
             new_prompt_result = prompt_formulation_chain.invoke({
                 "topic": topic, 
                 "answer": answer, 
-                "previous_prompts": prev_prompts_str + retry_guidance
+                "previous_prompts": prev_prompts_str + retry_guidance,
+                "num_candidates": num_candidates
             })
             
-            # Extract string content
-            new_prompt = extract_content(new_prompt_result).strip()
-            logging.info(f"New prompt from LLM (attempt {attempt+1}): {new_prompt}")
-            previous_attempts.append(new_prompt)
-            
-            # Clean up prompt (remove quotes if LLM added them)
-            if new_prompt.startswith('"') and new_prompt.endswith('"'):
-                new_prompt = new_prompt[1:-1].strip()
-                
-            # Check similarity to previous prompts using vector similarity
-            vector = embedder.encode(new_prompt).tolist()
-            results = prompt_collection.query(query_embeddings=[vector], n_results=1)
+            candidates = parse_candidate_prompts(extract_content(new_prompt_result))
+            logging.info(f"{len(candidates)} candidate prompts from LLM (attempt {attempt+1})")
             
-            # Get the most similar previous prompt to explain rejection reason
-            most_similar_prompt = ""
-            if results.get("metadatas") and results["metadatas"] and results["metadatas"][0]:
-                most_similar_prompt = results["metadatas"][0][0].get("prompt", "")
+            # Score all candidates against the explored prompts at once and keep the most novel
+            new_prompt, rejected = novelty_index.select(candidates)
+            for candidate, reason in rejected.items():
+                logging.info(f"Prompt rejected: {reason} Candidate: \"{candidate[:100]}\"")
+            rejected_attempts.update(rejected)
             
-            if not results.get("distances") or not results["distances"] or not results["distances"][0]:
-                distance = float('inf')
-            else:
-                distance = results["distances"][0][0]
-                
-            if distance < prompt_similarity_threshold:
-                reason = f"Vector similarity too high (score: {distance:.4f}). Too similar to: \"{most_similar_prompt[:100]}...\""
-                rejection_reasons.append(reason)
-                logging.info(f"Prompt rejected: {reason}")
-                continue
-                
-            # Check if the new prompt appears to be too similar to any previous prompt based on text
-            too_similar = False
-            similarity_reason = ""
-            for prev_prompt in previous_prompts:
-                if new_prompt.lower() == prev_prompt.lower():
-                    similarity_reason = f"Exact duplicate of: \"{prev_prompt[:100]}...\""
-                    too_similar = True
-                    break
-                elif new_prompt.lower() in prev_prompt.lower():
-                    similarity_reason = f"Subset of: \"{prev_prompt[:100]}...\""
-                    too_similar = True
-                    break
-                elif prev_prompt.lower() in new_prompt.lower():
-                    similarity_reason = f"Superset of: \"{prev_prompt[:100]}...\""
-                    too_similar = True
-                    break
-                    
-            if too_similar:
-                rejection_reasons.append(similarity_reason)
-                logging.info(f"Prompt rejected: {similarity_reason}")
-                continue
-                
-            # Add to collection if it passes all checks
-            prompt_collection.add(
-                embeddings=[vector],
-                metadatas=[{"prompt": new_prompt}],
-                ids=[str(uuid.uuid4())]
-            )
-            logging.info(f"Successfully generated unique prompt on attempt {attempt+1}")
-            return new_prompt
+            if new_prompt:
+                logging.info(f"Successfully generated unique prompt on attempt {attempt+1}: {new_prompt}")
+                return new_prompt
             
         except Exception as e:
             logging.error(f"Prompt agent error on attempt {attempt+1}: {e}")
-            rejection_reasons.append(f"Error: {str(e)}")
             
     # If we've exhausted all retries
     logging.warning(f"Failed to generate a unique prompt after {max_retries} attempts")
     return None
 
-def run_iterative_system():
-    """Run the iterative knowledge graph building system"""
+# Run ids are timestamps, so runs sort by when they started
+RUN_ID_PATTERN = re.compile(r"\d{14}")
+# Chroma collection names are at most 63 characters; "_run<run id>_concepts" takes 27 of them
+MAX_COLLECTION_PREFIX = 36
+
+def collection_prefix(topic_safe):
+    """Prefix of a topic's run collections, shortened with a hash of the topic if it is too long"""
+    if len(topic_safe) <= MAX_COLLECTION_PREFIX:
+        return topic_safe
+    digest = hashlib.sha1(topic_safe.encode("utf-8")).hexdigest()[:8]
+    return f"{topic_safe[:MAX_COLLECTION_PREFIX - len(digest) - 1]}_{digest}"
+
+def run_collection_name(topic_safe, run_id, suffix):
+    """Name of the concepts or prompts collection of a run"""
+    return f"{collection_prefix(topic_safe)}_run{run_id}_{suffix}"
+
+def list_run_ids(topic_safe, run_resources=None):
+    """List the run ids that have collections for a topic, oldest first"""
+    pattern = re.compile(rf"^{re.escape(collection_prefix(topic_safe))}_run({RUN_ID_PATTERN.pattern})_(concepts|prompts)$")
+    run_ids = set()
+    for collection in (run_resources or resources).chroma_client().list_collections():
+        # Older chromadb returns collection objects, newer returns names
+        name = getattr(collection, "name", collection)
+        match = pattern.match(name)
+        if match:
+            run_ids.add(match.group(1))
+    return sorted(run_ids, key=int)
+
+def compact_run_collections(topic_safe, keep_runs, active_run_id, run_resources=None):
+    """Delete the collections of all but the most recent keep_runs runs of a topic, never those of the active run"""
+    run_resources = run_resources or resources
+    run_ids = [run_id for run_id in list_run_ids(topic_safe, run_resources) if run_id != active_run_id]
+    # The active run counts as one of the kept runs
+    keep_previous = max(keep_runs, 1) - 1
+    for run_id in run_ids[:max(len(run_ids) - keep_previous, 0)]:
+        for suffix in ("concepts", "prompts"):
+            try:
+                run_resources.chroma_client().delete_collection(name=run_collection_name(topic_safe, run_id, suffix))
+            except Exception as e:
+                logging.warning(f"Could not delete collection for run {run_id}: {e}")
+        logging.info(f"Deleted collections of run {run_id}")
+
+def load_warm_start_graph(topic_safe, run_config=None):
+    """Load the exported graph configured for warm start, or None"""
+    run_config = run_config or config
+    warm_start = run_config.get("warm_start", False)
+    if not warm_start:
+        return None
+    if warm_start is True:
+        warm_start = f'{run_config.get("output_dir", "./output")}/graph_{topic_safe}.json'
+    try:
+        with open(warm_start, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logging.warning(f"Warm start graph {warm_start} not found, starting cold")
+    except json.JSONDecodeError as e:
+        logging.error(f"Warm start graph {warm_start} has formatting issues: {e}")
+    return None
+
+def run_iterative_system(topic_config=None):
+    """
+    Run the iterative knowledge graph building system for one topic
+
+    topic_config holds settings that override config.json for this run, e.g. a
+    topic and initial_prompt from a batch file. Models and clients come from the
+    process-wide resource cache, so runs with the same settings share them.
+    """
+    run_config = dict(config, **(topic_config or {}))
+    topic = run_config["topic"]
+    initial_prompt = run_config["initial_prompt"]
+    max_iterations = run_config.get("max_iterations", 10)
+    prompt_similarity_threshold = run_config.get("prompt_similarity_threshold", 0.05)
+    prompt_candidates = run_config.get("prompt_candidates", 5)  # Candidate prompts generated per LLM call
+    diff_emitter = None
     try:
+        run_resources = ResourceFactory(run_config) if topic_config else resources
         topic_safe = topic.lower().replace(" ", "_")
-        concept_collection = chroma_client.get_or_create_collection(name=f"{topic_safe}_concepts")
-        prompt_collection = chroma_client.get_or_create_collection(name=f"{topic_safe}_prompts")
+        # Collections are scoped to the run so vectors of earlier graphs never match this one
+        run_id = str(run_config.get("run_id") or time.strftime("%Y%m%d%H%M%S"))
+        if not RUN_ID_PATTERN.fullmatch(run_id):
+            raise ValueError(f"run_id must be a YYYYMMDDHHMMSS timestamp, got '{run_id}'")
+        previous_run_ids = list_run_ids(topic_safe, run_resources)
+        chroma_client = run_resources.chroma_client()
+        concept_collection = chroma_client.get_or_create_collection(name=run_collection_name(topic_safe, run_id, "concepts"))
+        prompt_collection = chroma_client.get_or_create_collection(name=run_collection_name(topic_safe, run_id, "prompts"))
+        logging.info(f"Run {run_id} for topic '{topic}'")
+        
+        graph_db = run_resources.new_graph()
+        extractor = create_extractor(graph_db, concept_collection, run_config, run_resources)
+        extractor.reset()
         
-        graph_db.clear()
-        entity_to_node_id.clear()
+        warm_start_graph = load_warm_start_graph(topic_safe, run_config)
+        if warm_start_graph is not None:
+            extractor.warm_start(warm_start_graph)
         
         current_prompt = initial_prompt
         previous_prompts = [initial_prompt]  # Store all previous prompts
-        previous_responses = []  # Store previous responses
         previous_response = ""
         
+        # A rolling summary plus the graph neighborhood of the prompt replaces the full previous response
+        rolling_context = None
+        if run_config.get("rolling_context", True):
+            from RollingContext import RollingContext
+            rolling_context = RollingContext(graph_db, token_budget=run_config.get("context_token_budget", 1000))
+        
+        # A warm-started run also treats the prompts of the latest previous run as explored
+        from PromptNoveltyIndex import PromptNoveltyIndex
+        novelty_index = PromptNoveltyIndex(run_resources.embedder(), prompt_similarity_threshold, prompt_collection)
+        novelty_index.load_from_collection()
+        if warm_start_graph is not None and previous_run_ids and previous_run_ids[-1] != run_id:
+            try:
+                previous_prompts_collection = chroma_client.get_collection(name=run_collection_name(topic_safe, previous_run_ids[-1], "prompts"))
+                loaded = novelty_index.load_from_collection(previous_prompts_collection)
+                logging.info(f"Warm start loaded {loaded} prompts from run {previous_run_ids[-1]}")
+            except Exception as e:
+                logging.warning(f"Could not load prompts of run {previous_run_ids[-1]}: {e}")
+        
         try:
-            initial_vector = embedder.encode(initial_prompt).tolist()
-            prompt_collection.add(
-                embeddings=[initial_vector],
-                metadatas=[{"prompt": initial_prompt}],
-                ids=[str(uuid.uuid4())]
-            )
+            novelty_index.add(initial_prompt)
         except Exception as e:
             logging.error(f"Initial prompt addition error: {e}")
             raise
         
+        # With extraction workers, an answer is extracted on a process pool while the next prompt is generated
+        extraction_workers = run_config.get("extraction_workers", 0)
+        extraction_pool = None
+        if extraction_workers > 0:
+            from ParallelExtraction import ExtractionWorkerPool
+            extraction_pool = ExtractionWorkerPool(extractor, run_config, extraction_workers)
+        
+        # Optional stream of per-iteration graph deltas; record 0 carries the warm-start graph
+        if run_config.get("export_diffs", False):
+            from GraphDiff import GraphDiffEmitter
+            output_dir = run_config.get("output_dir", './output')
+            os.makedirs(output_dir, exist_ok=True)
+            diff_target = run_config.get("diff_target") or f'{output_dir}/graph_{topic_safe}_diffs.jsonl'
+            diff_emitter = GraphDiffEmitter(graph_db, diff_target, {"topic": topic, "run_id": run_id}, extractor)
+            diff_emitter.emit(0)
+        
         iteration = 0
         while iteration < max_iterations:
             logging.info(f"Iteration {iteration + 1}: Prompt = {current_prompt}")
             
-            # Pass previous response as context
-            answer = answer_agent(topic, current_prompt, previous_response)
+            # Pass the bounded rolling context, or the previous response, as context
+            context = rolling_context.render(current_prompt) if rolling_context is not None else previous_response
+            answer = answer_agent(topic, current_prompt, context, run_resources)
             if not answer:
                 logging.error("No answer from agent, stopping")
                 break
             
             # Save response for next iteration
             previous_response = answer
-            previous_responses.append(answer)
-            if len(previous_responses) > 10:
-                previous_responses = previous_responses[-10:]
+            if rolling_context is not None:
+                rolling_context.add_answer(answer)
             
             # Extract concepts from natural language response
-            entities, relationships = extract_agent(answer, graph_db, concept_collection, concept_similarity_threshold, max_graph_nodes, topic)
-            if not entities and not relationships:
-                logging.warning("Extraction returned no entities or relationships, continuing anyway")
+            if extraction_pool is None:
+                entities, relationships = extractor.extract_from_text(answer, topic)
+                if not entities and not relationships:
+                    logging.warning("Extraction returned no entities or relationships, continuing anyway")
+            else:
+                extraction_pool.submit([answer], topic)
             
             # Generate new prompt using answer context and the most recent 10 prompts
             recent_prompts = previous_prompts[-10:] if len(previous_prompts) > 10 else previous_prompts
-            new_prompt = prompt_agent(topic, answer, recent_prompts, prompt_collection, prompt_similarity_threshold)
+            new_prompt = prompt_agent(
+                topic, answer, recent_prompts, novelty_index, prompt_candidates, run_resources=run_resources
+            )
+            # Prompt generation does not read the graph; the extraction is merged before anything else does
+            if extraction_pool is not None:
+                entities, relationships = extraction_pool.collect()[0]
+                if not entities and not relationships:
+                    logging.warning("Extraction returned no entities or relationships, continuing anyway")
             if not new_prompt:
                 logging.info("No new prompt generated, ending run")
                 break
@@ -588,7 +408,18 @@ def run_iterative_system():
             current_prompt = new_prompt
             previous_prompts.append(new_prompt)
             iteration += 1
+            if diff_emitter is not None:
+                diff_emitter.emit(iteration, next_prompt=new_prompt)
             logging.info(f"Iteration {iteration}: {len(graph_db.nodes())} nodes, {len(graph_db.edges())} edges")
+            logging.info(f"Extraction metrics: {extractor.get_metrics()}")
+            if run_resources.answer_cache() is not None:
+                logging.info(f"Answer cache: {run_resources.answer_cache().get_stats()}")
+        
+        if extraction_pool is not None:
+            extraction_pool.close()
+        if diff_emitter is not None:
+            # Changes of a last answer whose next prompt failed
+            diff_emitter.emit(iteration)
         
         # Convert set to list for JSON serialization
         for node in graph_db.nodes():
@@ -604,14 +435,35 @@ def run_iterative_system():
                 if attr in node_attrs:
                     del node_attrs[attr]
         
+        # Drop concept vectors that no longer map to a node, and collections of old runs
+        extractor.compact_vector_store()
+        compact_run_collections(topic_safe, run_config.get("keep_runs", 3), run_id, run_resources)
+        
+        # Precompute analytics so viewers do not have to derive them client-side
+        if run_config.get("export_analytics", True):
+            from GraphAnalytics import annotate_graph
+            try:
+                annotate_graph(graph_db)
+            except Exception as e:
+                logging.error(f"Graph analytics error: {e}")
+        
+        # Precompute node positions so viewers can render without running a simulation
+        if run_config.get("export_layout", False):
+            from GraphLayout import layout_graph
+            try:
+                layout_graph(graph_db, run_config.get("layout_iterations", 50))
+            except Exception as e:
+                logging.error(f"Graph layout error: {e}")
+        
         # Export the graph to JSON
+        import networkx as nx
         graph_data = nx.node_link_data(graph_db)
         
         # Fix 'links' vs 'edges' issue
         if 'edges' in graph_data and 'links' not in graph_data:
             graph_data['links'] = graph_data.pop('edges')
             
-        output_dir = config.get("output_dir", './output')
+        output_dir = run_config.get("output_dir", './output')
         os.makedirs(output_dir, exist_ok=True)
         graph_file = f'{output_dir}/graph_{topic_safe}.json'
         try:
@@ -622,13 +474,86 @@ def run_iterative_system():
             logging.error(f"Graph export error: {e}")
             raise
         
+        # Concept vectors next to the graph let GraphQueryEngine use it as a retrieval index
+        if run_config.get("export_vectors", True):
+            from GraphQueryEngine import save_concept_vectors, vectors_file_for
+            try:
+                snapshot = extractor.snapshot()
+                save_concept_vectors(vectors_file_for(graph_file), snapshot["vector_entities"], snapshot["vectors"])
+            except Exception as e:
+                logging.error(f"Concept vector export error: {e}")
+        
+        # Optional level-of-detail package so viewers can load large graphs incrementally
+        if run_config.get("export_tiles", False):
+            from GraphTiles import write_tiled_export
+            try:
+                write_tiled_export(graph_data, f'{output_dir}/graph_{topic_safe}_tiles', run_config.get("tile_min_nodes", 50))
+            except Exception as e:
+                logging.error(f"Tiled export error: {e}")
+        
+        if diff_emitter is not None:
+            diff_emitter.close(completed=True, graph_file=graph_file)
+        
         return graph_file
     
     except Exception as e:
-        logging.error(f"Run crashed: {e}")
+        logging.error(f"Run for topic '{topic}' crashed: {e}")
         import traceback
         logging.error(traceback.format_exc())
         raise
+    finally:
+        # A crashed run still ends its diff stream with a complete line; closing twice does nothing
+        if diff_emitter is not None:
+            diff_emitter.close(completed=False)
+
+def load_batch_topics(batch_file):
+    """Load a batch file: a JSON list of topic configs, each with at least topic and initial_prompt"""
+    with open(batch_file, 'r') as f:
+        topic_configs = json.load(f)
+    if not isinstance(topic_configs, list):
+        raise ValueError(f"{batch_file} must contain a list of topic configs")
+    seen = set()
+    for i, topic_config in enumerate(topic_configs):
+        for key in ["topic", "initial_prompt"]:
+            if not topic_config.get(key):
+                logging.error(f"Missing '{key}' in topic {i + 1} of {batch_file}")
+                raise ValueError(f"Missing '{key}' in topic {i + 1} of {batch_file}")
+        # Topics with the same name would write the same graph file and collections
+        topic_safe = topic_config["topic"].lower().replace(" ", "_")
+        if topic_safe in seen:
+            raise ValueError(f"Duplicate topic in {batch_file}: {topic_config['topic']}")
+        seen.add(topic_safe)
+    return topic_configs
+
+def run_batch(topic_configs, max_workers=None):
+    """
+    Run several topics in one process over a bounded worker pool
+
+    Every topic writes its own graph file and collections. Workers share the warm
+    embedding model, Chroma client and LLM clients through the resource cache, so
+    only the first topic pays for loading them. A failing topic is logged and does
+    not stop the others.
+
+    Returns:
+        Dict mapping each topic to its graph file, or None if its run failed
+    """
+    max_workers = max_workers or config.get("batch_workers", 2)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="topic") as pool:
+        futures = {topic_config["topic"]: pool.submit(run_iterative_system, topic_config) for topic_config in topic_configs}
+        for batch_topic, future in futures.items():
+            try:
+                results[batch_topic] = future.result()
+            except Exception:
+                # run_iterative_system has already logged the traceback
+                results[batch_topic] = None
+    completed = sum(1 for graph_file in results.values() if graph_file)
+    logging.info(f"Batch finished: {completed}/{len(results)} topics completed with {max_workers} workers")
+    return results
 
 if __name__ == "__main__":
-    run_iterative_system()
\ No newline at end of file
+    # python main.py runs config.json's topic; python main.py topics.json runs a batch of topics
+    if len(sys.argv) > 1:
+        run_batch(load_batch_topics(sys.argv[1]))
+    else:
+        run_iterative_system()
\ No newline at end of file
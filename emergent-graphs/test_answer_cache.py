@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+
+from AnswerCache import SemanticAnswerCache
+
+
+class TableEmbedder:
+    """Embeds each known prompt as a fixed vector and counts calls."""
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        return np.asarray([self.table[text] for text in texts], dtype=np.float32)
+
+
+TABLE = {
+    "what are cats": [1.0, 0.0, 0.0],
+    "what are cats?": [0.99, 0.1, 0.0],
+    "what are dogs": [0.0, 1.0, 0.0],
+    "what are birds": [0.0, 0.0, 1.0],
+}
+
+
+def test_near_paraphrase_hits_within_scope():
+    cache = SemanticAnswerCache(TableEmbedder(TABLE))
+    answer, vector = cache.lookup(("cats", "m"), "what are cats", 0.7)
+    assert answer is None
+    cache.store(("cats", "m"), "what are cats", "Cats are felines.", vector, 40)
+
+    assert cache.lookup(("cats", "m"), "what are cats?", 0.7)[0] == "Cats are felines."
+    assert cache.lookup(("cats", "other model"), "what are cats?", 0.7)[0] is None
+    assert cache.lookup(("cats", "m"), "what are dogs", 0.7)[0] is None
+
+    stats = cache.get_stats()
+    assert (stats["lookups"], stats["hits"], stats["misses"]) == (4, 1, 3)
+    assert stats["tokens_saved"] == 40
+    assert stats["hit_rate"] == 0.25
+
+
+def test_high_temperature_bypasses_the_cache():
+    embedder = TableEmbedder(TABLE)
+    cache = SemanticAnswerCache(embedder, max_temperature=0.5)
+    answer, vector = cache.lookup(("t",), "what are cats", 0.9)
+    assert (answer, vector) == (None, None)
+    cache.store(("t",), "what are cats", "Cats.", vector, 10)
+
+    assert embedder.calls == 0
+    assert len(cache) == 0
+    assert cache.get_stats()["bypassed"] == 1
+    assert cache.get_stats()["lookups"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(TableEmbedder(TABLE), max_entries=2)
+    for prompt in ["what are cats", "what are dogs"]:
+        _, vector = cache.lookup(("t",), prompt, 0.0)
+        cache.store(("t",), prompt, prompt.upper(), vector, 1)
+    # Touch cats so dogs becomes the least recently used
+    assert cache.lookup(("t",), "what are cats", 0.0)[0] == "WHAT ARE CATS"
+    _, vector = cache.lookup(("t",), "what are birds", 0.0)
+    cache.store(("t",), "what are birds", "WHAT ARE BIRDS", vector, 1)
+
+    assert len(cache) == 2
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.lookup(("t",), "what are dogs", 0.0)[0] is None
+    assert cache.lookup(("t",), "what are cats", 0.0)[0] == "WHAT ARE CATS"
+    assert cache.lookup(("t",), "what are birds", 0.0)[0] == "WHAT ARE BIRDS"
+
+
+def test_empty_answers_are_not_stored():
+    cache = SemanticAnswerCache(TableEmbedder(TABLE))
+    _, vector = cache.lookup(("t",), "what are cats", 0.0)
+    cache.store(("t",), "what are cats", "", vector, 5)
+    assert len(cache) == 0
+
+
+def test_bypass_counter_is_thread_safe():
+    cache = SemanticAnswerCache(TableEmbedder(TABLE), max_temperature=0.0)
+
+    def bypass():
+        for _ in range(1000):
+            cache.lookup(("t",), "what are cats", 1.0)
+
+    threads = [threading.Thread(target=bypass) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.get_stats()["bypassed"] == 8000
+
+
+def test_reset_stats():
+    cache = SemanticAnswerCache(TableEmbedder(TABLE))
+    cache.lookup(("t",), "what are cats", 0.0)
+    cache.reset_stats()
+    assert cache.get_stats()["lookups"] == 0
@@ -0,0 +1,65 @@
+import networkx as nx
+import numpy as np
+
+from GraphAnalytics import adjacency_from_node_link, adjacency_matrix, annotate_graph, label_propagation, pagerank
+
+
+def two_cliques():
+    """Two directed 4-cliques joined by one edge."""
+    graph = nx.DiGraph()
+    for group in (["a", "b", "c", "d"], ["w", "x", "y", "z"]):
+        graph.add_edges_from((u, v) for u in group for v in group if u != v)
+    graph.add_edge("d", "w")
+    return graph
+
+
+def test_adjacency_collapses_parallel_edges():
+    nodes, adjacency = adjacency_from_node_link({
+        "nodes": [{"id": "a"}, {"id": "b"}],
+        "links": [{"source": "a", "target": "b"}, {"source": "a", "target": "b"}, {"source": "a", "target": "gone"}]
+    })
+    assert nodes == ["a", "b"]
+    assert adjacency.toarray().tolist() == [[0.0, 1.0], [0.0, 0.0]]
+
+
+def test_pagerank_matches_networkx():
+    graph = nx.gnp_random_graph(60, 0.08, seed=3, directed=True)
+    graph.add_node(60)  # dangling node
+    nodes, adjacency = adjacency_matrix(graph)
+    ranks = pagerank(adjacency)
+    expected = nx.pagerank(graph, alpha=0.85, tol=1e-10)
+    assert np.isclose(ranks.sum(), 1.0)
+    assert np.allclose(ranks, [expected[node] for node in nodes], atol=1e-6)
+
+
+def test_pagerank_of_empty_graph():
+    _, adjacency = adjacency_matrix(nx.DiGraph())
+    assert len(pagerank(adjacency)) == 0
+
+
+def test_label_propagation_finds_cliques():
+    nodes, adjacency = adjacency_matrix(two_cliques())
+    labels = dict(zip(nodes, label_propagation(adjacency)))
+    assert len({labels[node] for node in "abcd"}) == 1
+    assert len({labels[node] for node in "wxyz"}) == 1
+    assert labels["a"] != labels["w"]
+
+
+def test_label_propagation_is_reproducible():
+    _, adjacency = adjacency_matrix(nx.gnp_random_graph(80, 0.05, seed=1, directed=True))
+    assert label_propagation(adjacency, seed=7).tolist() == label_propagation(adjacency, seed=7).tolist()
+
+
+def test_annotate_graph():
+    graph = two_cliques()
+    graph.add_node("alone")
+    summary = annotate_graph(graph)
+
+    assert summary == {"nodes": 9, "edges": 25, "components": 2, "communities": 3}
+    assert graph.graph["analytics"] == summary
+    assert graph.nodes["d"]["out_degree"] == 4
+    assert graph.nodes["w"]["in_degree"] == 4
+    assert graph.nodes["d"]["degree"] == 7
+    assert graph.nodes["alone"]["component"] == 1
+    assert graph.nodes["a"]["component"] == graph.nodes["z"]["component"] == 0
+    assert np.isclose(sum(graph.nodes[node]["pagerank"] for node in graph.nodes), 1.0)
@@ -0,0 +1,66 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+
+from GraphAnalytics import adjacency_matrix
+from GraphLayout import _same_cell_pairs, layout_graph, refine_layout, spectral_layout
+
+
+def test_same_cell_pairs_lists_every_ordered_pair_in_a_cell():
+    cell = np.array([2, 0, 2, 2, 5])
+    first, second = _same_cell_pairs(cell, np.array([1, 3, 1]))
+    expected = {(i, j) for i, j in itertools.permutations(range(len(cell)), 2) if cell[i] == cell[j]}
+    assert set(zip(first.tolist(), second.tolist())) == expected
+    assert len(first) == len(expected)
+
+
+def test_spectral_layout_separates_components():
+    graph = nx.disjoint_union(nx.complete_graph(6), nx.complete_graph(6))
+    _, adjacency = adjacency_matrix(graph)
+    positions = spectral_layout(adjacency)
+    assert positions.shape == (12, 2)
+    assert np.all(np.isfinite(positions))
+    # The first axis is the Fiedler-like vector, which puts the components on opposite sides
+    first, second = positions[:6, 0], positions[6:, 0]
+    assert first.max() < second.min() or second.max() < first.min()
+
+
+def test_spectral_layout_sparse_path_matches_dense(monkeypatch):
+    _, adjacency = adjacency_matrix(nx.connected_watts_strogatz_graph(80, 4, 0.2, seed=2))
+    dense = spectral_layout(adjacency)
+    monkeypatch.setattr("GraphLayout.DENSE_SPECTRAL_MAX_NODES", 10)
+    sparse = spectral_layout(adjacency)
+    # Eigenvectors are only defined up to sign
+    for axis in range(2):
+        assert min(np.abs(dense[:, axis] - sparse[:, axis]).max(), np.abs(dense[:, axis] + sparse[:, axis]).max()) < 1e-6
+
+
+def test_refine_layout_keeps_neighbours_closer_than_strangers():
+    graph = nx.path_graph(40)
+    _, adjacency = adjacency_matrix(graph)
+    positions = refine_layout(np.random.default_rng(0).random((40, 2)), adjacency, iterations=100)
+    neighbours = np.mean([np.linalg.norm(positions[i] - positions[i + 1]) for i in range(39)])
+    strangers = np.mean([np.linalg.norm(positions[i] - positions[39 - i]) for i in range(15)])
+    assert neighbours < strangers
+
+
+def test_layout_graph_is_centred_and_reproducible():
+    graph = nx.karate_club_graph()
+    layout_graph(graph, extent=200.0, seed=1)
+    first = [(graph.nodes[node]["x"], graph.nodes[node]["y"]) for node in graph.nodes]
+    layout_graph(graph, extent=200.0, seed=1)
+    assert first == [(graph.nodes[node]["x"], graph.nodes[node]["y"]) for node in graph.nodes]
+
+    coordinates = np.array(first)
+    assert np.abs(coordinates).max() <= 100.0
+    assert np.allclose(coordinates.max(axis=0) + coordinates.min(axis=0), 0.0, atol=0.05)
+    assert graph.graph["layout"]["extent"] == 200.0
+
+
+def test_layout_graph_handles_tiny_graphs():
+    graph = nx.Graph()
+    layout_graph(graph)
+    graph.add_node("only")
+    layout_graph(graph)
+    assert (graph.nodes["only"]["x"], graph.nodes["only"]["y"]) == (0.0, 0.0)
@@ -0,0 +1,97 @@
+import numpy as np
+
+from GraphQueryEngine import GraphQueryEngine, save_concept_vectors
+
+NODES = ["a", "b", "c", "d", "e", "h", "l1", "l2", "l3", "l4"]
+
+
+class KeywordEmbedder:
+    """Embeds a text as the one-hot vector of the first of its words that is known."""
+
+    def __init__(self, words):
+        self.words = words
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), len(self.words)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            known = [word for word in text.lower().split() if word in self.words]
+            if known:
+                vectors[row, self.words.index(known[0])] = 1.0
+        return vectors
+
+
+def chain_graph():
+    """a -> b -> c -> d -> e, with a hub h linked to c and to four leaves."""
+    links = [("a", "b", "is"), ("b", "c", "has"), ("c", "d", None), ("d", "e", None), ("h", "c", "hub of")]
+    links += [("h", leaf, None) for leaf in ["l1", "l2", "l3", "l4"]]
+    return {
+        "nodes": [{"id": node} for node in NODES],
+        "links": [{"source": s, "target": t, "relation": r} for s, t, r in links]
+    }
+
+
+def test_seed_nodes_are_nearest_first():
+    engine = GraphQueryEngine(chain_graph(), KeywordEmbedder(NODES))
+    seeds = engine.seed_nodes("tell me about c", k=3)
+    assert seeds[0] == {"id": "c", "distance": 0.0}
+    assert len(seeds) == 3
+
+
+def test_query_expands_hops_with_relations():
+    engine = GraphQueryEngine(chain_graph(), KeywordEmbedder(NODES))
+    result = engine.query("b", seeds=1, hops=1)
+    assert {node["id"]: node["hop"] for node in result["nodes"]} == {"b": 0, "a": 1, "c": 1}
+    assert sorted(result["context"]) == ["a --is--> b", "b --has--> c"]
+
+
+def test_query_respects_the_node_budget_by_priority():
+    graph = chain_graph()
+    # h has the highest PageRank, so it is kept when the second hop is cut
+    for node in graph["nodes"]:
+        node["pagerank"] = 0.5 if node["id"] == "h" else 0.05
+    engine = GraphQueryEngine(graph, KeywordEmbedder(NODES))
+    result = engine.query("c", seeds=1, hops=2, max_nodes=3)
+    ids = [node["id"] for node in result["nodes"]]
+    assert ids[0] == "c"
+    assert len(ids) == 3
+    assert "h" in ids
+
+
+def test_vectors_file_is_written_once_and_reused(tmp_path):
+    vectors_file = str(tmp_path / "graph_vectors.npz")
+    first = KeywordEmbedder(NODES)
+    GraphQueryEngine(chain_graph(), first, vectors_file)
+    assert first.calls == 1
+
+    second = KeywordEmbedder(NODES)
+    engine = GraphQueryEngine(chain_graph(), second, vectors_file)
+    assert second.calls == 0
+    assert engine.seed_nodes("e", k=1)[0]["id"] == "e"
+
+    with np.load(vectors_file, allow_pickle=False) as data:
+        assert data["names"].dtype.kind == "U"
+
+
+def test_pickled_vectors_file_is_not_loaded(tmp_path):
+    vectors_file = str(tmp_path / "graph_vectors.npz")
+    np.savez(vectors_file, names=np.asarray(["a"], dtype=object), vectors=np.ones((1, 10), dtype=np.float32))
+    embedder = KeywordEmbedder(NODES)
+    GraphQueryEngine(chain_graph(), embedder, vectors_file)
+    assert embedder.calls == 1
+    with np.load(vectors_file, allow_pickle=False) as data:
+        assert len(data["names"]) == 10
+
+
+def test_save_concept_vectors_round_trip(tmp_path):
+    path = str(tmp_path / "v.npz")
+    save_concept_vectors(path, ["Émile", "AI"], np.eye(2))
+    with np.load(path, allow_pickle=False) as data:
+        assert data["names"].tolist() == ["Émile", "AI"]
+        assert data["vectors"].dtype == np.float32
+
+
+def test_empty_graph():
+    engine = GraphQueryEngine({"nodes": [], "links": []}, KeywordEmbedder(["a"]))
+    assert engine.query("a")["nodes"] == []
@@ -0,0 +1,104 @@
+"""
+Text splitter benchmark for hello-world ingestion.
+
+Splits the same pages with LangChain's recursive character splitter (CHUNK_SIZE /
+CHUNK_OVERLAP) and with the sentence-aware token splitter (CHUNK_TOKENS /
+CHUNK_OVERLAP_TOKENS). For each splitter it reports throughput and the spread of
+chunk sizes, measured in tokens of the configured embedding model. Pages are the
+.txt files of a directory, one page per blank-line-separated block, or generated
+text:
+
+    python hello-world/benchmark_splitter.py --text-dir corpus/ --megabytes 200
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+import config as config_module
+from embedding_backends import create_embeddings, estimate_tokens, token_counter
+from token_splitter import SentenceTokenSplitter
+
+WORDS = [
+    "referee", "player", "goalkeeper", "offside", "penalty", "throw-in", "corner", "kick", "field", "ball",
+    "team", "coach", "league", "season", "substitution", "foul", "yellow", "card", "match", "halftime",
+    "the", "a", "of", "and", "to", "in", "is", "must", "may", "not", "be", "with", "for", "each", "when"
+]
+
+
+def load_pages(text_dir, megabytes):
+    """Return about megabytes of page texts, read from text_dir or generated."""
+    target = int(megabytes * (1 << 20))
+    pages = []
+    if text_dir:
+        for root, _, files in os.walk(text_dir):
+            for file in sorted(files):
+                if file.endswith(".txt"):
+                    with open(os.path.join(root, file), "r", encoding="utf-8", errors="ignore") as f:
+                        pages.extend(block for block in f.read().split("\n\n\n") if block.strip())
+    if not pages:
+        rng = random.Random(0)
+        for _ in range(2000):
+            sentences = []
+            for _ in range(rng.randint(5, 60)):
+                words = [rng.choice(WORDS) for _ in range(rng.choice([4, 8, 15, 25, 60]))]
+                sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", "?", "!"]))
+            paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+            pages.append("\n\n".join(paragraphs))
+    size = sum(len(page) for page in pages)
+    pages = pages * (target // max(size, 1) + 1)
+    total = 0
+    for i, page in enumerate(pages):
+        total += len(page)
+        if total >= target:
+            return pages[:i + 1]
+    return pages
+
+
+def run_splitter(name, split, documents, count_tokens, budget):
+    """Split the documents and print throughput and chunk-size statistics."""
+    start = time.perf_counter()
+    chunks = list(split(documents))
+    seconds = time.perf_counter() - start
+    megabytes = sum(len(document.page_content) for document in documents) / (1 << 20)
+    tokens = np.asarray(count_tokens([chunk.page_content for chunk in chunks]), dtype=np.float64)
+    print(
+        f"{name:<12} {megabytes / seconds:8.1f} MB/s ({megabytes * 60 / 1024 / seconds:5.2f} GB/min) "
+        f"{len(chunks):8d} chunks  tokens mean {tokens.mean():6.1f}  std {tokens.std():6.1f}  "
+        f"cv {tokens.std() / tokens.mean():5.3f}  p5 {np.percentile(tokens, 5):5.0f}  "
+        f"p95 {np.percentile(tokens, 95):5.0f}  over budget {np.mean(tokens > budget) * 100:5.1f}%"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the character and token text splitters")
+    parser.add_argument("--text-dir", help="Directory with .txt files to split; generated text if omitted")
+    parser.add_argument("--megabytes", type=float, default=50.0, help="Amount of text to split")
+    parser.add_argument("--estimate", action="store_true", help="Count tokens at four characters per token instead of with the model's tokenizer")
+    args = parser.parse_args()
+
+    config = config_module.read_config()
+    embeddings = None if args.estimate or config.get("EMBEDDING_BACKEND", "openai") == "openai" else create_embeddings(config)
+    count_tokens = estimate_tokens if args.estimate else token_counter(config, embeddings)
+    budget = config.get("CHUNK_TOKENS", 250)
+
+    documents = [Document(page_content=page, metadata={"source": f"page-{i}"}) for i, page in enumerate(load_pages(args.text_dir, args.megabytes))]
+    print(f"{len(documents)} pages, {sum(len(d.page_content) for d in documents) / (1 << 20):.1f} MB, budget {budget} tokens")
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        character_splitter = RecursiveCharacterTextSplitter(chunk_size=config["CHUNK_SIZE"], chunk_overlap=config["CHUNK_OVERLAP"])
+        run_splitter("characters", character_splitter.split_documents, documents, count_tokens, budget)
+    except ImportError:
+        print("characters   skipped, langchain is not installed")
+
+    token_splitter = SentenceTokenSplitter(count_tokens, budget, config.get("CHUNK_OVERLAP_TOKENS", 25))
+    run_splitter("tokens", token_splitter.split_documents, documents, count_tokens, budget)
+
+
+if __name__ == "__main__":
+    main()
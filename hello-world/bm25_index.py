@@ -0,0 +1,348 @@
+import itertools
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words, keeping rule numbers and names like "12.3", "u-12" and "law-11" in one token
+TOKEN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+def tokenize(text):
+    """
+    Lowercase keyword tokens of a text.
+    """
+    return TOKEN.findall(text.lower())
+
+
+def index_path(chroma_dir):
+    """
+    Path of the keyword index that belongs to the collection in chroma_dir.
+    """
+    return os.path.join(chroma_dir, "bm25_index.sqlite")
+
+
+def _varint_parts(values):
+    """
+    Return the LEB128 encoding of values as a uint8 array, and the number of bytes of each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(5, dtype=np.uint64) * np.uint64(7)
+    groups = (values[:, None] >> shifts) & np.uint64(0x7F)
+    lengths = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1).astype(np.float64))).astype(np.int64) // 7) + 1)
+    used = np.arange(5) < lengths[:, None]
+    more = np.arange(5) < (lengths[:, None] - 1)
+    return (groups | (more.astype(np.uint64) << np.uint64(7))).astype(np.uint8)[used], lengths
+
+
+def encode_varints(values):
+    """
+    Encode non-negative integers below 2^35 as LEB128 varints: 7 bits per byte, high bit set on all but the last byte.
+    """
+    return _varint_parts(values)[0].tobytes()
+
+
+def decode_varints(data):
+    """
+    Decode LEB128 varints into an int64 array.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    group = np.repeat(np.arange(len(ends)), np.diff(np.concatenate(([-1], ends))))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    positions = np.arange(len(raw)) - starts[group]
+    parts = (raw & 0x7F).astype(np.float64) * np.exp2(7 * positions)
+    return np.bincount(group, weights=parts, minlength=len(ends)).astype(np.int64)
+
+
+def encode_postings(docs, frequencies):
+    """
+    Encode a block of postings: ascending doc numbers as deltas, then term frequencies, all as varints.
+    """
+    docs = np.asarray(docs, dtype=np.int64)
+    return encode_varints(np.diff(docs, prepend=0)) + encode_varints(frequencies)
+
+
+def decode_blocks(blocks):
+    """
+    Decode a term's postings blocks, as (count, data) pairs, into (doc numbers, term frequencies).
+
+    Varints are self-delimiting, so all blocks are decoded in one pass and then split.
+    """
+    counts = np.fromiter((count for count, _ in blocks), dtype=np.int64, count=len(blocks))
+    values = decode_varints(b"".join(data for _, data in blocks))
+    block_of = np.repeat(np.arange(len(counts)), counts)
+    first_value = np.concatenate(([0], np.cumsum(2 * counts)[:-1]))
+    first_posting = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    within = np.arange(int(counts.sum())) - first_posting[block_of]
+    deltas = values[first_value[block_of] + within]
+    frequencies = values[first_value[block_of] + counts[block_of] + within]
+    # Every block starts with an absolute doc number, so the running sum restarts per block
+    sums = np.cumsum(deltas)
+    return sums - (sums[first_posting] - deltas[first_posting])[block_of], frequencies
+
+
+class BM25Index:
+    """
+    Okapi BM25 keyword index over the chunks of a collection, stored in SQLite next to it.
+
+    Every batch of added chunks appends one postings block per term: the batch's doc
+    numbers, delta-encoded, and their term frequencies, as varints, which takes one
+    or two bytes per posting. Deleting a source or replacing a chunk only marks its
+    docs deleted, so updates never rewrite existing postings; compact() merges each
+    term's blocks and drops deleted docs once they add up.
+
+    Searching reads the blocks of the query terms and scores them with numpy against
+    doc lengths held in memory, which are reloaded when the index version changes.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Shared by the sessions of the Streamlit app, so access is serialized by a lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, "
+                "source TEXT, length INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS docs_chunk_id ON docs (chunk_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS docs_source ON docs (source)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, block INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (term, block)) WITHOUT ROWID"
+            )
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # built is set once the index covers the whole collection, not just chunks added since it was created
+            self.connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('blocks', 0), ('built', 0)")
+        self._loaded_version = None
+
+    def _meta(self, key):
+        return self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _bump(self, key, by=1):
+        self.connection.execute("UPDATE meta SET value = value + ? WHERE key = ?", (by, key))
+        return self._meta(key)
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM docs WHERE deleted = 0").fetchone()[0]
+
+    def add(self, ids, texts, sources):
+        """
+        Index a batch of chunks; a chunk id that is already indexed is replaced.
+        """
+        with self._lock, self.connection:
+            self.connection.executemany("UPDATE docs SET deleted = 1 WHERE chunk_id = ? AND deleted = 0", ((chunk_id,) for chunk_id in ids))
+            first = self.connection.execute("SELECT COALESCE(MAX(doc), -1) + 1 FROM docs").fetchone()[0]
+            term_numbers = {}
+            term_column, doc_column, frequency_column = [], [], []
+            rows = []
+            for doc, (chunk_id, text, source) in enumerate(zip(ids, texts, sources), start=first):
+                tokens = tokenize(text)
+                rows.append((doc, chunk_id, source, len(tokens)))
+                for term, frequency in Counter(tokens).items():
+                    term_column.append(term_numbers.setdefault(term, len(term_numbers)))
+                    doc_column.append(doc)
+                    frequency_column.append(frequency)
+            self.connection.executemany("INSERT INTO docs (doc, chunk_id, source, length) VALUES (?, ?, ?, ?)", rows)
+            block = self._bump("blocks")
+            self.connection.executemany("INSERT INTO postings (term, block, count, data) VALUES (?, ?, ?, ?)",
+                                        self._encode_batch(list(term_numbers), term_column, doc_column, frequency_column, block))
+            self._bump("version")
+
+    @staticmethod
+    def _encode_batch(terms, term_column, doc_column, frequency_column, block):
+        """
+        Yield a postings row per term of a batch, encoding all postings in one pass.
+        """
+        if not term_column:
+            return
+        term_column = np.asarray(term_column, dtype=np.int64)
+        doc_column = np.asarray(doc_column, dtype=np.int64)
+        order = np.lexsort((doc_column, term_column))
+        term_column, doc_column = term_column[order], doc_column[order]
+        frequency_column = np.asarray(frequency_column, dtype=np.int64)[order]
+
+        # Each term's postings start with an absolute doc number, followed by deltas
+        starts = np.flatnonzero(np.concatenate(([True], term_column[1:] != term_column[:-1])))
+        deltas = doc_column.copy()
+        deltas[1:] -= doc_column[:-1]
+        deltas[starts] = doc_column[starts]
+        delta_bytes, delta_lengths = _varint_parts(deltas)
+        frequency_bytes, frequency_lengths = _varint_parts(frequency_column)
+        delta_bytes, frequency_bytes = delta_bytes.tobytes(), frequency_bytes.tobytes()
+        delta_offsets = np.concatenate(([0], np.cumsum(delta_lengths))).tolist()
+        frequency_offsets = np.concatenate(([0], np.cumsum(frequency_lengths))).tolist()
+
+        bounds = np.concatenate((starts, [len(term_column)])).tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            data = delta_bytes[delta_offsets[start]:delta_offsets[end]] + frequency_bytes[frequency_offsets[start]:frequency_offsets[end]]
+            yield terms[term_column[start]], block, end - start, data
+
+    def delete_sources(self, sources):
+        """
+        Remove all chunks of the given sources from the index.
+        """
+        with self._lock, self.connection:
+            self.connection.executemany("UPDATE docs SET deleted = 1 WHERE source = ? AND deleted = 0", ((source,) for source in sources))
+            self._bump("version")
+
+    def maybe_compact(self, max_blocks_per_term=16, max_deleted_fraction=0.2):
+        """
+        Compact the index if terms have many blocks on average or many docs are deleted.
+        """
+        terms, blocks = self.connection.execute("SELECT COUNT(DISTINCT term), COUNT(*) FROM postings").fetchone()
+        total, deleted = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(deleted), 0) FROM docs").fetchone()
+        if (terms and blocks / terms > max_blocks_per_term) or (total and deleted / total > max_deleted_fraction):
+            self.compact()
+
+    def compact(self):
+        """
+        Merge the blocks of every term into one and drop deleted docs.
+        """
+        with self._lock, self.connection:
+            max_doc = self.connection.execute("SELECT COALESCE(MAX(doc), -1) FROM docs").fetchone()[0]
+            alive = np.zeros(max_doc + 1, dtype=bool)
+            alive[[row[0] for row in self.connection.execute("SELECT doc FROM docs WHERE deleted = 0")]] = True
+            self.connection.execute("DROP TABLE IF EXISTS postings_compacted")
+            self.connection.execute(
+                "CREATE TABLE postings_compacted (term TEXT NOT NULL, block INTEGER NOT NULL, "
+                "count INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (term, block)) WITHOUT ROWID"
+            )
+            block = self._bump("blocks")
+            rows = self.connection.execute("SELECT term, count, data FROM postings ORDER BY term, block")
+            merged = []
+            for term, term_rows in itertools.groupby(rows, key=lambda row: row[0]):
+                docs, frequencies = decode_blocks([(count, data) for _, count, data in term_rows])
+                keep = alive[docs]
+                if keep.any():
+                    merged.append((term, block, int(keep.sum()), encode_postings(docs[keep], frequencies[keep])))
+            self.connection.executemany("INSERT INTO postings_compacted (term, block, count, data) VALUES (?, ?, ?, ?)", merged)
+            self.connection.execute("DROP TABLE postings")
+            self.connection.execute("ALTER TABLE postings_compacted RENAME TO postings")
+            self.connection.execute("DELETE FROM docs WHERE deleted = 1")
+            self._bump("version")
+        self.connection.execute("VACUUM")
+        logger.info(f"Compacted the keyword index to {len(merged)} terms")
+
+    def _refresh(self):
+        """
+        Load doc lengths, liveness and chunk ids if the index changed since they were loaded.
+        """
+        version = self._meta("version")
+        if version == self._loaded_version:
+            return
+        rows = self.connection.execute("SELECT doc, chunk_id, length, deleted FROM docs").fetchall()
+        size = max((row[0] for row in rows), default=-1) + 1
+        self._lengths = np.zeros(size, dtype=np.float64)
+        self._alive = np.zeros(size, dtype=bool)
+        self._chunk_ids = np.empty(size, dtype=object)
+        if rows:
+            docs = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            self._lengths[docs] = [row[2] for row in rows]
+            self._alive[docs] = [not row[3] for row in rows]
+            self._chunk_ids[docs] = [row[1] for row in rows]
+        alive_count = int(self._alive.sum())
+        self._doc_count = alive_count
+        self._average_length = float(self._lengths[self._alive].mean()) if alive_count else 0.0
+        self._loaded_version = version
+
+    def search(self, query, k=20):
+        """
+        Return up to k (chunk id, BM25 score) pairs for a query, best first.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            self._refresh()
+            if not terms or not self._doc_count:
+                return []
+            all_docs = []
+            all_scores = []
+            for term in terms:
+                blocks = self.connection.execute("SELECT count, data FROM postings WHERE term = ?", (term,)).fetchall()
+                if not blocks:
+                    continue
+                docs, frequencies = decode_blocks(blocks)
+                frequencies = frequencies.astype(np.float64)
+                # Postings of docs added after the lengths were loaded are ignored until the next refresh
+                keep = docs < len(self._alive)
+                keep[keep] = self._alive[docs[keep]]
+                docs, frequencies = docs[keep], frequencies[keep]
+                if not len(docs):
+                    continue
+                idf = math.log(1.0 + (self._doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                norms = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / self._average_length)
+                all_docs.append(docs)
+                all_scores.append(idf * frequencies * (self.k1 + 1.0) / (frequencies + norms))
+            if not all_docs:
+                return []
+            scores = np.bincount(np.concatenate(all_docs), weights=np.concatenate(all_scores), minlength=len(self._alive))
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._chunk_ids[doc], float(scores[doc])) for doc in candidates]
+
+    def ensure_built(self, collection):
+        """
+        Index the whole collection unless the index already covers it, e.g. one filled before the keyword index existed.
+        """
+        with self._lock:
+            built = self._meta("built")
+        if built:
+            return
+        if collection.count():
+            self.build_from_collection(collection)
+        else:
+            with self._lock, self.connection:
+                self.connection.execute("UPDATE meta SET value = 1 WHERE key = 'built'")
+
+    def build_from_collection(self, collection, batch_size=1000):
+        """
+        Replace the index with one of every chunk of a Chroma collection.
+        """
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE docs SET deleted = 1 WHERE deleted = 0")
+            self._bump("version")
+        offset = 0
+        while True:
+            batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                break
+            self.add(batch["ids"], [text or "" for text in batch["documents"]],
+                     [(metadata or {}).get("source") for metadata in batch["metadatas"]])
+            offset += len(batch["ids"])
+        self.compact()
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE meta SET value = 1 WHERE key = 'built'")
+        logger.info(f"Indexed {offset} chunks of {collection.name} for keyword search")
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    # Rebuild the keyword index of the configured collection: python hello-world/bm25_index.py
+    import config as config_module
+    import vectordb
+    config = config_module.read_config()
+    logging.basicConfig(level=config['LOG_LEVEL'])
+    chroma_dir = os.path.join(config['chroma_base_dir'], config['chroma_collection'])
+    path = index_path(chroma_dir)
+    if os.path.exists(path):
+        os.remove(path)
+    index = BM25Index(path)
+    index.build_from_collection(vectordb.get_collection(chroma_dir, config['chroma_collection']))
+    index.close()
@@ -0,0 +1,176 @@
+import hashlib
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+DIGITS = re.compile(r"\d+")
+# Modulus of the MinHash permutations; a * h + b stays below 2^64 for 31-bit a and 32-bit h and b
+MERSENNE_PRIME = (1 << 61) - 1
+SHINGLE_BASE = np.uint64(1000003)
+
+
+def normalize(text):
+    """
+    Lowercase words of a text, so formatting differences do not matter.
+    """
+    return WORD.findall(text.lower())
+
+
+def words_hash(words):
+    """
+    Hash of a list of normalized words; equal for exact duplicates.
+    """
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def strip_repeated_lines(pages, min_fraction=0.5, min_pages=3, edge_lines=3):
+    """
+    Remove running headers and footers from the pages of a document.
+
+    A header or footer is one of the first or last edge_lines lines of a page that
+    recurs there on at least min_fraction of the pages. For the very first and last
+    line numbers are ignored, so "Page 3 of 40" matches on every page. Documents with
+    fewer than min_pages pages are left alone.
+    """
+    if len(pages) < min_pages:
+        return pages
+    exact = lambda line: " ".join(line.split()).lower()
+    numbered = lambda line: DIGITS.sub("#", exact(line))
+    page_lines = [page.page_content.splitlines() for page in pages]
+    exact_counts = Counter(k for lines in page_lines for k in {exact(line) for line in lines[:edge_lines] + lines[-edge_lines:]} if k)
+    numbered_counts = Counter(k for lines in page_lines for k in {numbered(line) for line in lines[:1] + lines[-1:]} if k)
+    threshold = min_fraction * len(pages)
+    repeated = {k for k, count in exact_counts.items() if count >= threshold}
+    repeated_numbered = {k for k, count in numbered_counts.items() if count >= threshold}
+    if not repeated and not repeated_numbered:
+        return pages
+
+    for page, lines in zip(pages, page_lines):
+        last = len(lines) - 1
+        page.page_content = "\n".join(
+            line for i, line in enumerate(lines)
+            if not ((i < edge_lines or i > last - edge_lines) and exact(line) in repeated)
+            and not (i in (0, last) and numbered(line) in repeated_numbered)
+        ).strip()
+    return pages
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles.
+
+    Words are hashed once with CRC-32 and combined into shingle hashes with a
+    polynomial rolling hash, and all permutations are applied as one matrix
+    operation, so a chunk costs a few array operations.
+    """
+
+    def __init__(self, num_perm=128, shingle_words=5, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.shingle_words = shingle_words
+
+    def signature(self, words):
+        """
+        Return the uint32 MinHash signature of a list of normalized words.
+        """
+        hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+        if len(hashes) >= self.shingle_words:
+            shingles = np.zeros(len(hashes) - self.shingle_words + 1, dtype=np.uint64)
+            for offset in range(self.shingle_words):
+                shingles = shingles * SHINGLE_BASE + hashes[offset:offset + len(shingles)]
+            hashes = shingles & np.uint64(0xFFFFFFFF)
+        elif len(hashes) == 0:
+            hashes = np.zeros(1, dtype=np.uint64)
+        permuted = (hashes[:, None] * self.a + self.b) % np.uint64(MERSENNE_PRIME)
+        return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    Drops chunks that repeat content already ingested, before they are embedded.
+
+    A chunk is an exact duplicate if its normalized words hash like a kept chunk's,
+    and a near duplicate if the Jaccard similarity of its 5-word shingles with a kept
+    chunk, estimated by MinHash, reaches threshold. Candidates are found with
+    locality-sensitive hashing over bands of the signature. The kept chunk's source
+    is remembered for every dropped chunk, so ingestion can tell which files depend
+    on which.
+
+    filter() runs on the ingestion pipeline's splitter thread, while take() and stats
+    are used by the writer, so the bookkeeping is locked.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=128, bands=16, shingle_words=5):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_words)
+        self._exact = {}
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._signatures = []
+        self._sources = []
+        self._kept = defaultdict(list)
+        self._duplicate_of = defaultdict(set)
+        self._lock = threading.Lock()
+        self.stats = {"chunks": 0, "exact": 0, "near": 0}
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, source, chunk_hash, signature):
+        """
+        Index a kept chunk, e.g. one ingested in an earlier run.
+        """
+        entry = len(self._signatures)
+        self._signatures.append(signature)
+        self._sources.append(source)
+        self._exact.setdefault(chunk_hash, source)
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket[key].append(entry)
+
+    def find(self, chunk_hash, signature):
+        """
+        Return (source of the duplicated chunk, "exact" or "near"), or (None, None).
+        """
+        if chunk_hash in self._exact:
+            return self._exact[chunk_hash], "exact"
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        for entry in candidates:
+            if np.mean(self._signatures[entry] == signature) >= self.threshold:
+                return self._sources[entry], "near"
+        return None, None
+
+    def filter(self, chunks):
+        """
+        Yield the chunks of a stream that are not duplicates of earlier chunks.
+        """
+        for chunk in chunks:
+            source = chunk.metadata.get("source")
+            words = normalize(chunk.page_content)
+            chunk_hash = words_hash(words)
+            signature = self.hasher.signature(words)
+            with self._lock:
+                self.stats["chunks"] += 1
+                duplicate_of, kind = self.find(chunk_hash, signature)
+                if duplicate_of is not None:
+                    self.stats[kind] += 1
+                    if duplicate_of != source:
+                        self._duplicate_of[source].add(duplicate_of)
+                    continue
+                self.add(source, chunk_hash, signature)
+                self._kept[source].append((chunk_hash, signature))
+            yield chunk
+
+    def take(self, source):
+        """
+        Return and forget (kept chunks as (hash, signature) pairs, sources it duplicated) for a source.
+        """
+        with self._lock:
+            return self._kept.pop(source, []), self._duplicate_of.pop(source, set())
@@ -0,0 +1,214 @@
+import abc
+import logging
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Model the existing collections were embedded with (the OpenAIEmbeddings default)
+DEFAULT_OPENAI_MODEL = "text-embedding-ada-002"
+DEFAULT_LOCAL_MODEL = "all-MiniLM-L6-v2"
+
+
+def mean_pool(token_embeddings, attention_mask, normalize=True):
+    """
+    Average the token embeddings of each text over its attention mask, as sentence-transformers does.
+
+    emergent-graphs/Embedders.py has the same function; the subprojects do not share
+    code, so a fix to one belongs in the other.
+    """
+    mask = attention_mask[:, :, None].astype(np.float32)
+    pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32)
+
+
+class LocalEmbeddings(Embeddings, abc.ABC):
+    """
+    Base class for embedding models that run on this machine in batches on the CPU.
+    """
+    # One inference call already uses every core; concurrent calls would only compete for them
+    max_concurrency = 1
+
+    def __init__(self, batch_size=64):
+        self.batch_size = batch_size
+        self.max_seq_length = None
+        self.counting_tokenizer = None
+
+    @staticmethod
+    def _untruncated(tokenizer):
+        """
+        Copy of a tokenizers.Tokenizer that neither truncates nor pads, for counting tokens.
+        """
+        from tokenizers import Tokenizer
+        counting_tokenizer = Tokenizer.from_str(tokenizer.to_str())
+        counting_tokenizer.no_truncation()
+        counting_tokenizer.no_padding()
+        return counting_tokenizer
+
+    def count_tokens(self, texts):
+        """
+        Return the number of model tokens of each text, without special tokens, as an int array.
+        """
+        encodings = self.counting_tokenizer.encode_batch(list(texts), add_special_tokens=False)
+        return np.fromiter((len(encoding.ids) for encoding in encodings), dtype=np.int64, count=len(encodings))
+
+    @abc.abstractmethod
+    def encode(self, texts):
+        """
+        Return a (len(texts), dimension) float32 matrix of L2-normalized vectors.
+        """
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+class SentenceTransformerEmbeddings(LocalEmbeddings):
+    """
+    sentence-transformers model running in PyTorch on the CPU.
+    """
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, batch_size=64, threads=0):
+        super().__init__(batch_size)
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.max_seq_length = self.model.max_seq_length
+        self.counting_tokenizer = self._untruncated(self.model.tokenizer.backend_tokenizer)
+
+    def encode(self, texts):
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, show_progress_bar=False).astype(np.float32)
+
+
+class OnnxEmbeddings(LocalEmbeddings):
+    """
+    ONNX export of a sentence-transformers model running in ONNX Runtime, without PyTorch.
+
+    model_name is a hub model (downloaded on first use) or a local directory holding
+    onnx_file and tokenizer.json. Mean pooling and normalization reproduce the
+    sentence-transformers pipeline.
+    """
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, onnx_file="onnx/model.onnx", batch_size=64, threads=0, max_seq_length=256):
+        super().__init__(batch_size)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self._resolve_file(onnx_file), sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(self._resolve_file("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+        self.max_seq_length = max_seq_length
+        self.counting_tokenizer = self._untruncated(self.tokenizer)
+
+    def _resolve_file(self, filename):
+        if os.path.isdir(self.model_name):
+            return os.path.join(self.model_name, filename)
+        from huggingface_hub import hf_hub_download
+        repo_id = self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+        return hf_hub_download(repo_id=repo_id, filename=filename)
+
+    def encode(self, texts):
+        return np.vstack([self._encode_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)])
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        return mean_pool(self.session.run(None, feed)[0], attention_mask)
+
+
+def embedding_model(config):
+    """
+    Identity of the configured embedding model, e.g. "openai:text-embedding-ada-002".
+
+    Vectors are only comparable when they come from the same model, so collections
+    record this and refuse to be read or written with any other.
+    """
+    backend = config.get("EMBEDDING_BACKEND", "openai")
+    if backend == "openai":
+        return f"openai:{config.get('EMBEDDING_MODEL') or DEFAULT_OPENAI_MODEL}"
+    model = config.get("EMBEDDING_MODEL") or DEFAULT_LOCAL_MODEL
+    if backend == "onnx":
+        # Quantized exports give slightly different vectors than the full-precision model
+        return f"onnx:{model}:{config.get('ONNX_FILE', 'onnx/model.onnx')}"
+    return f"{backend}:{model}"
+
+
+def create_embeddings(config, max_retries=2):
+    """
+    Create the embedding model configured by EMBEDDING_BACKEND: openai, sentence_transformers or onnx.
+
+    max_retries only applies to the OpenAI client.
+    """
+    backend = config.get("EMBEDDING_BACKEND", "openai")
+    batch_size = config.get("EMBEDDING_BATCH_SIZE", 64)
+    threads = config.get("EMBEDDING_THREADS", 0)
+    if backend == "openai":
+        from langchain_community.embeddings import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            model=config.get("EMBEDDING_MODEL") or DEFAULT_OPENAI_MODEL,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=max_retries
+        )
+    model = config.get("EMBEDDING_MODEL") or DEFAULT_LOCAL_MODEL
+    if backend == "sentence_transformers":
+        embeddings = SentenceTransformerEmbeddings(model, batch_size, threads)
+    elif backend == "onnx":
+        embeddings = OnnxEmbeddings(model, config.get("ONNX_FILE", "onnx/model.onnx"), batch_size, threads)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; use openai, sentence_transformers or onnx")
+    logger.info(f"Embedding locally with {embedding_model(config)}")
+    return embeddings
+
+
+def estimate_tokens(texts):
+    """
+    Estimate the number of tokens of each text at four characters per token, as an int array.
+    """
+    return (np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts)) + 3) // 4
+
+
+def token_counter(config, embeddings=None):
+    """
+    Return a function that counts the tokens of a list of texts with the tokenizer of the configured model.
+
+    Local models count with their own tokenizer; OpenAI models with tiktoken if it is
+    installed. Otherwise tokens are estimated from the text length.
+    """
+    if isinstance(embeddings, LocalEmbeddings):
+        return embeddings.count_tokens
+    if config.get("EMBEDDING_BACKEND", "openai") == "openai":
+        try:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(config.get("EMBEDDING_MODEL") or DEFAULT_OPENAI_MODEL)
+            threads = os.cpu_count() or 1
+            return lambda texts: np.fromiter(
+                (len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts), num_threads=threads)),
+                dtype=np.int64, count=len(texts)
+            )
+        except Exception as e:
+            logger.info(f"Estimating token counts, tiktoken is not available: {e}")
+    return estimate_tokens
@@ -3,19 +3,21 @@ import json
 from dotenv import load_dotenv
 import streamlit as st
 import config
+import vectordb
+from bm25_index import BM25Index, index_path
+from embedding_backends import create_embeddings, embedding_model
+from rag_cache import RagCache
+from retriever import ChromaRetriever
 
 from langchain_anthropic import ChatAnthropic
-from langchain_community.embeddings import OpenAIEmbeddings
 from langchain.agents import AgentType, initialize_agent, Tool
 from langchain_community.utilities import SerpAPIWrapper
-from langchain_community.vectorstores import Chroma
 from langchain.chains import RetrievalQA
 
 load_dotenv()
 config = config.read_config()
 
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 persist_directory = os.path.join(config["chroma_base_dir"], config["chroma_collection"])
 
 # Initialize the LLM
@@ -24,29 +26,60 @@ llm = ChatAnthropic(
     anthropic_api_key=ANTHROPIC_API_KEY, 
     temperature=0.0)
 
-# Initialize the embeddings
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# Initialize the embeddings; queries must be embedded with the model the collection was built with
+embeddings = create_embeddings(config)
+
+# Open the vector store
+collection = vectordb.get_collection(persist_directory, config["chroma_collection"], embedding_model(config))
+
+# The RAG cache lives across Streamlit reruns and is shared by all sessions
+@st.cache_resource
+def get_rag_cache():
+    return RagCache(
+        ttl_seconds=config.get("RAG_CACHE_TTL_SECONDS", 3600),
+        max_answers=config.get("RAG_CACHE_SIZE", 512),
+        max_retrievals=4 * config.get("RAG_CACHE_SIZE", 512),
+        similarity=config.get("RAG_CACHE_SIMILARITY", 0.95),
+        revision=lambda: vectordb.collection_revision(persist_directory, config["chroma_collection"])
+    )
 
-# Initialize the vector store
-vector_store = Chroma(
-    collection_name=config["chroma_collection"],
-    embedding_function=embeddings,
-    persist_directory=persist_directory
-)
+rag_cache = get_rag_cache() if config.get("RAG_CACHE", True) else None
+
+# The keyword index for hybrid search; a collection ingested before it existed is indexed once
+@st.cache_resource
+def get_keyword_index():
+    keyword_index = BM25Index(index_path(persist_directory))
+    keyword_index.ensure_built(collection)
+    return keyword_index
+
+keyword_index = get_keyword_index() if config.get("HYBRID_SEARCH", True) else None
 
 # Initialize the RAG QA chain
 rag_qa = RetrievalQA.from_chain_type(
     llm=llm,
     chain_type="stuff",
-    retriever=vector_store.as_retriever()
+    retriever=ChromaRetriever(
+        collection=collection,
+        embeddings=embeddings,
+        cache=rag_cache,
+        keyword_index=keyword_index,
+        k=config.get("RAG_TOP_K", 4),
+        fetch_k=config.get("HYBRID_FETCH_K", 20),
+        keyword_weight=config.get("HYBRID_KEYWORD_WEIGHT", 1.0)
+    )
 )
 
 # Initialize the SerpAPIWrapper for web search
 serp_api_wrapper = SerpAPIWrapper(serpapi_api_key=os.getenv("SERP_API_KEY"))
 
-# Define the RAG tool function
+# Define the RAG tool function; the agent often asks the same question more than once
 def use_rag_tool(query: str) -> str:
-    return rag_qa.run(query)
+    answer = rag_cache.get_answer(query) if rag_cache else None
+    if answer is None:
+        answer = rag_qa.run(query)
+        if rag_cache:
+            rag_cache.put_answer(query, answer)
+    return answer
 
 # Define the web search tool function   
 def use_serp_tool(query: str) -> str:
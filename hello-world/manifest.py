@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Hash a file's content without reading it into memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    SQLite record of the files ingested into a collection: content hash, size,
+    modification time and number of chunks per file.
+
+    A file whose size and modification time match its record is unchanged without
+    being read again; otherwise its hash decides. Re-runs therefore only read,
+    embed and write the files that changed.
+
+    With deduplication, the manifest also keeps the hash and MinHash signature of
+    every chunk a file contributed, and which files its dropped duplicate chunks
+    pointed to.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtime REAL NOT NULL, chunks INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (path TEXT NOT NULL, hash TEXT NOT NULL, signature BLOB NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates (path TEXT NOT NULL, duplicate_of TEXT NOT NULL, PRIMARY KEY (path, duplicate_of))"
+        )
+        self.connection.commit()
+
+    def get(self, path):
+        """
+        Return (sha256, size, mtime, chunks) for a file, or None if it has not been ingested.
+        """
+        return self.connection.execute(
+            "SELECT sha256, size, mtime, chunks FROM files WHERE path = ?", (path,)
+        ).fetchone()
+
+    def paths(self):
+        """
+        Return the paths of all ingested files.
+        """
+        return [row[0] for row in self.connection.execute("SELECT path FROM files")]
+
+    def record(self, path, sha256, size, mtime, chunks):
+        """
+        Record a file as completely ingested.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, sha256, size, mtime, chunks, ingested_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, sha256, size, mtime, chunks, time.time())
+        )
+        self.connection.commit()
+
+    def record_chunks(self, path, chunks, duplicate_of):
+        """
+        Replace the deduplication records of a file: its kept chunks as (hash, signature) pairs, and the files it duplicated.
+        """
+        self.connection.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM duplicates WHERE path = ?", (path,))
+        self.connection.executemany(
+            "INSERT INTO chunks (path, hash, signature) VALUES (?, ?, ?)",
+            ((path, chunk_hash, signature.tobytes()) for chunk_hash, signature in chunks)
+        )
+        self.connection.executemany(
+            "INSERT INTO duplicates (path, duplicate_of) VALUES (?, ?)", ((path, other) for other in duplicate_of)
+        )
+        self.connection.commit()
+
+    def chunk_signatures(self):
+        """
+        Yield (path, hash, signature) for every recorded chunk.
+        """
+        for path, chunk_hash, signature in self.connection.execute("SELECT path, hash, signature FROM chunks"):
+            yield path, chunk_hash, np.frombuffer(signature, dtype=np.uint32)
+
+    def dependents(self, paths):
+        """
+        Return the files that had chunks dropped as duplicates of chunks of the given files.
+        """
+        dependents = set()
+        for path in paths:
+            dependents.update(row[0] for row in self.connection.execute("SELECT path FROM duplicates WHERE duplicate_of = ?", (path,)))
+        return dependents
+
+    def remove(self, path):
+        """
+        Forget a file.
+        """
+        self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM duplicates WHERE path = ?", (path,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
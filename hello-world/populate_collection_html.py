@@ -1,80 +1,218 @@
+import logging
+import multiprocessing
 import os
-import chromadb
-import openai
-from bs4 import BeautifulSoup
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
+import lxml.html
+from langchain_core.documents import Document
+
 # local imports
 import config
 import vectordb
+from bm25_index import BM25Index, index_path
+from dedup import ChunkDeduplicator
+from embedding_backends import create_embeddings, embedding_model
+from token_splitter import create_splitter
+
+logger = logging.getLogger(__name__)
 
 # Load the environment variables
 load_dotenv()
 config = config.read_config()
 
-# Initialize the OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Elements whose text is never page content
+NON_TEXT_TAGS = ["script", "style", "noscript", "template", "iframe", "svg", "canvas"]
+# Elements that usually hold site chrome; forms are not among them, as some sites wrap the whole page in one
+BOILERPLATE_TAGS = ["nav", "header", "footer", "aside", "menu", "dialog"]
+BOILERPLATE_ROLES = ["navigation", "banner", "contentinfo", "complementary", "search", "menu", "dialog", "alert"]
+# Whole class or id tokens of site chrome: menus, cookie notices, share buttons, ads
+BOILERPLATE_NAMES = {"nav", "navbar", "navigation", "menu", "breadcrumb", "breadcrumbs", "cookie", "cookies", "consent",
+                     "banner", "sidebar", "footer", "header", "share", "social", "related", "advert", "ads", "popup",
+                     "modal", "subscribe", "newsletter"}
+# Containers that are never dropped, even when their class looks like chrome
+CONTENT_TAGS = {"html", "body", "main", "article"}
+# An element holding more than this share of the page's text is content, whatever it looks like
+MAX_CHROME_TEXT_FRACTION = 0.5
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr",
+              "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "br", "hr", "figcaption", "td", "th"}
 
-def extract_text_from_html(dir_path):
+
+def find_html_files(site_dir):
     """
-    Reads and concatenates all HTML files in the given directory.
+    Yield the paths of all HTML files below site_dir, in a stable order.
     """
-    full_text = ""
-    for root, _, files in os.walk(dir_path):
-        for file in files:
-            if file.endswith(".html") or file.endswith(".htm"):
-                with open(os.path.join(root, file), "r", encoding="utf-8", errors="ignore") as f:
-                    soup = BeautifulSoup(f.read(), "html.parser")
-                    text = soup.get_text(separator=" ", strip=True)
-                    full_text += text + "\n"
-
-    return full_text.strip()
-
-def embed_text(text):
+    for root, dirs, files in os.walk(site_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith((".html", ".htm")):
+                yield os.path.join(root, file)
+
+
+def find_websites(source_dir):
     """
-    Generates vector embeddings for the given text using OpenAI's embedding API.
+    Yield (site, html_path) for every page of every website directory in source_dir.
     """
-    response = openai.embeddings.create(text=text, model="text-embedding-3-small")
-    return response["data"][0]["embedding"]
+    for current_dir in sorted(os.listdir(source_dir)):
+        current_dir_path = os.path.join(source_dir, current_dir)
+        if os.path.isdir(current_dir_path):
+            for html_path in find_html_files(current_dir_path):
+                yield current_dir, html_path
+        else:
+            logger.info(f"{current_dir} is not a directory")
+
 
-def store_in_chromadb(client, chroma_collection, doc_id, text, embedding):
+def extract_text_from_html(html):
     """
-    Stores the embedding in the ChromaDB collection.
+    Return the title and the main text of an HTML page, without navigation, scripts and other boilerplate.
     """
-    collection = client.get_or_create_collection(chroma_collection)
-    collection.add(
-        ids=[doc_id],
-        embeddings=[embedding],
-        metadatas=[{"source": doc_id}],
-        documents=[text]
-    )
+    doc = lxml.html.document_fromstring(html)
+    title = (doc.findtext(".//title") or "").strip()
+
+    # Drop the page chrome, then prefer the page's own main content element if it marks one
+    for el in [el for el in doc.iter(*NON_TEXT_TAGS)]:
+        if el.getparent() is not None:
+            el.drop_tree()
+    chrome = [el for el in doc.iter() if isinstance(el.tag, str) and el.tag not in CONTENT_TAGS and (
+        el.tag in BOILERPLATE_TAGS
+        or el.get("role") in BOILERPLATE_ROLES
+        or el.get("aria-hidden") == "true"
+        or not BOILERPLATE_NAMES.isdisjoint(f"{el.get('class', '')} {el.get('id', '')}".lower().split())
+    )]
+    max_chrome_text = MAX_CHROME_TEXT_FRACTION * len(doc.text_content())
+    for el in chrome:
+        if el.getparent() is not None and len(el.text_content()) <= max_chrome_text:
+            el.drop_tree()
+    # Elements without children are falsy, so the candidates are compared with None
+    content = next((el for el in (doc.find(".//main"), doc.find(".//article"), doc.find(".//body")) if el is not None), doc)
+
+    # Block elements end a line, so paragraphs do not run into each other
+    for el in content.iter():
+        if isinstance(el.tag, str) and el.tag in BLOCK_TAGS:
+            el.tail = "\n" + (el.tail or "")
+    lines = (" ".join(line.split()) for line in content.text_content().splitlines())
+    return title, "\n".join(line for line in lines if line)
+
 
-def process_websites(source_dir, chroma_base_dir, chroma_collection):
+def parse_html(site, html_path):
     """
-    Process all HTML files in the source directory and add them to the Chroma vector store.
+    Parse one HTML file in a worker process.
+
+    Returns (html_path, page, seconds, error); page is a LangChain Document, or None
+    if the file has no text or could not be parsed (then error is set).
     """
-    client = chromadb.Client(path=chroma_base_dir)
-    full_text = ""
-    for current_dir in os.listdir(source_dir):
-        current_dir_path = os.path.join(source_dir, current_dir)
-        if (os.path.isdir(current_dir_path)):
-            print(f"Processing website: {current_dir}")
-            text = extract_text_from_html(current_dir_path)
-            if text:
-                full_text += text
-            else:
-                print(f"Skipping {current_dir} because it has no text")
+    start = time.perf_counter()
+    try:
+        with open(html_path, "rb") as f:
+            html = f.read()
+        if not html.strip():
+            return html_path, None, time.perf_counter() - start, None
+        # lxml detects the encoding from the bytes and the page's meta charset
+        title, text = extract_text_from_html(html)
+        page = Document(page_content=text, metadata={"source": html_path, "site": site, "title": title}) if text else None
+        return html_path, page, time.perf_counter() - start, None
+    except Exception as e:
+        return html_path, None, time.perf_counter() - start, str(e)
+
+
+def load_documents(pages, workers=1):
+    """
+    Yield one Document per HTML page with text, in the order of pages, a list of (site, html_path).
+
+    With workers > 1, files are parsed in a process pool with at most a few files per
+    worker in flight, so pages stream into the pipeline with bounded memory.
+    """
+    start = time.perf_counter()
+    counts = {"pages": 0, "empty": 0, "failed": 0}
+
+    def report(html_path, page, error):
+        if error:
+            logger.error(f"Error loading {html_path}: {error}")
+            counts["failed"] += 1
+        elif page is None:
+            logger.debug(f"Skipping {html_path} because it has no text")
+            counts["empty"] += 1
         else:
-            print(f"{current_dir} is not a directory")
-            
-    if full_text:
-        embedding = embed_text(full_text)
-        store_in_chromadb(client, chroma_collection, source_dir, full_text, embedding)
+            counts["pages"] += 1
+        return page
+
+    if workers <= 1:
+        for site, html_path in pages:
+            html_path, page, seconds, error = parse_html(site, html_path)
+            if report(html_path, page, error):
+                yield page
+    else:
+        # This generator runs on the ingestion pipeline's loader thread; spawned workers avoid forking a threaded process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = deque()
+            for site, html_path in pages:
+                in_flight.append(pool.submit(parse_html, site, html_path))
+                # Pages are small, so more of them are kept in flight than PDFs
+                if len(in_flight) >= 8 * workers:
+                    html_path, page, seconds, error = in_flight.popleft().result()
+                    if report(html_path, page, error):
+                        yield page
+            while in_flight:
+                html_path, page, seconds, error = in_flight.popleft().result()
+                if report(html_path, page, error):
+                    yield page
+
+    logger.info(f"Parsed {counts['pages']} HTML pages with {workers} workers in {time.perf_counter() - start:.1f}s "
+                f"({counts['empty']} without text, {counts['failed']} failed)")
+
+
+def process_websites(source_dir, chroma_dir, chroma_collection):
+    """
+    Process all HTML files in the website directories of source_dir and add them to the Chroma vector store.
+
+    Every page is chunked and embedded like the PDFs, with its file as the chunk source.
+    """
+    embeddings = create_embeddings(config, max_retries=0)
+    model = embedding_model(config)
+    collection = vectordb.get_collection(chroma_dir, chroma_collection, model)
+
+    pages = list(find_websites(source_dir))
+    for site in sorted({site for site, _ in pages}):
+        logger.info(f"Processing website: {site}")
+
+    # Pages that were ingested before are replaced, not duplicated
+    keyword_index = BM25Index(index_path(chroma_dir)) if config.get('HYBRID_SEARCH', True) else None
+    if keyword_index is not None:
+        # Chunks ingested before the keyword index existed are only in it once it is built from the collection
+        keyword_index.ensure_built(collection)
+    vectordb.delete_sources(chroma_dir, chroma_collection, [html_path for _, html_path in pages], keyword_index)
+
+    # Site chrome that survives boilerplate stripping repeats on every page of a site
+    deduplicator = ChunkDeduplicator(config.get('DEDUP_THRESHOLD', 0.9)) if config.get('DEDUP', True) else None
+    workers = config.get('HTML_WORKERS', 0) or os.cpu_count()
+    chunks = vectordb.ingest_documents(
+        chroma_dir, chroma_collection, load_documents(pages, workers),
+        chunk_size=config['CHUNK_SIZE'],
+        chunk_overlap=config['CHUNK_OVERLAP'],
+        BATCH_SIZE=config['BATCH_SIZE'],
+        SLEEP_SECONDS=config['SLEEP_SECONDS'],
+        max_pending=config.get('MAX_PENDING_BATCHES', 2),
+        concurrency=config.get('EMBED_CONCURRENCY', 4),
+        max_batch_tokens=config.get('EMBED_BATCH_TOKENS', 50000),
+        embeddings=embeddings,
+        embedding_model=model,
+        splitter=create_splitter(config, embeddings),
+        deduplicator=deduplicator,
+        keyword_index=keyword_index
+    )
+    if keyword_index is not None:
+        keyword_index.close()
+    logger.info(f"Ingested {chunks} chunks from {len(pages)} HTML files into {chroma_collection}")
 
 
 def main():
-    process_websites(config["html_base_dir"], config["chroma_base_dir"], config["chroma_collection"])
+    chroma_dir = os.path.join(config["chroma_base_dir"], config["chroma_collection"])
+    process_websites(config["html_base_dir"], chroma_dir, config["chroma_collection"])
     print("Processing complete")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    logging.basicConfig(level=config['LOG_LEVEL'])
+    main()
@@ -1,46 +1,250 @@
+import hashlib
 import logging
+import multiprocessing
 import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
 from langchain_community.document_loaders import PyPDFLoader
-from langchain.schema import Document
 
 # local imports
 import config
 import vectordb
-    
-    
-def extract_text_from_pdf(pdf_path):
-    loader = PyPDFLoader(pdf_path)
-    pages = loader.load_and_split()
-    logger.debug(f"Loaded {len(pages)} pages from {pdf_path}")
-    
-    return "\n\n".join([page.page_content.strip() for page in pages])
+from embedding_backends import create_embeddings, embedding_model
+from token_splitter import create_splitter
+from bm25_index import BM25Index, index_path
+from dedup import ChunkDeduplicator, strip_repeated_lines
+from manifest import IngestManifest, file_sha256
 
+logger = logging.getLogger(__name__)
 
-def process_pdf_files(pdf_dir, chroma_dir, chroma_collection):
-    # Loop through all PDF files in the source docs directory
-    all_documents = []
+
+def find_pdf_files(pdf_dir):
+    """
+    Yield the paths of all PDF files below pdf_dir, in a stable order.
+    """
+    for root, dirs, files in os.walk(pdf_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(".pdf"):
+                yield os.path.join(root, file)
+
+
+def extract_pages_from_pdf(pdf_path):
+    """
+    Yield the pages of a PDF one at a time as LangChain Documents.
+    """
+    pages = 0
+    for page in PyPDFLoader(pdf_path).lazy_load():
+        page.page_content = page.page_content.strip()
+        pages += 1
+        yield page
+    logger.debug(f"Loaded {pages} pages from {pdf_path}")
+
+
+def parse_pdf(pdf_path):
+    """
+    Parse one PDF, in a worker process or in the loader thread.
+
+    Running headers and footers are removed from the pages.
+
+    Returns (pdf_path, pages, seconds, error); pages is empty and error is set if parsing failed.
+    """
+    start = time.perf_counter()
     try:
-        for file in os.listdir(pdf_dir):
-            if file.endswith(".pdf"):
-                pdf_path = os.path.join(pdf_dir, file)
-
-            # Load the PDF file in LangChain Document format
-            text = extract_text_from_pdf(pdf_path)
-            document = Document(page_content=text, metadata={"source": pdf_path})
-            
-            all_documents.append(document)
-            logger.info(f"Loaded {pdf_path} to documents list")
+        pages = strip_repeated_lines(list(extract_pages_from_pdf(pdf_path)))
+        return pdf_path, pages, time.perf_counter() - start, None
     except Exception as e:
-        logger.error(f"Error loading documents: {e}")
-        raise e
-    
-    # Vector embed and save the documents to the Chroma DB
-    vectordb.ingest_documents(chroma_dir, chroma_collection, all_documents, config['CHUNK_SIZE'], config['CHUNK_OVERLAP'], config['BATCH_SIZE'], config['SLEEP_SECONDS'])
-    logger.info(f"Ingested {len(all_documents)} documents into {chroma_collection}")
-            
-            
+        return pdf_path, [], time.perf_counter() - start, str(e)
+
+
+def load_documents(pdf_paths, workers=1, failed=None):
+    """
+    Yield the pages of the given PDFs, file by file in the given order.
+
+    Files are parsed one at a time, or with workers > 1 in a process pool. At most two
+    files per worker are in flight and results are yielded in file order, so pages
+    still stream with bounded memory. A file that fails to load is logged, added to
+    failed and skipped.
+    """
+    start = time.perf_counter()
+    files = pages = 0
+    parse_seconds = 0.0
+
+    def report(pdf_path, page_count, seconds, error):
+        nonlocal files, pages, parse_seconds
+        if error:
+            logger.error(f"Error loading {pdf_path}: {error}")
+            if failed is not None:
+                failed.add(pdf_path)
+            return
+        files += 1
+        pages += page_count
+        parse_seconds += seconds
+        logger.info(f"Loaded {pdf_path}: {page_count} pages in {seconds:.2f}s")
+
+    if workers <= 1:
+        # All pages of a file are needed to find its running headers and footers
+        for pdf_path in pdf_paths:
+            pdf_path, file_pages, seconds, error = parse_pdf(pdf_path)
+            report(pdf_path, len(file_pages), seconds, error)
+            yield from file_pages
+    else:
+        # This generator runs on the ingestion pipeline's loader thread; spawned workers avoid forking a threaded process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = deque()
+            for pdf_path in pdf_paths:
+                in_flight.append(pool.submit(parse_pdf, pdf_path))
+                if len(in_flight) >= 2 * workers:
+                    pdf_path, file_pages, seconds, error = in_flight.popleft().result()
+                    report(pdf_path, len(file_pages), seconds, error)
+                    yield from file_pages
+            while in_flight:
+                pdf_path, file_pages, seconds, error = in_flight.popleft().result()
+                report(pdf_path, len(file_pages), seconds, error)
+                yield from file_pages
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Parsed {files} PDFs ({pages} pages) with {workers} workers: {parse_seconds:.1f}s of parsing in {elapsed:.1f}s")
+
+
+def plan_ingestion(pdf_dir, manifest):
+    """
+    Compare the PDF tree with the manifest.
+
+    A file whose size and modification time match its record is unchanged; otherwise
+    its content hash decides, so a touched but identical file is not re-ingested.
+
+    Returns (changed, unchanged, removed): changed maps new and modified files to
+    (sha256, size, mtime), unchanged is a count, removed lists recorded files that are gone.
+    """
+    changed = {}
+    unchanged = 0
+    present = set()
+    for pdf_path in find_pdf_files(pdf_dir):
+        present.add(pdf_path)
+        stat = os.stat(pdf_path)
+        record = manifest.get(pdf_path)
+        if record and record[1] == stat.st_size and record[2] == stat.st_mtime:
+            unchanged += 1
+            continue
+        sha256 = file_sha256(pdf_path)
+        if record and record[0] == sha256:
+            manifest.record(pdf_path, sha256, stat.st_size, stat.st_mtime, record[3])
+            unchanged += 1
+            continue
+        changed[pdf_path] = (sha256, stat.st_size, stat.st_mtime)
+    removed = [pdf_path for pdf_path in manifest.paths() if pdf_path not in present]
+    return changed, unchanged, removed
+
+
+def process_pdf_files(pdf_dir, chroma_dir, chroma_collection):
+    # Retries are left to the ingestion scheduler, which backs off on rate-limit responses
+    embeddings = create_embeddings(config, max_retries=0)
+    model = embedding_model(config)
+    # Check the model before anything is deleted from the collection
+    collection = vectordb.get_collection(chroma_dir, chroma_collection, model)
+
+    # The manifest lives next to the collection it describes
+    manifest = IngestManifest(os.path.join(chroma_dir, "ingest_manifest.sqlite"))
+    changed, unchanged, removed = plan_ingestion(pdf_dir, manifest)
+    logger.info(f"{len(changed)} new or changed, {unchanged} unchanged, {len(removed)} removed PDFs")
+
+    deduplicator = ChunkDeduplicator(config.get('DEDUP_THRESHOLD', 0.9)) if config.get('DEDUP', True) else None
+    if deduplicator:
+        # Chunks dropped as duplicates of a changed or removed file's chunks would be lost, so their files are ingested again
+        dependents = manifest.dependents(set(changed) | set(removed)) - set(changed) - set(removed)
+        while dependents:
+            for pdf_path in dependents:
+                changed[pdf_path] = manifest.get(pdf_path)[:3]
+            logger.info(f"Re-ingesting {len(dependents)} PDFs whose duplicate chunks referred to changed files")
+            dependents = manifest.dependents(dependents) - set(changed) - set(removed)
+
+    # Chunks of removed files and the old chunks of changed files go; a changed file may now have fewer chunks
+    stale = removed + [pdf_path for pdf_path in changed if manifest.get(pdf_path)]
+    # The keyword index for hybrid search is kept next to the collection and updated with it
+    keyword_index = BM25Index(index_path(chroma_dir)) if config.get('HYBRID_SEARCH', True) else None
+    if keyword_index is not None:
+        # Chunks ingested before the keyword index existed are only in it once it is built from the collection
+        keyword_index.ensure_built(collection)
+    if stale:
+        vectordb.delete_sources(chroma_dir, chroma_collection, stale, keyword_index)
+    for pdf_path in removed:
+        manifest.remove(pdf_path)
+    if deduplicator:
+        # Chunks of files that are not ingested again stay in the collection and count as seen
+        for pdf_path, chunk_hash, signature in manifest.chunk_signatures():
+            if pdf_path not in changed:
+                deduplicator.add(pdf_path, chunk_hash, signature)
+
+    # Chunk ids are derived from the file's path and content hash and the chunk's position in it, so re-runs
+    # upsert in place while identical copies of a PDF at different paths keep separate chunks
+    ordinals = Counter()
+    prefixes = {}
+
+    def make_ids(batch):
+        ids = []
+        for chunk in batch:
+            source = chunk.metadata["source"]
+            if source not in prefixes:
+                prefixes[source] = hashlib.sha256(f"{source}\0{changed[source][0]}".encode("utf-8")).hexdigest()
+            ids.append(f"{prefixes[source]}-{ordinals[source]}")
+            ordinals[source] += 1
+        return ids
+
+    # Chunks are written in stream order, so a file is complete once a chunk of the next file has been written
+    failed = set()
+    recorded = set()
+    current = None
+
+    def record_file(pdf_path):
+        kept, duplicate_of = deduplicator.take(pdf_path) if deduplicator else ([], set())
+        if pdf_path not in failed:
+            manifest.record(pdf_path, *changed[pdf_path], ordinals[pdf_path])
+            if deduplicator:
+                manifest.record_chunks(pdf_path, kept, duplicate_of)
+        recorded.add(pdf_path)
+
+    def on_written(batch):
+        nonlocal current
+        for chunk in batch:
+            source = chunk.metadata["source"]
+            if source != current:
+                if current is not None:
+                    record_file(current)
+                current = source
+
+    # Pages stream from the loader through the splitter and embedder into Chroma; nothing holds the whole corpus
+    workers = config.get('PDF_WORKERS', 0) or os.cpu_count()
+    chunks = vectordb.ingest_documents(
+        chroma_dir, chroma_collection, load_documents(list(changed), workers, failed),
+        chunk_size=config['CHUNK_SIZE'],
+        chunk_overlap=config['CHUNK_OVERLAP'],
+        BATCH_SIZE=config['BATCH_SIZE'],
+        SLEEP_SECONDS=config['SLEEP_SECONDS'],
+        max_pending=config.get('MAX_PENDING_BATCHES', 2),
+        make_ids=make_ids,
+        on_written=on_written,
+        concurrency=config.get('EMBED_CONCURRENCY', 4),
+        max_batch_tokens=config.get('EMBED_BATCH_TOKENS', 50000),
+        embeddings=embeddings,
+        embedding_model=model,
+        splitter=create_splitter(config, embeddings),
+        deduplicator=deduplicator,
+        keyword_index=keyword_index
+    )
+    # The last file, and files without any text, are complete once the stream has ended
+    for pdf_path in changed:
+        if pdf_path not in recorded:
+            record_file(pdf_path)
+    manifest.close()
+    if keyword_index is not None:
+        keyword_index.close()
+    logger.info(f"Ingested {chunks} chunks into {chroma_collection}")
+
+
 if __name__ == "__main__":
     # Load secrets and other environment variables
     load_dotenv()
@@ -51,10 +255,8 @@ if __name__ == "__main__":
     print(f"Source docs: {config['pdf_base_dir']}")
     print(f"Chroma DB: {config['chroma_base_dir']}")
     logging.basicConfig(level=config['LOG_LEVEL'])
-    logger = logging.getLogger(__name__)
 
     # Ingest documents
     pdf_dir = os.path.join(config['pdf_base_dir'], config['chroma_collection'], "unprocessed")
     chroma_dir = os.path.join(config['chroma_base_dir'], config['chroma_collection'])
     process_pdf_files(pdf_dir, chroma_dir, config['chroma_collection'])
-
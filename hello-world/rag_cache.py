@@ -0,0 +1,151 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query):
+    """
+    Lowercase a query and drop punctuation and extra whitespace, so trivially different phrasings share a key.
+    """
+    return " ".join(PUNCTUATION.sub(" ", query.lower()).split())
+
+
+class RagCache:
+    """
+    Two-level cache for the RAG tool.
+
+    Level one maps a normalized query to the tool's answer, so a repeated question
+    costs neither a search nor an LLM call. Level two maps a query embedding to the
+    ids of the chunks retrieved for it: a query whose embedding has at least
+    similarity cosine similarity with a cached one reuses those chunks instead of
+    searching the collection again. An optional scope is an exact part of the
+    level-two key. Its vectors are kept in a preallocated matrix with one row per
+    slot, so a lookup is one matrix product.
+
+    Both levels are LRU-bounded and entries expire after ttl_seconds. revision is
+    a function returning the collection's revision; when it changes, because
+    documents were ingested or deleted, both levels are cleared. It is checked at
+    most every revision_check_seconds.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_answers=512, max_retrievals=2048, similarity=0.95, revision=None, revision_check_seconds=10):
+        self.ttl_seconds = ttl_seconds
+        self.max_answers = max_answers
+        self.max_retrievals = max_retrievals
+        self.similarity = similarity
+        self.revision = revision
+        self.revision_check_seconds = revision_check_seconds
+        # normalized query -> (answer, expires)
+        self._answers = OrderedDict()
+        # slot -> (ids, expires, scope), in least to most recently used order; vectors are rows of _vectors
+        self._retrievals = OrderedDict()
+        self._vectors = None
+        self._free_slots = list(range(max_retrievals - 1, -1, -1))
+        self._revision = None
+        self._revision_checked = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"answer_hits": 0, "answer_misses": 0, "retrieval_hits": 0, "retrieval_misses": 0, "invalidations": 0}
+
+    def clear(self):
+        """
+        Drop all cached answers and retrievals.
+        """
+        with self._lock:
+            self._answers.clear()
+            self._retrievals.clear()
+            self._free_slots = list(range(self.max_retrievals - 1, -1, -1))
+
+    def _check_revision(self):
+        now = time.monotonic()
+        if self.revision is None or now - self._revision_checked < self.revision_check_seconds:
+            return
+        self._revision_checked = now
+        try:
+            revision = self.revision()
+        except Exception as e:
+            logger.warning(f"Could not read the collection revision: {e}")
+            return
+        if revision != self._revision:
+            if self._revision is not None:
+                logger.info("Collection changed, clearing the RAG cache")
+                self.stats["invalidations"] += 1
+                self.clear()
+            self._revision = revision
+
+    def get_answer(self, query):
+        """
+        Return the cached answer to a query, or None.
+        """
+        self._check_revision()
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._answers.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._answers[key]
+                self.stats["answer_misses"] += 1
+                return None
+            self._answers.move_to_end(key)
+            self.stats["answer_hits"] += 1
+            return entry[0]
+
+    def put_answer(self, query, answer):
+        """
+        Cache the answer to a query.
+        """
+        if not answer:
+            return
+        with self._lock:
+            key = normalize_query(query)
+            self._answers[key] = (answer, time.monotonic() + self.ttl_seconds)
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_answers:
+                self._answers.popitem(last=False)
+
+    def get_retrieval(self, vector, scope=None):
+        """
+        Return the chunk ids retrieved for a query embedding close to this one with the same scope, or None.
+        """
+        self._check_revision()
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            now = time.monotonic()
+            for slot in [slot for slot, (_, expires, _) in self._retrievals.items() if expires < now]:
+                del self._retrievals[slot]
+                self._free_slots.append(slot)
+            candidates = [slot for slot, entry in self._retrievals.items() if entry[2] == scope]
+            if candidates:
+                slots = np.asarray(candidates, dtype=np.int64)
+                similarities = self._vectors[slots] @ vector
+                best = int(similarities.argmax())
+                if similarities[best] >= self.similarity:
+                    slot = int(slots[best])
+                    self._retrievals.move_to_end(slot)
+                    self.stats["retrieval_hits"] += 1
+                    return self._retrievals[slot][0]
+            self.stats["retrieval_misses"] += 1
+            return None
+
+    def put_retrieval(self, vector, ids, scope=None):
+        """
+        Cache the chunk ids retrieved for a query embedding.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_retrievals, len(vector)), dtype=np.float32)
+            if not self._free_slots:
+                slot, _ = self._retrievals.popitem(last=False)
+                self._free_slots.append(slot)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            self._retrievals[slot] = (list(ids), time.monotonic() + self.ttl_seconds, scope)
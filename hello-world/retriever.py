@@ -0,0 +1,93 @@
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25_index import tokenize
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+
+
+def _documents(texts, metadatas):
+    return [Document(page_content=text or "", metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+
+
+class ChromaRetriever(BaseRetriever):
+    """
+    Retriever over the Chroma collection the ingestion scripts write.
+
+    The query is embedded and searched in the collection directly. With a
+    keyword_index (a bm25_index.BM25Index), the search is hybrid: the fetch_k best
+    chunks by vector and by BM25 are fused by reciprocal rank, so exact terms such
+    as rule numbers and league names are found even when the embedding misses
+    them. keyword_weight scales the BM25 ranking's share.
+
+    With a rag_cache.RagCache, a query close to an earlier one reuses that query's
+    chunk ids, which only costs a lookup by id. In hybrid search, the numbers in the
+    query (rule numbers, age groups) must match too, since embeddings barely
+    distinguish them.
+    """
+    collection: Any
+    embeddings: Any
+    cache: Any = None
+    keyword_index: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    keyword_weight: float = 1.0
+
+    def _fetch(self, ids):
+        """
+        Return the chunks with the given ids in that order, or None if any of them is gone.
+        """
+        found = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = dict(zip(found["ids"], _documents(found["documents"], found["metadatas"])))
+        if len(by_id) < len(ids):
+            return None
+        return [by_id[chunk_id] for chunk_id in ids]
+
+    def _cache_scope(self, query: str) -> Optional[tuple]:
+        if self.keyword_index is None:
+            return None
+        return tuple(sorted({term for term in tokenize(query) if any(c.isdigit() for c in term)}))
+
+    def _search(self, query: str, vector: List[float]):
+        """
+        Return the ids and documents of the k best chunks for a query.
+        """
+        n_results = self.fetch_k if self.keyword_index is not None else self.k
+        result = self.collection.query(query_embeddings=[vector], n_results=n_results, include=["documents", "metadatas"])
+        dense_ids = result["ids"][0]
+        dense = dict(zip(dense_ids, _documents(result["documents"][0], result["metadatas"][0])))
+        if self.keyword_index is None:
+            return dense_ids, [dense[chunk_id] for chunk_id in dense_ids]
+
+        scores = {}
+        for rank, chunk_id in enumerate(dense_ids):
+            scores[chunk_id] = 1.0 / (RRF_K + rank + 1)
+        for rank, (chunk_id, _) in enumerate(self.keyword_index.search(query, self.fetch_k)):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + self.keyword_weight / (RRF_K + rank + 1)
+        ids = sorted(scores, key=scores.get, reverse=True)[:self.k]
+
+        # Chunks found only by keyword are fetched; any the index still has but Chroma no longer does are skipped
+        missing = [chunk_id for chunk_id in ids if chunk_id not in dense]
+        if missing:
+            found = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            dense.update(zip(found["ids"], _documents(found["documents"], found["metadatas"])))
+        ids = [chunk_id for chunk_id in ids if chunk_id in dense]
+        return ids, [dense[chunk_id] for chunk_id in ids]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        scope = self._cache_scope(query)
+        if self.cache is not None:
+            ids = self.cache.get_retrieval(vector, scope)
+            documents = self._fetch(ids) if ids else None
+            if documents is not None:
+                return documents
+
+        ids, documents = self._search(query, vector)
+        if self.cache is not None:
+            self.cache.put_retrieval(vector, ids, scope)
+        return documents
@@ -0,0 +1,128 @@
+import numpy as np
+
+from bm25_index import BM25Index, decode_blocks, decode_varints, encode_postings, encode_varints, tokenize
+
+
+class FakeCollection:
+    """Stand-in for a Chroma collection with paged get()."""
+
+    name = "fake"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.gets = 0
+
+    def count(self):
+        return len(self.chunks)
+
+    def get(self, include, limit, offset):
+        self.gets += 1
+        page = self.chunks[offset:offset + limit]
+        return {
+            "ids": [chunk_id for chunk_id, _, _ in page],
+            "documents": [text for _, text, _ in page],
+            "metadatas": [{"source": source} for _, _, source in page],
+        }
+
+
+CHUNKS = [
+    ("r1", "Rule 12.3 covers the offside law-11 exception", "laws.pdf"),
+    ("r2", "The goalkeeper may handle the ball inside the penalty area", "laws.pdf"),
+    ("r3", "Players under u-12 play on smaller pitches", "youth.pdf"),
+]
+
+
+def index_of(tmp_path, chunks=CHUNKS):
+    index = BM25Index(str(tmp_path / "bm25_index.sqlite"))
+    index.add(*zip(*chunks))
+    return index
+
+
+def test_tokenize_keeps_rule_numbers_together():
+    assert tokenize("See Rule 12.3 and LAW-11, u-12.") == ["see", "rule", "12.3", "and", "law-11", "u-12"]
+
+
+def test_varint_round_trip():
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 35 - 1]
+    data = encode_varints(values)
+    assert len(data) == 1 + 1 + 1 + 2 + 2 + 2 + 3 + 5
+    assert decode_varints(data).tolist() == values
+    assert len(decode_varints(b"")) == 0
+
+
+def test_decode_blocks_restarts_deltas_per_block():
+    blocks = [(3, encode_postings([2, 5, 9], [1, 2, 3])), (2, encode_postings([10, 400], [4, 1]))]
+    docs, frequencies = decode_blocks(blocks)
+    assert docs.tolist() == [2, 5, 9, 10, 400]
+    assert frequencies.tolist() == [1, 2, 3, 4, 1]
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = index_of(tmp_path)
+    assert [chunk_id for chunk_id, _ in index.search("rule 12.3")] == ["r1"]
+    assert [chunk_id for chunk_id, _ in index.search("the ball", k=1)] == ["r2"]
+    assert index.search("nothing matches") == []
+    assert len(index) == 3
+
+
+def test_search_matches_bm25_formula(tmp_path):
+    index = index_of(tmp_path)
+    (_, score), = index.search("goalkeeper")
+    lengths = np.array([len(tokenize(text)) for _, text, _ in CHUNKS], dtype=np.float64)
+    idf = np.log(1.0 + (3 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 2.2 / (1.0 + 1.2 * (0.25 + 0.75 * lengths[1] / lengths.mean()))
+    assert np.isclose(score, expected)
+
+
+def test_replacing_and_deleting_chunks(tmp_path):
+    index = index_of(tmp_path)
+    index.add(["r1"], ["Rule 13 covers free kicks"], ["laws.pdf"])
+    assert index.search("offside") == []
+    assert [chunk_id for chunk_id, _ in index.search("free kicks")] == ["r1"]
+
+    index.delete_sources(["laws.pdf"])
+    assert [chunk_id for chunk_id, _ in index.search("rule pitches")] == ["r3"]
+    assert len(index) == 1
+
+
+def test_compact_keeps_results_and_drops_deleted_docs(tmp_path):
+    index = index_of(tmp_path)
+    index.add(["r4"], ["Throw-ins restart play"], ["laws.pdf"])
+    index.delete_sources(["youth.pdf"])
+    before = index.search("the play rule u-12")
+    index.compact()
+    assert index.search("the play rule u-12") == before
+    assert index.connection.execute("SELECT COUNT(*) FROM docs").fetchone()[0] == 3
+    assert index.connection.execute("SELECT COUNT(DISTINCT block) FROM postings").fetchone()[0] == 1
+
+
+def test_empty_index_is_falsy(tmp_path):
+    # Callers must test for a missing index with "is not None"
+    index = BM25Index(str(tmp_path / "bm25_index.sqlite"))
+    assert len(index) == 0
+    assert not index
+
+
+def test_ensure_built_indexes_an_existing_collection(tmp_path):
+    collection = FakeCollection(CHUNKS)
+    index = BM25Index(str(tmp_path / "bm25_index.sqlite"))
+    index.ensure_built(collection)
+    assert len(index) == 3
+    assert [chunk_id for chunk_id, _ in index.search("goalkeeper")] == ["r2"]
+
+    # Built once, the index is kept up to date by add() and not rebuilt
+    gets = collection.gets
+    index.close()
+    index = BM25Index(str(tmp_path / "bm25_index.sqlite"))
+    index.ensure_built(collection)
+    assert collection.gets == gets
+    assert len(index) == 3
+
+
+def test_ensure_built_marks_an_empty_collection_built(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25_index.sqlite"))
+    index.ensure_built(FakeCollection([]))
+    collection = FakeCollection(CHUNKS)
+    index.ensure_built(collection)
+    assert collection.gets == 0
+    assert len(index) == 0
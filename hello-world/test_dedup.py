@@ -0,0 +1,79 @@
+import numpy as np
+
+from dedup import ChunkDeduplicator, MinHasher, normalize, strip_repeated_lines, words_hash
+
+
+class Doc:
+    """Stand-in for a langchain Document."""
+
+    def __init__(self, page_content, source="a.pdf"):
+        self.page_content = page_content
+        self.metadata = {"source": source}
+
+
+def text(seed, words=200):
+    rng = np.random.default_rng(seed)
+    return " ".join(f"w{n}" for n in rng.integers(0, 5000, size=words))
+
+
+def test_normalize_ignores_case_and_punctuation():
+    assert normalize("Hello,  WORLD!\nAgain") == ["hello", "world", "again"]
+    assert words_hash(normalize("A b.")) == words_hash(normalize("a  B"))
+
+
+def test_strip_repeated_lines_removes_headers_and_page_numbers():
+    pages = [Doc(f"ACME Report\nBody line {n} unique\nmore text {n}\nPage {n} of 4") for n in range(1, 5)]
+    strip_repeated_lines(pages)
+    assert [page.page_content for page in pages] == [f"Body line {n} unique\nmore text {n}" for n in range(1, 5)]
+
+
+def test_strip_repeated_lines_leaves_short_documents_alone():
+    pages = [Doc("Header\nbody"), Doc("Header\nother")]
+    strip_repeated_lines(pages)
+    assert pages[0].page_content == "Header\nbody"
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=256)
+    words = normalize(text(0))
+    same = hasher.signature(words)
+    assert same.dtype == np.uint32
+    assert np.array_equal(same, hasher.signature(list(words)))
+    assert np.mean(same == hasher.signature(normalize(text(1)))) < 0.1
+    assert np.mean(same == hasher.signature(words[:-2] + ["x", "y"])) > 0.9
+
+
+def test_minhash_handles_short_and_empty_texts():
+    hasher = MinHasher()
+    assert len(hasher.signature(["one", "two"])) == 128
+    assert len(hasher.signature([])) == 128
+
+
+def test_filter_drops_exact_and_near_duplicates():
+    original = text(0)
+    near = original.rsplit(" ", 1)[0] + " changed"
+    deduplicator = ChunkDeduplicator()
+    chunks = [
+        Doc(original, "a.pdf"),
+        Doc(original.upper(), "b.pdf"),
+        Doc(near, "b.pdf"),
+        Doc(text(1), "b.pdf"),
+    ]
+    kept = list(deduplicator.filter(chunks))
+
+    assert [chunk.page_content for chunk in kept] == [original, text(1)]
+    assert deduplicator.stats == {"chunks": 4, "exact": 1, "near": 1}
+
+    kept_a, duplicated_a = deduplicator.take("a.pdf")
+    kept_b, duplicated_b = deduplicator.take("b.pdf")
+    assert len(kept_a) == 1 and duplicated_a == set()
+    assert len(kept_b) == 1 and duplicated_b == {"a.pdf"}
+    assert deduplicator.take("b.pdf") == ([], set())
+
+
+def test_added_chunks_from_earlier_runs_are_duplicates():
+    deduplicator = ChunkDeduplicator()
+    words = normalize(text(2))
+    deduplicator.add("old.pdf", words_hash(words), deduplicator.hasher.signature(words))
+    assert list(deduplicator.filter([Doc(text(2), "new.pdf")])) == []
+    assert deduplicator.take("new.pdf") == ([], {"old.pdf"})
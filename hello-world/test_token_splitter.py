@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+
+from token_splitter import SentenceTokenSplitter, create_splitter
+
+
+def count_words(texts):
+    return np.asarray([len(text.split()) for text in texts], dtype=np.int64)
+
+
+def sentences(count, words=4, prefix="s"):
+    return " ".join(" ".join(f"{prefix}{n}w{w}" for w in range(words - 1)) + f" {prefix}{n}end." for n in range(count))
+
+
+def test_sentence_bounds_cover_the_text():
+    splitter = SentenceTokenSplitter(count_words)
+    text = 'One. "Two!" (Three?)\n\nFour\nstill four. Five'
+    bounds = splitter._sentence_bounds(text)
+    assert bounds[0] == 0 and bounds[-1] == len(text)
+    assert [text[a:b].strip() for a, b in zip(bounds[:-1], bounds[1:])] == ["One.", '"Two!"', "(Three?)", "Four\nstill four.", "Five"]
+
+
+def test_chunks_fit_the_budget_and_overlap():
+    splitter = SentenceTokenSplitter(count_words, chunk_tokens=12, overlap_tokens=4)
+    chunks = list(splitter.split_documents([Document(page_content=sentences(10), metadata={"source": "a.pdf"})]))
+
+    assert all(chunk.metadata["tokens"] <= 12 for chunk in chunks)
+    assert all(chunk.metadata["tokens"] == len(chunk.page_content.split()) for chunk in chunks)
+    assert all(chunk.metadata["source"] == "a.pdf" for chunk in chunks)
+    # Consecutive chunks share the last sentence that fits in the overlap
+    for first, second in zip(chunks[:-1], chunks[1:]):
+        assert second.page_content.startswith(first.page_content.rsplit(". ", 1)[-1])
+    assert chunks[0].page_content.startswith("s0w0") and chunks[-1].page_content.endswith("s9end.")
+
+
+def test_chunks_never_span_documents():
+    splitter = SentenceTokenSplitter(count_words, chunk_tokens=100)
+    documents = [Document(page_content=sentences(2, prefix=prefix), metadata={"page": page}) for page, prefix in enumerate("ab")]
+    chunks = list(splitter.split_documents(documents))
+    assert [(chunk.metadata["page"], chunk.page_content) for chunk in chunks] == [(0, sentences(2, prefix="a")), (1, sentences(2, prefix="b"))]
+
+
+def test_long_sentences_are_cut_at_whitespace():
+    splitter = SentenceTokenSplitter(count_words, chunk_tokens=10, overlap_tokens=0)
+    text = " ".join(f"word{n}" for n in range(45)) + "."
+    chunks = list(splitter.split_documents([Document(page_content=text)]))
+    assert len(chunks) > 1
+    assert all(chunk.metadata["tokens"] <= 10 for chunk in chunks)
+    assert " ".join(chunk.page_content for chunk in chunks).split() == text.split()
+
+
+def test_groups_give_the_same_chunks():
+    documents = [Document(page_content=sentences(6, prefix=f"d{n}")) for n in range(5)]
+    whole = SentenceTokenSplitter(count_words, chunk_tokens=10, overlap_tokens=3)
+    small_groups = SentenceTokenSplitter(count_words, chunk_tokens=10, overlap_tokens=3, group_chars=50)
+    assert [chunk.page_content for chunk in whole.split_documents(documents)] == \
+        [chunk.page_content for chunk in small_groups.split_documents(documents)]
+
+
+def test_empty_documents_give_no_chunks():
+    splitter = SentenceTokenSplitter(count_words)
+    assert list(splitter.split_documents([Document(page_content=""), Document(page_content="  \n ")])) == []
+
+
+def test_create_splitter_respects_the_model_limit():
+    class Embeddings:
+        max_seq_length = 128
+
+    assert create_splitter({"SPLITTER": "characters"}) is None
+    splitter = create_splitter({"EMBEDDING_BACKEND": "local", "CHUNK_TOKENS": 500}, Embeddings())
+    assert splitter.chunk_tokens == 126
+    assert splitter.overlap_tokens == 25
@@ -0,0 +1,143 @@
+import logging
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+from embedding_backends import token_counter
+
+logger = logging.getLogger(__name__)
+
+# End of a sentence (with closing quotes or brackets) or of a paragraph, including the whitespace after it.
+# Both cases start with one character class, which lets the regex engine skip ahead about three times faster
+SENTENCE_END = re.compile(r"[.!?\n](?:(?<=[.!?])[.!?]*[\"')\]]*\s+|(?<=\n)[^\S\n]*\n\s*)")
+
+
+class SentenceTokenSplitter:
+    """
+    Splits documents into chunks of about chunk_tokens tokens of the embedding model.
+
+    Chunks end at sentence or paragraph boundaries and never span two documents (a
+    PDF page or an HTML page). Consecutive chunks of a document share up to
+    overlap_tokens tokens of whole sentences. Sentences longer than a chunk are cut
+    at whitespace.
+
+    Tokens are counted once per sentence. Sentences are counted in batches across many
+    documents, so the tokenizer runs over large inputs in parallel. Chunk boundaries
+    come from a binary search over the cumulative sentence counts. Each chunk's token
+    count is stored in its "tokens" metadata, so batching for the embedding API does
+    not count again.
+    """
+
+    def __init__(self, count_tokens, chunk_tokens=250, overlap_tokens=25, group_chars=1 << 20):
+        """
+        count_tokens maps a list of texts to an array of token counts; group_chars is
+        how much text is collected before its sentences are counted together.
+        """
+        self.count_tokens = count_tokens
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+        self.group_chars = group_chars
+
+    def _sentence_bounds(self, text):
+        """
+        Return the start offsets of the sentences of text, followed by len(text).
+        """
+        bounds = [0]
+        bounds.extend(match.end() for match in SENTENCE_END.finditer(text))
+        if bounds[-1] == len(text) and len(bounds) > 1:
+            bounds.pop()
+        bounds.append(len(text))
+        return bounds
+
+    def _cut_long_sentence(self, text, start, end, tokens):
+        """
+        Return offsets that cut text[start:end], a sentence of the given number of tokens, into pieces that fit a chunk.
+        """
+        # Aim below the budget, since a cut is only as exact as the sentence's characters per token
+        piece_chars = max(1, int((end - start) * self.chunk_tokens / tokens * 0.9))
+        cuts = []
+        position = start
+        while end - position > piece_chars:
+            window = (position + piece_chars // 2, position + piece_chars)
+            cut = max(text.rfind(" ", *window), text.rfind("\n", *window))
+            position = cut + 1 if cut > position else position + piece_chars
+            cuts.append(position)
+        return cuts
+
+    def _pack(self, text, bounds, counts):
+        """
+        Yield (chunk text, tokens) for one document given its sentence offsets and token counts.
+        """
+        if counts.size and counts.max() > self.chunk_tokens:
+            # Rare: cut oversized sentences, count the pieces, and pack those instead
+            new_bounds = [0]
+            for i in range(len(counts)):
+                if counts[i] > self.chunk_tokens:
+                    new_bounds.extend(self._cut_long_sentence(text, bounds[i], bounds[i + 1], counts[i]))
+                new_bounds.append(bounds[i + 1])
+            bounds = new_bounds
+            counts = self.count_tokens([text[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+
+        cumulative = np.concatenate(([0], np.cumsum(counts)))
+        sentences = len(counts)
+        start = 0
+        while start < sentences:
+            # Last sentence boundary that keeps the chunk within the budget, but at least one sentence
+            end = int(np.searchsorted(cumulative, cumulative[start] + self.chunk_tokens, side="right")) - 1
+            end = min(max(end, start + 1), sentences)
+            chunk = text[bounds[start]:bounds[end]].strip()
+            if chunk:
+                yield chunk, int(cumulative[end] - cumulative[start])
+            if end >= sentences:
+                break
+            # The next chunk starts with the last sentences of this one that fit in the overlap
+            overlap_start = int(np.searchsorted(cumulative, cumulative[end] - self.overlap_tokens, side="left"))
+            start = max(start + 1, min(overlap_start, end))
+
+    def _split_group(self, documents):
+        texts = [document.page_content for document in documents]
+        bounds = [self._sentence_bounds(text) for text in texts]
+        sentences = [text[a:b] for text, offsets in zip(texts, bounds) for a, b in zip(offsets[:-1], offsets[1:])]
+        counts = np.asarray(self.count_tokens(sentences), dtype=np.int64) if sentences else np.zeros(0, dtype=np.int64)
+
+        offset = 0
+        for document, text, offsets in zip(documents, texts, bounds):
+            document_counts = counts[offset:offset + len(offsets) - 1]
+            offset += len(offsets) - 1
+            for chunk, tokens in self._pack(text, offsets, document_counts):
+                yield Document(page_content=chunk, metadata=dict(document.metadata, tokens=tokens))
+
+    def split_documents(self, documents):
+        """
+        Yield the chunks of a stream of documents, in order.
+        """
+        group = []
+        group_chars = 0
+        for document in documents:
+            group.append(document)
+            group_chars += len(document.page_content)
+            if group_chars >= self.group_chars:
+                yield from self._split_group(group)
+                group = []
+                group_chars = 0
+        if group:
+            yield from self._split_group(group)
+
+
+def create_splitter(config, embeddings=None):
+    """
+    Create the splitter configured by SPLITTER, or None for LangChain's character splitter.
+
+    "tokens" (the default) splits into CHUNK_TOKENS tokens with CHUNK_OVERLAP_TOKENS
+    overlap; "characters" keeps the CHUNK_SIZE / CHUNK_OVERLAP character splitter.
+    """
+    if config.get("SPLITTER", "tokens") == "characters":
+        return None
+    chunk_tokens = config.get("CHUNK_TOKENS", 250)
+    max_seq_length = getattr(embeddings, "max_seq_length", None)
+    # The model's sequence limit includes its two special tokens
+    if max_seq_length and chunk_tokens > max_seq_length - 2:
+        logger.warning(f"CHUNK_TOKENS {chunk_tokens} exceeds the model's limit of {max_seq_length} tokens; chunks would be truncated, using {max_seq_length - 2}")
+        chunk_tokens = max_seq_length - 2
+    return SentenceTokenSplitter(token_counter(config, embeddings), chunk_tokens, config.get("CHUNK_OVERLAP_TOKENS", 25))
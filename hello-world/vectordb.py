@@ -1,50 +1,361 @@
-import os
+import logging
+import queue
+import random
+import threading
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-def ingest_documents(chroma_dir, chroma_collection, documents, chunk_size, chunk_overlap, BATCH_SIZE, SLEEP_SECONDS):
+
+class _StageError:
+    """Wraps an exception raised inside a pipeline stage so the consumer can re-raise it."""
+    def __init__(self, error):
+        self.error = error
+
+
+_STAGE_DONE = object()
+
+# Collection metadata key holding the identity of the model its vectors come from
+EMBEDDING_MODEL_KEY = "embedding_model"
+# Collection metadata key that changes whenever chunks are written or deleted
+REVISION_KEY = "revision"
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_background(iterable, max_pending):
     """
-    Vector embed and save a list of documents into the vector database.
+    Consume an iterable in a background thread and yield its items through a bounded queue.
+
+    At most max_pending items wait in the queue, so a fast producer blocks instead of
+    running ahead of its consumer, while the producer and the consumer still overlap.
+    """
+    items = queue.Queue(maxsize=max_pending)
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(_StageError(e))
+        finally:
+            items.put(_STAGE_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is _STAGE_DONE:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def batched(items, batch_size):
+    """
+    Group an iterable into lists of at most batch_size items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _token_counter():
+    """
+    Return a function that counts tokens with the OpenAI embedding tokenizer, or estimates them.
     """
     try:
-        # Get embedding model
-        embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-        
-    except Exception as e:
-        print(f"Error creating embeddings: {e}")
-        raise e
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        # About four characters per token for English text
+        return lambda text: len(text) // 4 + 1
+
+
+def token_batches(chunks, max_tokens, max_chunks):
+    """
+    Group chunks into batches of at most max_tokens tokens and max_chunks chunks.
 
+    Batches of short chunks hold more chunks than batches of long ones, so every
+    embedding request carries about the same amount of work.
+    """
+    count_tokens = _token_counter()
+    batch = []
+    batch_tokens = 0
+    for chunk in chunks:
+        # The token splitter records each chunk's size
+        tokens = chunk.metadata.get("tokens") or count_tokens(chunk.page_content)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_chunks):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def _is_rate_limit(error):
+    """
+    Whether an exception is a rate-limit (HTTP 429) response.
+    """
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error):
+    """
+    Seconds the provider asked to wait in its Retry-After header, or None.
+    """
     try:
-        # Initialize Chroma DB vector store, passing it the embedding model
-        vector_store = Chroma(
-            collection_name=chroma_collection,
-            embedding_function=embeddings,
-            persist_directory=chroma_dir
+        return float(error.response.headers["retry-after"])
+    except Exception:
+        return None
+
+
+class EmbeddingScheduler:
+    """
+    Embeds batches of chunks with several requests in flight.
+
+    Results are delivered in the order the batches arrived, so writes keep the
+    stream order. Rate-limit responses pause all requests: the pause is the
+    provider's Retry-After if it sent one, otherwise an exponential backoff from
+    base_delay with jitter, and it shrinks back after successful requests. Other
+    errors are retried with the same backoff up to max_retries times.
+    """
+
+    def __init__(self, embeddings, concurrency=4, base_delay=1.0, max_delay=60.0, max_retries=8):
+        self.embeddings = embeddings
+        self.concurrency = concurrency
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._delay = base_delay
+        self.stats = {"requests": 0, "chunks": 0, "rate_limited": 0, "retries": 0}
+
+    def _wait_for_pause(self):
+        while True:
+            with self._lock:
+                remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _embed(self, batch):
+        texts = [chunk.page_content for chunk in batch]
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                with self._lock:
+                    self.stats["requests"] += 1
+                    self.stats["chunks"] += len(batch)
+                    self._delay = max(self.base_delay, self._delay / 2)
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                    rate_limited = _is_rate_limit(e)
+                    if rate_limited:
+                        self.stats["rate_limited"] += 1
+                    delay = _retry_after(e) if rate_limited else None
+                    if delay is None:
+                        delay = self._delay * (1.0 + random.random())
+                        self._delay = min(self.max_delay, self._delay * 2)
+                    # A rate limit applies to every request, so all of them pause
+                    if rate_limited:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logger.warning(f"Embedding request failed ({e}), retrying in {delay:.1f}s")
+                if not rate_limited:
+                    time.sleep(delay)
+
+    def embed_batches(self, batches):
+        """
+        Yield (batch, vectors) for each batch, in order, with up to concurrency requests in flight.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            in_flight = deque()
+            for batch in batches:
+                in_flight.append((batch, pool.submit(self._embed, batch)))
+                if len(in_flight) >= self.concurrency:
+                    batch, future = in_flight.popleft()
+                    yield batch, future.result()
+            while in_flight:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+
+
+def split_documents(documents, chunk_size, chunk_overlap, splitter=None):
+    """
+    Split documents one at a time, yielding chunks as soon as each document is split.
+
+    splitter is e.g. a token_splitter.SentenceTokenSplitter; without one, documents are
+    split into chunk_size characters with LangChain's recursive character splitter.
+    """
+    if splitter is not None:
+        yield from splitter.split_documents(documents)
+        return
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for document in documents:
+        for chunk in text_splitter.split_documents([document]):
+            yield chunk
+
+
+def get_collection(chroma_dir, chroma_collection, embedding_model=None):
+    """
+    Open (or create) the persistent Chroma collection that the RAG agent reads through LangChain.
+
+    With embedding_model, the collection is checked against (or stamped with) that model.
+    """
+    import chromadb
+    client = chromadb.PersistentClient(path=chroma_dir)
+    collection = client.get_or_create_collection(name=chroma_collection)
+    if embedding_model:
+        check_embedding_model(collection, embedding_model)
+    return collection
+
+
+def check_embedding_model(collection, embedding_model):
+    """
+    Refuse to use a collection whose vectors come from a different embedding model.
+
+    A collection that does not record its model yet (a new one, or one written
+    before models were recorded) is stamped with embedding_model.
+    """
+    metadata = dict(collection.metadata or {})
+    recorded = metadata.get(EMBEDDING_MODEL_KEY)
+    if recorded == embedding_model:
+        return
+    if recorded is not None:
+        raise ValueError(
+            f"Collection {collection.name} holds {recorded} embeddings, but {embedding_model} is configured; "
+            f"configure {recorded} or ingest into a new collection"
         )
+    if collection.count():
+        logger.warning(f"Collection {collection.name} does not record its embedding model, assuming {embedding_model}")
+    update_metadata(collection, **{EMBEDDING_MODEL_KEY: embedding_model})
+
+
+def update_metadata(collection, **values):
+    """
+    Set collection metadata values, keeping the others.
+    """
+    metadata = dict(collection.metadata or {})
+    metadata.update(values)
+    # The distance function cannot be changed after creation, so its keys are not sent again
+    collection.modify(metadata={key: value for key, value in metadata.items() if not key.startswith("hnsw:")})
+
+
+def bump_revision(collection):
+    """
+    Mark the collection as changed, so caches of its search results are invalidated.
+    """
+    update_metadata(collection, **{REVISION_KEY: uuid.uuid4().hex})
+
+
+def collection_revision(chroma_dir, chroma_collection):
+    """
+    Return the collection's current revision, read from the database rather than a cached collection object.
+    """
+    return (get_collection(chroma_dir, chroma_collection).metadata or {}).get(REVISION_KEY)
+
+
+def clean_metadata(metadata):
+    """
+    Keep only the metadata values Chroma can store.
+    """
+    return {key: value for key, value in metadata.items() if isinstance(value, (str, int, float, bool))}
+
+
+def delete_sources(chroma_dir, chroma_collection, sources, keyword_index=None):
+    """
+    Delete all chunks of the given source files from the collection, and from its keyword index if given.
+    """
+    collection = get_collection(chroma_dir, chroma_collection)
+    for source in sources:
+        collection.delete(where={"source": source})
+    if keyword_index is not None and sources:
+        keyword_index.delete_sources(sources)
+    if sources:
+        bump_revision(collection)
+
+
+def ingest_documents(chroma_dir, chroma_collection, documents, chunk_size, chunk_overlap, BATCH_SIZE, SLEEP_SECONDS, *, embeddings, embedding_model, max_pending=2, make_ids=None, on_written=None, concurrency=4, max_batch_tokens=50000, splitter=None, deduplicator=None, keyword_index=None):
+    """
+    Vector embed and save a stream of documents into the vector database.
+
+    documents can be any iterable, e.g. a generator of pages. Loading and splitting,
+    embedding, and writing to Chroma run as three overlapping stages connected by
+    queues of at most max_pending batches, so memory stays flat however large the
+    corpus is.
+
+    Batches hold at most BATCH_SIZE chunks and max_batch_tokens tokens, and up to
+    concurrency embedding requests run at once. SLEEP_SECONDS is the initial backoff
+    after a failed or rate-limited request; there is no fixed sleep between batches.
+
+    embeddings is the embedding model created from the caller's config (see
+    embedding_backends.create_embeddings) and embedding_model its identity; the
+    collection must have been built with the same model. splitter replaces the character splitter, see split_documents.
+    deduplicator (a dedup.ChunkDeduplicator) drops duplicate chunks before they are embedded.
+    keyword_index (a bm25_index.BM25Index) is updated with every batch written to Chroma.
+
+    Chunks are upserted. make_ids(batch) returns the ids of a batch of chunks; with
+    deterministic ids, ingesting the same content again replaces chunks instead of
+    duplicating them. Random ids are used if it is not given. on_written(batch) is
+    called after each batch has been written, in stream order.
+
+    Returns the number of chunks ingested.
+    """
+    try:
+        # Open the Chroma DB collection; documents and metadata are stored the way LangChain's Chroma reads them
+        collection = get_collection(chroma_dir, chroma_collection, embedding_model)
     except Exception as e:
         print(f"Error opening vector store: {e}")
         raise e
-    
-    try:    
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    
-        chunks = text_splitter.split_documents(documents)
-    except Exception as e:
-        print(f"Error splitting documents: {e}")
-        raise e
 
-    # Add all of the chunks to the Chroma Db collection. The chunks are embedded 
-    # during ingestion, using the embedding model supplied during vector store initialization.    
-    for i in range(0, len(chunks), BATCH_SIZE):
-        batch = chunks[i:i+BATCH_SIZE]
-        vector_store.add_documents(batch)
-        time.sleep(SLEEP_SECONDS)
-            
-    vector_store.persist()
+    # Local models batch internally and use every core, so they take fewer concurrent calls
+    concurrency = min(concurrency, getattr(embeddings, "max_concurrency", concurrency))
+    scheduler = EmbeddingScheduler(embeddings, concurrency=concurrency, base_delay=max(SLEEP_SECONDS, 0.1))
 
-    
+    # Stage 1 (thread): load and split into batches; stage 2 (thread pool): embed; stage 3 (here): write
+    chunks = split_documents(documents, chunk_size, chunk_overlap, splitter)
+    if deduplicator is not None:
+        chunks = deduplicator.filter(chunks)
+    batches = run_in_background(token_batches(chunks, max_batch_tokens, BATCH_SIZE), max_pending)
+    embedded = run_in_background(scheduler.embed_batches(batches), max_pending)
 
+    ingested = 0
+    for batch, vectors in embedded:
+        ids = make_ids(batch) if make_ids else [str(uuid.uuid4()) for _ in batch]
+        texts = [chunk.page_content for chunk in batch]
+        collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            metadatas=[clean_metadata(chunk.metadata) for chunk in batch],
+            documents=texts
+        )
+        if keyword_index is not None:
+            keyword_index.add(ids, texts, [chunk.metadata.get("source") for chunk in batch])
+        ingested += len(batch)
+        if on_written:
+            on_written(batch)
+    if keyword_index is not None:
+        keyword_index.maybe_compact()
+    if ingested:
+        bump_revision(collection)
+    logger.info(f"Embedding: {scheduler.stats}")
+    if deduplicator is not None:
+        logger.info(f"Deduplication: {deduplicator.stats}")
+    return ingested